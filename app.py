@@ -1,5 +1,5 @@
 """Top-level runner so `python app.py` from E:\bhojani_website works.
-It imports the app from the clinic_website package folder.
+It builds the app with create_app() from the clinic_website package folder.
 """
 import sys
 from os import path
@@ -11,10 +11,14 @@ if APP_FOLDER not in sys.path:
     sys.path.insert(0, APP_FOLDER)
 
 try:
-    from clinic_app import app
+    from clinic_app import create_app, jobs
 except Exception as e:
     print('Failed to import clinic_app from clinic_website folder:', e)
     raise
 
 if __name__ == '__main__':
+    # built like clinic_website/app.py: a fresh checkout gets its tables created on startup
+    app = create_app({'AUTO_CREATE_SCHEMA': True})
+    with app.app_context():
+        jobs.start()
     app.run(debug=True)
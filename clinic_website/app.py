@@ -1,8 +1,12 @@
 """Wrapper to run the clinic app with `python app.py`.
-This imports `app` from `clinic_app.py` and starts it.
+This builds the app with `clinic_app.create_app()` and starts it.
 """
-from clinic_app import app
+from clinic_app import create_app, jobs
 
 if __name__ == '__main__':
-    # Use the same default as clinic_app.py (debug=True) for local development
+    # Use the same default as clinic_app.py (debug=True) for local development;
+    # a fresh checkout gets its tables created on startup
+    app = create_app({'AUTO_CREATE_SCHEMA': True})
+    with app.app_context():
+        jobs.start()
     app.run(debug=True)
@@ -0,0 +1,228 @@
+"""Static asset build and serving: compiled CSS, vendored libraries, fingerprinted files.
+
+Pages load no third-party CSS/JS/fonts. Every bundle is named by its logical path
+(`css/app.css`) and built from the sources in ENTRIES:
+
+    npm install && npm run build   # build:css (Tailwind, purged + minified), then build_assets.py
+
+writes static/dist/css/app.<hash>.css and friends, a .gz (and .br, with the
+`brotli` package) next to each text file, and static/dist/manifest.json mapping
+logical names to hashed ones. Templates link through `asset_url('css/app.css')`.
+
+/static/dist/ serves the hashed files with `Cache-Control: immutable` and picks the
+.br/.gz variant the client accepts (as does /static/ for any file with such a
+sibling). Without a manifest (a fresh checkout) the same
+URLs serve the logical bundles straight from their sources, uncached, so `flask run`
+works before the first build. In production let the proxy serve /static/dist/ the
+same way (nginx `gzip_static on;`, `expires max;`); see the README.
+
+CSS urls are written relative to the bundle's logical path (`../fonts/x.woff2` from
+`css/app.css`) and rewritten to the hashed names at build time.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import abort, current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+# logical name -> source files (relative to the app root), concatenated in order
+ENTRIES = {
+  'fonts/inter-latin-300-normal.woff2': ['node_modules/@fontsource/inter/files/inter-latin-300-normal.woff2'],
+  'fonts/inter-latin-400-normal.woff2': ['node_modules/@fontsource/inter/files/inter-latin-400-normal.woff2'],
+  'fonts/inter-latin-600-normal.woff2': ['node_modules/@fontsource/inter/files/inter-latin-600-normal.woff2'],
+  'fonts/inter-latin-700-normal.woff2': ['node_modules/@fontsource/inter/files/inter-latin-700-normal.woff2'],
+  'css/app.css': ['assets/fonts.css', 'static/css/tailwind.css', 'static/css/styles.css'],
+  'js/site.js': ['static/js/site.js'],
+  'js/chart.js': ['node_modules/chart.js/dist/chart.umd.js'],
+}
+
+DIST_DIR = 'static/dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# already compressed formats gain nothing from gzip
+COMPRESS_EXTS = ('.css', '.js', '.svg', '.json')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+mimetypes.add_type('font/woff2', '.woff2')
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+
+class MissingSource(Exception):
+  pass
+
+
+def minify_css(text):
+  """Comments and insignificant whitespace only; Tailwind's output is already minified."""
+  text = _CSS_COMMENT.sub('', text)
+  text = re.sub(r'\s+', ' ', text)
+  text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+  text = re.sub(r':\s+', ':', text)  # not before ':', where `a :hover` differs from `a:hover`
+  return text.replace(';}', '}').strip()
+
+
+def hashed_name(name, data):
+  base, ext = posixpath.splitext(name)
+  return f'{base}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+
+
+def rewrite_css_urls(name, text, manifest):
+  """Point relative url()s of bundle `name` at the hashed files in `manifest`."""
+  here = posixpath.dirname(name)
+
+  def _sub(m):
+    target = m.group(2)
+    if ':' in target or target.startswith(('/', '#')):
+      return m.group(0)
+    logical = posixpath.normpath(posixpath.join(here, target))
+    if logical not in manifest:
+      return m.group(0)
+    return f'url({posixpath.relpath(manifest[logical], here or ".")})'
+
+  return _CSS_URL.sub(_sub, text)
+
+
+def read_bundle(root, name, entries=ENTRIES, missing_ok=False):
+  parts = []
+  for src in entries[name]:
+    path = os.path.join(root, src)
+    if not os.path.exists(path):
+      if missing_ok:
+        continue
+      raise MissingSource(f'{name}: {src} not found (run `npm install` / `npm run build:css`)')
+    with open(path, 'rb') as f:
+      parts.append(f.read())
+  return b'\n'.join(parts)
+
+
+def _write(path, data):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'wb') as f:
+    f.write(data)
+
+
+def precompress(path, data):
+  """Write .gz (and .br when brotli is installed) beside `path` where it saves bytes."""
+  written = []
+  gz = gzip.compress(data, compresslevel=9, mtime=0)
+  if len(gz) < len(data):
+    _write(path + '.gz', gz)
+    written.append(path + '.gz')
+  try:
+    import brotli
+  except ImportError:
+    return written
+  br = brotli.compress(data, quality=11)
+  if len(br) < len(data):
+    _write(path + '.br', br)
+    written.append(path + '.br')
+  return written
+
+
+def build(root, out_dir=None, entries=ENTRIES):
+  """Build every entry into out_dir (default root/static/dist) and write the manifest.
+
+  Files from earlier builds are left in place, so pages rendered by workers that
+  are still on the previous manifest keep working during a rolling deploy.
+  """
+  out_dir = out_dir or os.path.join(root, DIST_DIR)
+  manifest = {}
+  # CSS last: its url()s need the hashed names of everything else
+  for name in sorted(entries, key=lambda n: n.endswith('.css')):
+    data = read_bundle(root, name, entries)
+    if name.endswith('.css'):
+      text = minify_css(data.decode('utf-8'))
+      data = rewrite_css_urls(name, text, manifest).encode('utf-8')
+    manifest[name] = hashed_name(name, data)
+    path = os.path.join(out_dir, manifest[name])
+    _write(path, data)
+    if name.endswith(COMPRESS_EXTS):
+      precompress(path, data)
+  _write(os.path.join(out_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+  return manifest
+
+
+class Assets:
+  """The manifest of one build directory, read once (on every change when auto_reload)."""
+
+  def __init__(self, root, out_dir=None, auto_reload=False):
+    self.root = root
+    self.out_dir = out_dir or os.path.join(root, DIST_DIR)
+    self.auto_reload = auto_reload
+    self._manifest = None
+    self._mtime = None
+
+  @property
+  def manifest(self):
+    path = os.path.join(self.out_dir, MANIFEST)
+    if self._manifest is not None and not self.auto_reload:
+      return self._manifest
+    try:
+      mtime = os.stat(path).st_mtime
+    except OSError:
+      self._manifest, self._mtime = {}, None
+      return self._manifest
+    if mtime != self._mtime:
+      with open(path) as f:
+        self._manifest, self._mtime = json.load(f), mtime
+    return self._manifest
+
+  def url(self, name):
+    return url_for('asset', filename=self.manifest.get(name, name))
+
+
+def asset_url(name):
+  """url_for() for a logical asset name, e.g. asset_url('css/app.css')."""
+  return current_app.extensions['assets'].url(name)
+
+
+def serve_asset(filename):
+  assets = current_app.extensions['assets']
+  # any build's files, not just the current manifest's (see build())
+  path = safe_join(assets.out_dir, filename)
+  if path and filename != MANIFEST and not filename.endswith(('.gz', '.br')) and os.path.isfile(path):
+    return send_precompressed(assets.out_dir, filename, immutable=True)
+  if filename in ENTRIES and not assets.manifest:
+    # no build yet: serve the sources as they are, and never cache them
+    data = read_bundle(assets.root, filename, missing_ok=True)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    return current_app.response_class(data, mimetype=mimetype, headers={'Cache-Control': 'no-cache'})
+  abort(404)
+
+
+def send_precompressed(directory, filename, immutable=False):
+  """send_from_directory(), preferring a .br/.gz sibling of the file the client accepts."""
+  mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+  encoding = None
+  if filename.endswith(COMPRESS_EXTS):
+    for name, suffix in ENCODINGS:
+      sibling = safe_join(directory, filename + suffix)
+      if request.accept_encodings[name] and sibling and os.path.isfile(sibling):
+        encoding, filename = name, filename + suffix
+        break
+  resp = send_from_directory(directory, filename, mimetype=mimetype, conditional=True)
+  if encoding:
+    resp.headers['Content-Encoding'] = encoding
+  if immutable:
+    resp.headers['Cache-Control'] = IMMUTABLE
+  if filename.endswith(COMPRESS_EXTS + ('.br', '.gz')):
+    resp.vary.add('Accept-Encoding')
+  return resp
+
+
+def serve_static(filename):
+  # Flask's /static/ view, plus any precompressed copy placed beside the file
+  return send_precompressed(current_app.static_folder, filename)
+
+
+def init_assets(app):
+  app.extensions['assets'] = Assets(app.root_path, auto_reload=app.debug)
+  app.add_url_rule('/static/dist/<path:filename>', 'asset', serve_asset)
+  app.view_functions['static'] = serve_static
+  app.add_template_global(asset_url)
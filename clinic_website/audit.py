@@ -0,0 +1,112 @@
+"""Audit log writer.
+
+Two kinds of entry:
+
+  critical   added to the caller's SQLAlchemy session, so it commits (or rolls
+             back) in the same transaction as the change it describes; use it
+             for edits/deletes of patient data and impersonation
+  buffered   appended to an in-process buffer and written later as one
+             multi-row INSERT, on its own connection, in batches
+
+Buffered entries are flushed when the buffer reaches AUDIT_BATCH_SIZE, every
+AUDIT_FLUSH_SECONDS by a background thread, and at process exit. With
+AUDIT_MODE=sync there is no thread; the buffer is flushed at the end of every
+request, so nothing is still pending once the response has gone out.
+
+Config:
+  AUDIT_MODE           'buffered' (default) or 'sync'
+  AUDIT_BATCH_SIZE     entries per INSERT / flush threshold (100)
+  AUDIT_FLUSH_SECONDS  longest a buffered entry waits (2)
+"""
+import atexit
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from per_app import per_app
+
+
+class AuditWriter:
+  def __init__(self, app=None, db=None, model=None):
+    self.app = app
+    self.db = db
+    self.model = model
+    self._buffer = []
+    self._lock = threading.Lock()
+    self._flush_lock = threading.Lock()
+    self._wake = threading.Event()
+    self._pid = None
+    if app is not None:
+      app.extensions['audit'] = self
+      app.teardown_request(self._teardown)
+      atexit.register(self.flush)
+
+  @property
+  def bound(self):
+    return self.app is not None
+
+  def init_app(self, app, db=None, model=None):
+    # each app buffers and flushes its own entries; calls here go to current_app's writer
+    AuditWriter(app, db or self.db, model or self.model)
+
+  @per_app('audit')
+  def record(self, actor, action, critical=False):
+    if critical:
+      self.db.session.add(self.model(actor=actor, action=action, created_at=datetime.utcnow()))
+      return
+    with self._lock:
+      self._buffer.append({'actor': actor, 'action': action, 'created_at': datetime.utcnow()})
+      full = len(self._buffer) >= self.app.config.get('AUDIT_BATCH_SIZE', 100)
+    if self.app.config.get('AUDIT_MODE', 'buffered') != 'sync':
+      self._ensure_flusher()
+    if full:
+      self._wake.set()
+
+  @per_app('audit')
+  def pending(self):
+    with self._lock:
+      return len(self._buffer)
+
+  @per_app('audit')
+  def flush(self):
+    """Write every buffered entry now. Returns the number of rows inserted."""
+    with self._flush_lock:
+      with self._lock:
+        rows, self._buffer = self._buffer, []
+      if not rows:
+        return 0
+      batch = self.app.config.get('AUDIT_BATCH_SIZE', 100)
+      try:
+        with self.app.app_context(), self.db.engine.begin() as conn:
+          for i in range(0, len(rows), batch):
+            conn.execute(insert(self.model), rows[i:i + batch])
+      except Exception:
+        # keep the entries (ahead of anything recorded meanwhile) for the next attempt
+        with self._lock:
+          self._buffer[:0] = rows
+        self.app.logger.exception('audit flush failed; %d entries kept in memory', len(rows))
+        return 0
+      return len(rows)
+
+  def _teardown(self, exc):
+    if self.app.config.get('AUDIT_MODE', 'buffered') == 'sync' or \
+       self.pending() >= self.app.config.get('AUDIT_BATCH_SIZE', 100):
+      self.flush()
+
+  def _ensure_flusher(self):
+    if self._pid == os.getpid():
+      return
+    with self._lock:
+      if self._pid == os.getpid():
+        return
+      self._pid = os.getpid()  # one flusher per process, restarted after fork
+      threading.Thread(target=self._flush_loop, name='audit-flusher', daemon=True).start()
+
+  def _flush_loop(self):
+    interval = self.app.config.get('AUDIT_FLUSH_SECONDS', 2)
+    while True:
+      self._wake.wait(interval)
+      self._wake.clear()
+      self.flush()
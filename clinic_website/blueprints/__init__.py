@@ -0,0 +1,18 @@
+"""The site's views, one blueprint per audience.
+
+  public   home, services, blog, booking ... (anonymous, page-cached)
+  patient  login, dashboard, vitals and their API/export, file list
+  staff    staff login/dashboard, bulk export, impersonation
+  admin    admin login/dashboard and patient/staff/content management
+  files    uploads (form and resumable API), previews and downloads
+  calendar .ics appointment feeds for calendar apps (signed-token URLs)
+
+URLs are unchanged from the single-module app; endpoints are now namespaced,
+e.g. url_for('files.download', file_id=...).
+"""
+
+
+def register_blueprints(app):
+  from blueprints import admin, calendar, files, patient, public, staff
+  for module in (public, patient, staff, admin, files, calendar):
+    app.register_blueprint(module.bp)
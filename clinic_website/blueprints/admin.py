@@ -0,0 +1,240 @@
+from datetime import date, time
+
+from flask import Blueprint, current_app, flash, jsonify, redirect, render_template, request, session, url_for
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from extensions import audit, content_cache, db, jobs, limiter
+from helpers import admin_required, paginate
+from models import Appointment, AuditLog, BlogPost, FAQ, Patient, Schedule, Staff
+from passwords import hash_password
+from query_guard import query_budget
+from ratelimit import retry_headers
+from sessions import rotate
+from uploads import release_blobs
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+  if request.method == 'POST':
+    wait = limiter.throttle_login()
+    if wait:
+      flash('Too many login attempts. Please wait a minute and try again.')
+      return render_template('admin_login.html'), 429, retry_headers(wait)
+    pw = request.form.get('password')
+    if pw == current_app.config['ADMIN_PASS']:
+      rotate()
+      session['is_admin'] = True
+      return redirect(url_for('admin.dashboard'))
+    flash('Incorrect admin password')
+  return render_template('admin_login.html')
+
+
+@bp.route('')
+@admin_required
+@query_budget(6)  # two paged lists (count + page each), plus the staff lookup on a cold session
+def dashboard():
+  # the template shows a.patient.name for every row; load patients in the same query
+  appts = paginate(select(Appointment).options(joinedload(Appointment.patient), joinedload(Appointment.doctor))
+                   .order_by(Appointment.date.asc()), page_arg='appt_page')
+  patients = paginate(select(Patient).order_by(Patient.created_at.desc()), page_arg='patient_page')
+  return render_template('admin_dash.html', appts=appts, patients=patients)
+
+
+@bp.route('/new-patient', methods=['GET', 'POST'])
+@admin_required
+def new_patient():
+  if request.method == 'POST':
+    name = request.form.get('name')
+    email = request.form.get('email')
+    phone = request.form.get('phone')
+    pw = request.form.get('password') or 'changeme'
+    if Patient.query.filter_by(email=email).first():
+      flash('Patient with this email already exists')
+      return redirect(url_for('admin.dashboard'))
+    p = Patient(name=name, email=email, phone=phone, password_hash=hash_password(pw))
+    db.session.add(p)
+    db.session.commit()
+    flash('Patient created — share credentials securely')
+    return redirect(url_for('admin.dashboard'))
+  return "<form method='post'>Name: <input name='name'/><br/>Email: <input name='email'/><br/>Phone: <input name='phone'/><br/>Password: <input name='password'/><br/><button>Create</button></form>"
+
+
+@bp.route('/new-post', methods=['GET', 'POST'])
+@admin_required
+def new_post():
+    if request.method == 'POST':
+        title = request.form.get('title')
+        content = request.form.get('content')
+        slug = title.lower().replace(' ', '-')
+        p = BlogPost(title=title, slug=slug, content=content)
+        db.session.add(p)
+        db.session.commit()
+        flash('Post added')
+        return redirect(url_for('admin.dashboard'))
+    return "<form method='post'>Title: <input name='title' /><br/>Content:<br/><textarea name='content'></textarea><br/><button>Save</button></form>"
+
+@bp.route('/new-faq', methods=['GET', 'POST'])
+@admin_required
+def new_faq():
+    if request.method == 'POST':
+        q = request.form.get('q')
+        a = request.form.get('a')
+        f = FAQ(q=q, a=a)
+        db.session.add(f)
+        db.session.commit()
+        flash('FAQ added')
+        return redirect(url_for('admin.dashboard'))
+    return "<form method='post'>Q: <input name='q' /><br/>A:<br/><textarea name='a'></textarea><br/><button>Save</button></form>"
+
+
+@bp.route('/new-staff', methods=['GET', 'POST'])
+@admin_required
+def new_staff():
+  if request.method == 'POST':
+    name = request.form.get('name')
+    email = request.form.get('email')
+    role = request.form.get('role') or 'staff'
+    pw = request.form.get('password') or 'changeme'
+    if Staff.query.filter_by(email=email).first():
+      flash('Staff with this email already exists')
+      return redirect(url_for('admin.dashboard'))
+    s = Staff(name=name, email=email, role=role, password_hash=hash_password(pw))
+    db.session.add(s)
+    db.session.commit()
+    flash('Staff account created')
+    return redirect(url_for('admin.dashboard'))
+  return "<form method='post'>Name: <input name='name'/><br/>Email: <input name='email'/><br/>Role: <input name='role' value='staff'/><br/>Password: <input name='password'/><br/><button>Create</button></form>"
+
+
+@bp.route('/cache-stats')
+@admin_required
+def cache_stats():
+  return jsonify(content_cache.stats())
+
+
+@bp.route('/template-stats')
+@admin_required
+def template_stats():
+  return jsonify(current_app.extensions['template_stats'].snapshot())
+
+
+@bp.route('/audit')
+@admin_required
+def audit_log():
+  audit.flush()  # show entries still sitting in the buffer
+  entries = paginate(select(AuditLog).order_by(AuditLog.created_at.desc()))
+  return render_template('admin_audit.html', entries=entries)
+
+
+@bp.route('/staff')
+@admin_required
+def staff_list():
+  staff = paginate(select(Staff).order_by(Staff.created_at.desc()))
+  return render_template('admin_staff.html', staff=staff)
+
+
+@bp.route('/staff/edit/<int:staff_id>', methods=['GET', 'POST'])
+@admin_required
+def edit_staff(staff_id):
+  s = Staff.query.get_or_404(staff_id)
+  if request.method == 'POST':
+    s.name = request.form.get('name')
+    s.email = request.form.get('email')
+    s.role = request.form.get('role')
+    pw = request.form.get('password')
+    if pw:
+      s.password_hash = hash_password(pw)
+    db.session.commit()
+    flash('Staff updated')
+    return redirect(url_for('admin.staff_list'))
+  return render_template('admin_edit_staff.html', staff=s)
+
+
+@bp.route('/staff/delete/<int:staff_id>', methods=['POST'])
+@admin_required
+def delete_staff(staff_id):
+  s = Staff.query.get_or_404(staff_id)
+  db.session.delete(s)
+  db.session.commit()
+  flash('Staff deleted')
+  return redirect(url_for('admin.staff_list'))
+
+
+@bp.route('/schedules', methods=['GET', 'POST'])
+@admin_required
+def schedules():
+  if request.method == 'POST':
+    try:
+      start = time.fromisoformat(request.form.get('start', ''))
+      end = time.fromisoformat(request.form.get('end', ''))
+      until = request.form.get('valid_until')
+      s = Schedule(staff_id=int(request.form['staff_id']), weekday=int(request.form['weekday']), start=start, end=end,
+                   slot_minutes=int(request.form.get('slot_minutes') or 20),
+                   valid_until=date.fromisoformat(until) if until else None)
+    except (KeyError, ValueError):
+      flash('Invalid schedule')
+      return redirect(url_for('admin.schedules'))
+    if s.end <= s.start or s.slot_minutes < 5:
+      flash('The schedule must end after it starts, with slots of at least 5 minutes')
+      return redirect(url_for('admin.schedules'))
+    db.session.add(s)
+    db.session.commit()
+    flash('Schedule added')
+    return redirect(url_for('admin.schedules'))
+  rows = db.session.execute(select(Schedule).options(joinedload(Schedule.doctor))
+                            .order_by(Schedule.staff_id, Schedule.weekday, Schedule.start)).scalars().all()
+  doctors = db.session.execute(select(Staff).order_by(Staff.name)).scalars().all()
+  return render_template('admin_schedules.html', schedules=rows, doctors=doctors, weekdays=WEEKDAYS)
+
+
+@bp.route('/schedules/delete/<int:schedule_id>', methods=['POST'])
+@admin_required
+def delete_schedule(schedule_id):
+  db.session.delete(Schedule.query.get_or_404(schedule_id))
+  db.session.commit()
+  flash('Schedule removed')
+  return redirect(url_for('admin.schedules'))
+
+
+@bp.route('/patients')
+@admin_required
+def patients():
+  patients = paginate(select(Patient).order_by(Patient.created_at.desc()))
+  return render_template('admin_patients.html', patients=patients)
+
+
+@bp.route('/patient/edit/<int:patient_id>', methods=['GET', 'POST'])
+@admin_required
+def edit_patient(patient_id):
+  p = Patient.query.get_or_404(patient_id)
+  if request.method == 'POST':
+    p.name = request.form.get('name')
+    p.email = request.form.get('email')
+    p.phone = request.form.get('phone')
+    pw = request.form.get('password')
+    if pw:
+      p.password_hash = hash_password(pw)
+    # the change and its audit entry commit together
+    audit.record(session.get('staff_email') or 'admin', f'Edited patient {p.id} by admin', critical=True)
+    db.session.commit()
+    flash('Patient updated')
+    return redirect(url_for('admin.patients'))
+  return render_template('admin_edit_patient.html', patient=p)
+
+
+@bp.route('/patient/delete/<int:patient_id>', methods=['POST'])
+@admin_required
+def delete_patient(patient_id):
+  p = Patient.query.get_or_404(patient_id)
+  release_blobs([f.storage_key for f in p.files] + [f.preview_key for f in p.files])
+  db.session.delete(p)
+  audit.record(session.get('staff_email') or 'admin', f'Deleted patient {patient_id} by admin', critical=True)
+  db.session.commit()
+  jobs.kick()
+  flash('Patient deleted')
+  return redirect(url_for('admin.patients'))
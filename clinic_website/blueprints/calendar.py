@@ -0,0 +1,34 @@
+from flask import Blueprint, abort, current_app, request
+
+import ics
+
+bp = Blueprint('calendar', __name__, url_prefix='/calendar')
+
+# calendar apps poll on their own schedule; this only stops a browser re-fetching within minutes
+FEED_MAX_AGE = 300
+
+
+def _feed(kind, owner_id):
+  if not ics.check_token(request.args.get('token'), kind, owner_id):
+    abort(404)
+  ver = ics.version(kind, owner_id)
+  etag = ics.etag_for(kind, owner_id, ver)
+  if etag in request.if_none_match:
+    # the common case for a poller: one aggregate query and no body
+    resp = current_app.response_class(status=304)
+  else:
+    feed = ics.build(kind, owner_id, ver)
+    resp = current_app.response_class(feed.body, mimetype='text/calendar')
+  resp.set_etag(etag)
+  resp.headers['Cache-Control'] = f'private, max-age={FEED_MAX_AGE}'
+  return resp
+
+
+@bp.route('/doctor/<int:owner_id>.ics')
+def doctor_feed(owner_id):
+  return _feed('doctor', owner_id)
+
+
+@bp.route('/patient/<int:owner_id>.ics')
+def patient_feed(owner_id):
+  return _feed('patient', owner_id)
@@ -0,0 +1,310 @@
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from flask import (Blueprint, abort, current_app, flash, jsonify, redirect, request, send_file, session,
+                   url_for)
+from itsdangerous import BadData
+from sqlalchemy import update
+from werkzeug.utils import send_file as werkzeug_send_file
+
+import previews
+from extensions import audit, db, file_store, jobs
+from helpers import get_serializer, staff_logged_in, staff_required
+from models import Patient, PatientFile, UploadSession
+from sessions import current_patient
+from uploads import (SNIFF_BYTES, UPLOAD_CHUNK_BYTES, UploadTooLarge, allowed_file, copy_upload, discard_partial,
+                     file_ext, legacy_upload_path, looks_like_image, partial_path)
+
+bp = Blueprint('files', __name__)
+
+PREVIEW_MAX_AGE = 365 * 24 * 3600
+RESUMABLE_CHUNK_BYTES = 4 * 1024 * 1024  # suggested to clients; must stay under MAX_CONTENT_LENGTH
+
+
+@bp.app_errorhandler(413)
+def request_too_large(e):
+  if request.endpoint == 'files.upload':
+    flash('File too large (max 8 MB)')
+    return redirect(url_for('admin.dashboard'))
+  return e
+
+
+@bp.route('/admin/upload/<int:patient_id>', methods=['GET', 'POST'])
+@staff_required
+def upload(patient_id):
+  p = Patient.query.get_or_404(patient_id)
+  if request.method == 'POST':
+    f = request.files.get('file')
+    if not f:
+      flash('No file uploaded')
+      return redirect(url_for('admin.dashboard'))
+    if not allowed_file(f.filename):
+      flash('File type not allowed')
+      return redirect(url_for('admin.dashboard'))
+    orig_name = f.filename
+    # type checks only need the first few KB: images via imghdr, PDFs by header
+    head = f.stream.read(SNIFF_BYTES)
+    ext = file_ext(orig_name)
+    if ext in ('jpg','jpeg','png'):
+      if not looks_like_image(head):
+        flash('Uploaded image appears invalid')
+        return redirect(url_for('admin.dashboard'))
+    if ext == 'pdf':
+      if not head[:4] == b'%PDF':
+        flash('Uploaded PDF appears invalid')
+        return redirect(url_for('admin.dashboard'))
+    # stream into the store's staging area, then file it under its sha256
+    staged = file_store.staging_path()
+    try:
+      size, digest = copy_upload(f.stream, staged, head=head)
+    except UploadTooLarge:
+      flash('File too large (max 8 MB)')
+      return redirect(url_for('admin.dashboard'))
+    file_store.put_file(staged, digest)
+    pf = PatientFile(patient=p, original_name=orig_name, size=size, sha256=digest, storage_key=digest)
+    db.session.add(pf)
+    # audit log
+    actor = session.get('staff_email') or session.get('patient_email') or 'system'
+    # the upload row is committed anyway, so its audit entry rides in the same transaction
+    audit.record(actor, f"Uploaded file {orig_name} for patient {p.id}", critical=True)
+    db.session.commit()
+    # python-magic sniffing (and the alert if it looks wrong) happens on a job worker
+    jobs.enqueue('sniff_upload', {'file_id': pf.id, 'actor': actor})
+    if previews.supported(ext):
+      jobs.enqueue('make_preview', {'file_id': pf.id})
+    flash('File uploaded')
+    return redirect(url_for('admin.dashboard'))
+  return f"<form method='post' enctype='multipart/form-data'>Upload for {p.name}: <input type='file' name='file'/> <button>Upload</button></form>"
+
+
+# Resumable uploads: POST /api/uploads -> PUT chunks at ?offset= -> POST .../finalize.
+# Each chunk is one ordinary request (so MAX_CONTENT_LENGTH still bounds it) streamed
+# onto a partial file, which lets a file be far bigger than MAX_FILE_BYTES.
+def upload_state(up):
+  return {'id': up.id, 'offset': up.received, 'size': up.size, 'chunk_size': RESUMABLE_CHUNK_BYTES,
+          'expires_at': up.expires_at.isoformat()}
+
+
+def get_upload_or_404(upload_id):
+  up = db.session.get(UploadSession, upload_id)
+  if up is None or up.expires_at < datetime.utcnow():
+    abort(404)
+  return up
+
+
+@bp.route('/api/uploads', methods=['POST'])
+@staff_required
+def upload_init():
+  data = request.get_json(silent=True) or {}
+  patient = db.session.get(Patient, data.get('patient_id') or 0)
+  name = data.get('filename') or ''
+  size = data.get('size')
+  max_bytes = current_app.config['RESUMABLE_MAX_BYTES']
+  if patient is None:
+    return jsonify({'error': 'unknown patient'}), 400
+  if not allowed_file(name):
+    return jsonify({'error': 'file type not allowed'}), 400
+  if not isinstance(size, int) or size <= 0:
+    return jsonify({'error': 'size must be a positive integer'}), 400
+  if size > max_bytes:
+    return jsonify({'error': f'file too large (max {max_bytes} bytes)'}), 413
+  up = UploadSession(id=uuid.uuid4().hex, patient_id=patient.id, original_name=name, size=size,
+                     sha256=(data.get('sha256') or '').lower() or None, received=0,
+                     created_by=session.get('staff_email') or 'admin',
+                     expires_at=datetime.utcnow() + timedelta(hours=current_app.config['RESUMABLE_TTL_HOURS']))
+  os.makedirs(os.path.dirname(partial_path(up.id)), exist_ok=True)
+  open(partial_path(up.id), 'wb').close()
+  db.session.add(up)
+  db.session.commit()
+  resp = jsonify(upload_state(up))
+  resp.headers['Location'] = url_for('files.upload_chunk', upload_id=up.id)
+  return resp, 201
+
+
+@bp.route('/api/uploads/<upload_id>', methods=['GET', 'HEAD'])
+@staff_required
+def upload_status(upload_id):
+  up = get_upload_or_404(upload_id)
+  resp = jsonify(upload_state(up))
+  resp.headers['Upload-Offset'] = str(up.received)
+  return resp
+
+
+@bp.route('/api/uploads/<upload_id>', methods=['PUT'])
+@staff_required
+def upload_chunk(upload_id):
+  """Write the request body at ?offset=. Re-sending a chunk that already landed is harmless."""
+  up = get_upload_or_404(upload_id)
+  offset = request.args.get('offset', type=int)
+  if offset is None or offset < 0:
+    return jsonify({'error': 'offset must be a non-negative integer'}), 400
+  if offset > up.received:
+    # a gap: tell the client where to resume from
+    return jsonify(dict(upload_state(up), error='offset is past the received data')), 409
+  length = request.content_length
+  if length is None:
+    return jsonify({'error': 'Content-Length is required'}), 411
+  if offset + length > up.size:
+    return jsonify({'error': 'chunk runs past the declared size'}), 400
+  stream = request.stream
+  skip = up.received - offset  # bytes of this chunk we already have (a retried request)
+  while skip > 0:
+    chunk = stream.read(min(skip, UPLOAD_CHUNK_BYTES))
+    if not chunk:
+      break
+    skip -= len(chunk)
+  start = max(offset, up.received)
+  written = 0
+  if offset + length > up.received:
+    with open(partial_path(up.id), 'r+b') as out:
+      out.seek(start)
+      while True:
+        chunk = stream.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+          break
+        out.write(chunk)
+        written += len(chunk)
+      out.truncate()
+  # a concurrent PUT for the same range may have won; only advance from where we started
+  res = db.session.execute(update(UploadSession)
+                           .where(UploadSession.id == up.id, UploadSession.received == start)
+                           .values(received=start + written))
+  db.session.commit()
+  if written and res.rowcount != 1:
+    db.session.refresh(up)
+    return jsonify(dict(upload_state(up), error='conflicting write, resume from offset')), 409
+  db.session.refresh(up)
+  resp = jsonify(upload_state(up))
+  resp.headers['Upload-Offset'] = str(up.received)
+  return resp
+
+
+@bp.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@staff_required
+def upload_finalize(upload_id):
+  up = get_upload_or_404(upload_id)
+  if up.received != up.size:
+    return jsonify(dict(upload_state(up), error='upload is incomplete')), 409
+  expected = ((request.get_json(silent=True) or {}).get('sha256') or up.sha256 or '').lower()
+  if not expected:
+    return jsonify({'error': 'sha256 is required'}), 400
+  path = partial_path(up.id)
+  with open(path, 'rb') as fh:
+    head = fh.read(SNIFF_BYTES)
+    staged = file_store.staging_path()
+    size, digest = copy_upload(fh, staged, limit=up.size, head=head)
+  if digest != expected:
+    os.remove(staged)
+    return jsonify({'error': 'checksum mismatch', 'sha256': digest}), 422
+  ext = file_ext(up.original_name)
+  if (ext in ('jpg', 'jpeg', 'png') and not looks_like_image(head)) or (ext == 'pdf' and head[:4] != b'%PDF'):
+    os.remove(staged)
+    return jsonify({'error': 'file content does not match its type'}), 422
+  file_store.put_file(staged, digest)
+  pf = PatientFile(patient_id=up.patient_id, original_name=up.original_name, size=size, sha256=digest,
+                   storage_key=digest)
+  db.session.add(pf)
+  actor = session.get('staff_email') or 'admin'
+  audit.record(actor, f"Uploaded file {up.original_name} for patient {up.patient_id}", critical=True)
+  db.session.delete(up)
+  db.session.commit()
+  os.remove(path)
+  jobs.enqueue('sniff_upload', {'file_id': pf.id, 'actor': actor})
+  if previews.supported(ext):
+    jobs.enqueue('make_preview', {'file_id': pf.id})
+  return jsonify({'file_id': pf.id, 'size': size, 'sha256': digest}), 201
+
+
+@bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@staff_required
+def upload_abort(upload_id):
+  up = get_upload_or_404(upload_id)
+  db.session.delete(up)
+  db.session.commit()
+  discard_partial(up.id)
+  return '', 204
+
+
+def file_access_allowed(pf):
+  # Allow access if:
+  # - the requester is the patient owning the file, OR
+  # - the requester is staff/admin, OR
+  # - a valid signed token is provided as ?token=...
+  patient = current_patient()
+  if patient and patient['id'] == pf.patient_id:
+    return True
+  if session.get('is_admin') or staff_logged_in():
+    return True
+  token = request.args.get('token')
+  if token:
+    s = get_serializer()
+    try:
+      data = s.loads(token, max_age=3600)
+      # token payload should be {'file_id': <id>}
+      return isinstance(data, dict) and data.get('file_id') == pf.id
+    except BadData:
+      return False
+  return False
+
+
+@bp.route('/patient/files/<int:file_id>/preview')
+def preview(file_id):
+  pf = PatientFile.query.get_or_404(file_id)
+  # check access first, so a stranger cannot tell which files have a preview
+  if not file_access_allowed(pf):
+    abort(403)
+  if not pf.preview_key:
+    abort(404)
+  # the URL carries ?v=<preview_key>, so a given URL's bytes never change
+  fh = file_store.open(pf.preview_key)
+  resp = send_file(fh, mimetype='image/jpeg', etag=pf.preview_key, conditional=True, max_age=PREVIEW_MAX_AGE)
+  resp.cache_control.public = False
+  resp.cache_control.private = True
+  resp.cache_control.immutable = True
+  return resp
+
+
+@bp.app_template_filter('preview_meta')
+def preview_meta_filter(pf):
+  return json.loads(pf.preview_meta) if pf.preview_meta else {}
+
+
+@bp.route('/patient/files/<int:file_id>/download')
+def download(file_id):
+  pf = PatientFile.query.get_or_404(file_id)
+  if not file_access_allowed(pf):
+    flash('Not authorised')
+    return redirect(url_for('patient.login'))
+  return serve_patient_file(pf)
+
+
+def serve_patient_file(pf):
+  """Response for an already-authorised download.
+
+  Blob contents never change for a key, so the sha256 is a strong ETag: browsers
+  revalidate with If-None-Match and resume with Range/If-Range. With an offload mode
+  only headers are produced here and the proxy streams the file (and handles Range
+  itself); otherwise the file goes through wsgi.file_wrapper, which gunicorn serves
+  with sendfile().
+  """
+  key = pf.storage_key
+  if key and file_store.local_path(key) is None:
+    # remote store: let the client fetch straight from it
+    return redirect(file_store.download_url(key, pf.original_name))
+  path = file_store.local_path(key) if key else legacy_upload_path(pf)
+  mode = current_app.config['DOWNLOAD_OFFLOAD'] if key else ''
+  environ = request.environ
+  if mode:
+    # ranges are the proxy's job; answering one here would label the whole file 206
+    environ = {k: v for k, v in environ.items() if k not in ('HTTP_RANGE', 'HTTP_IF_RANGE')}
+  resp = werkzeug_send_file(path, environ, download_name=pf.original_name, as_attachment=True,
+                            etag=key or True, conditional=True, use_x_sendfile=bool(mode))
+  resp.cache_control.private = True
+  if not mode:
+    resp.headers.setdefault('Accept-Ranges', 'bytes')  # advertise resumability on full responses too
+  if mode == 'x-accel' and 'X-Sendfile' in resp.headers:
+    rel = os.path.relpath(resp.headers.pop('X-Sendfile'), file_store.root).replace(os.sep, '/')
+    resp.headers['X-Accel-Redirect'] = current_app.config['DOWNLOAD_ACCEL_PREFIX'] + rel
+  return resp
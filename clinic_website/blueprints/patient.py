@@ -0,0 +1,235 @@
+import base64
+from datetime import datetime
+
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, session, url_for
+from sqlalchemy import and_, or_, select
+
+import ics
+import passwords
+from extensions import db, limiter
+from helpers import csv_response, parse_iso_arg, patient_data_allowed, stream_csv
+from models import Patient, PatientFile, Vitals
+from ratelimit import retry_headers
+from sessions import current_patient, rotate
+
+bp = Blueprint('patient', __name__)
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+  if request.method == 'POST':
+    email = request.form.get('email')
+    password = request.form.get('password')
+    wait = limiter.throttle_login(email)
+    if wait:
+      flash('Too many login attempts. Please wait a minute and try again.')
+      return render_template('login.html', title='Login'), 429, retry_headers(wait)
+    p = Patient.query.filter_by(email=email).first()
+    if not passwords.verify(p, password):
+      flash('Invalid credentials')
+      return redirect(url_for('patient.login'))
+    db.session.commit()  # a rehashed password, if verify() upgraded it
+    rotate()
+    session['patient_email'] = p.email
+    session['patient_id'] = p.id
+    flash('Logged in')
+    return redirect(url_for('patient.dashboard'))
+  return render_template('login.html', title='Login')
+
+@bp.route('/logout')
+def logout():
+    session.clear()
+    rotate()
+    flash('Logged out')
+    return redirect(url_for('public.home'))
+
+@bp.route('/dashboard')
+def dashboard():
+    if not session.get('patient_email'):
+        flash('Please login to view your dashboard.')
+        return redirect(url_for('patient.login'))
+    patient = current_patient()
+    if patient is None:
+        flash('Please login to view your dashboard.')
+        return redirect(url_for('patient.login'))
+    feed = ics.feed_url('patient', patient['id'])
+    return render_template('dashboard.html', patient=patient, title='Dashboard', calendar_feed=feed)
+
+@bp.route('/vitals', methods=['POST'])
+def vitals():
+    if not session.get('patient_email'):
+        flash('Please login to save vitals.')
+        return redirect(url_for('patient.login'))
+    patient = current_patient()
+    if patient is None:
+        flash('Please login to save vitals.')
+        return redirect(url_for('patient.login'))
+    systolic = request.form.get('systolic')
+    diastolic = request.form.get('diastolic')
+    glucose = request.form.get('glucose')
+    note = request.form.get('note')
+    v = Vitals(patient_id=patient['id'], systolic=int(systolic), diastolic=int(diastolic), glucose=float(glucose) if glucose else None, note=note)
+    db.session.add(v)
+    db.session.commit()
+    flash('Reading saved')
+    return redirect(url_for('patient.dashboard'))
+
+# Page size for /api/vitals. Callers may ask for fewer rows with ?limit= but never more.
+VITALS_PAGE_SIZE = 500
+VITALS_MAX_PAGE_SIZE = 5000
+# Upper bound on points/buckets in a chart response (resolution= / points= modes).
+VITALS_MAX_POINTS = 1000
+
+
+def encode_vitals_cursor(measured_at, row_id):
+  raw = f"{measured_at.isoformat()}|{row_id}".encode('utf-8')
+  return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_vitals_cursor(token):
+  """Return (measured_at, id) for a cursor produced by encode_vitals_cursor, or None if malformed."""
+  try:
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+    ts, row_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(ts), int(row_id)
+  except Exception:
+    return None
+
+
+def vitals_chart_series(patient_id, since, until, resolution, points):
+  """Bounded chart payload for api_vitals: bucket aggregates or an LTTB downsample."""
+  import vitals_agg
+  try:
+    points = max(1, min(int(points), VITALS_MAX_POINTS)) if points else VITALS_MAX_POINTS
+  except ValueError:
+    return jsonify({'error': 'points must be an integer'}), 400
+  if resolution and resolution not in vitals_agg.RESOLUTIONS:
+    return jsonify({'error': "resolution must be 'hour', 'day' or 'week'"}), 400
+  series = request.args.get('series', 'systolic')
+  if series not in vitals_agg.SERIES:
+    return jsonify({'error': 'unknown series'}), 400
+  stmt = select(Vitals.measured_at, Vitals.systolic, Vitals.diastolic, Vitals.glucose) \
+    .where(Vitals.patient_id == patient_id)
+  if since:
+    stmt = stmt.where(Vitals.measured_at >= since)
+  if until:
+    stmt = stmt.where(Vitals.measured_at < until)
+  stmt = stmt.order_by(Vitals.measured_at.asc(), Vitals.id.asc())
+  ts, cols = vitals_agg.to_arrays(db.session.execute(stmt).all())
+  if resolution:
+    return jsonify(vitals_agg.aggregate(ts, cols, resolution, max_buckets=points))
+  return jsonify(vitals_agg.downsample(ts, cols, max(points, 3), series=series))
+
+
+@bp.route('/api/vitals/<int:patient_id>')
+def api_vitals(patient_id):
+  """Vitals for one patient, oldest first, one page at a time.
+
+  Query args:
+    since / until  ISO timestamps bounding measured_at (inclusive / exclusive)
+    limit          page size (default VITALS_PAGE_SIZE, capped at VITALS_MAX_PAGE_SIZE)
+    cursor         opaque token from the previous page's next_cursor
+    format         'rows' (default, list of objects) or 'columnar' (parallel arrays)
+    resolution     'hour' | 'day' | 'week': per-bucket min/mean/max instead of raw rows
+    points         LTTB-downsample raw readings to at most this many points
+
+  The next page cursor is returned in the X-Next-Cursor and Link headers (and in the
+  body for columnar responses); it is absent on the last page. resolution/points
+  responses cover the whole since/until range and are never paged.
+
+  Only the patient, or a staff/admin login, may read them.
+  """
+  if not patient_data_allowed(patient_id):
+    return jsonify({'error': 'not authorised'}), 403
+  try:
+    since = parse_iso_arg('since')
+    until = parse_iso_arg('until')
+  except ValueError:
+    return jsonify({'error': 'since/until must be ISO-8601 timestamps'}), 400
+  try:
+    limit = int(request.args.get('limit', VITALS_PAGE_SIZE))
+  except ValueError:
+    return jsonify({'error': 'limit must be an integer'}), 400
+  limit = max(1, min(limit, VITALS_MAX_PAGE_SIZE))
+  fmt = request.args.get('format', 'rows')
+  if fmt not in ('rows', 'columnar'):
+    return jsonify({'error': "format must be 'rows' or 'columnar'"}), 400
+  resolution = request.args.get('resolution')
+  points = request.args.get('points')
+  if resolution or points:
+    return vitals_chart_series(patient_id, since, until, resolution, points)
+
+  # Column-only select: rows come back as plain tuples, no ORM identity map work.
+  stmt = select(Vitals.id, Vitals.measured_at, Vitals.systolic, Vitals.diastolic, Vitals.glucose, Vitals.note) \
+    .where(Vitals.patient_id == patient_id)
+  if since:
+    stmt = stmt.where(Vitals.measured_at >= since)
+  if until:
+    stmt = stmt.where(Vitals.measured_at < until)
+  cursor = request.args.get('cursor')
+  if cursor:
+    after = decode_vitals_cursor(cursor)
+    if after is None:
+      return jsonify({'error': 'invalid cursor'}), 400
+    after_ts, after_id = after
+    stmt = stmt.where(or_(Vitals.measured_at > after_ts,
+                          and_(Vitals.measured_at == after_ts, Vitals.id > after_id)))
+  # fetch one extra row to learn whether another page exists
+  stmt = stmt.order_by(Vitals.measured_at.asc(), Vitals.id.asc()).limit(limit + 1)
+  rows = db.session.execute(stmt).all()
+
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_cursor = encode_vitals_cursor(rows[-1].measured_at, rows[-1].id)
+
+  if fmt == 'columnar':
+    resp = jsonify({
+      'id': [r.id for r in rows],
+      'measured_at': [r.measured_at.isoformat() for r in rows],
+      'systolic': [r.systolic for r in rows],
+      'diastolic': [r.diastolic for r in rows],
+      'glucose': [r.glucose for r in rows],
+      'next_cursor': next_cursor,
+    })
+  else:
+    resp = jsonify([{
+      'id': r.id,
+      'systolic': r.systolic,
+      'diastolic': r.diastolic,
+      'glucose': r.glucose,
+      'note': r.note,
+      'measured_at': r.measured_at.isoformat()
+    } for r in rows])
+  if next_cursor:
+    resp.headers['X-Next-Cursor'] = next_cursor
+    args = request.args.to_dict()
+    args['cursor'] = next_cursor
+    resp.headers['Link'] = f"<{url_for('patient.api_vitals', patient_id=patient_id, **args)}>; rel=\"next\""
+  return resp
+
+
+@bp.route('/export/vitals/<int:patient_id>')
+def export_vitals(patient_id):
+    if not patient_data_allowed(patient_id):
+        flash('Not authorised')
+        return redirect(url_for('patient.login'))
+    stmt = select(Vitals.measured_at, Vitals.systolic, Vitals.diastolic, Vitals.glucose, Vitals.note) \
+        .where(Vitals.patient_id == patient_id) \
+        .order_by(Vitals.measured_at.asc(), Vitals.id.asc())
+    chunks = stream_csv(stmt, ['measured_at','systolic','diastolic','glucose','note'],
+                        lambda r: [r.measured_at.isoformat(), r.systolic, r.diastolic, r.glucose, r.note])
+    return csv_response(chunks, 'vitals.csv')
+
+
+@bp.route('/patient/files')
+def files():
+  if not session.get('patient_email'):
+    flash('Please login to view files')
+    return redirect(url_for('patient.login'))
+  patient = current_patient()
+  if patient is None:
+    flash('Please login to view files')
+    return redirect(url_for('patient.login'))
+  files = PatientFile.query.filter_by(patient_id=patient['id']).order_by(PatientFile.uploaded_at.desc()).all()
+  return render_template('patient_files.html', files=files, patient=patient)
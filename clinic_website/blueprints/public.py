@@ -0,0 +1,186 @@
+import io
+from datetime import datetime
+
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, send_file, url_for
+
+import scheduling
+from extensions import content_cache, db
+from helpers import parse_iso_arg, row_snapshot
+from models import Appointment, BlogPost, FAQ, Patient, Testimonial
+from page_cache import cached_page
+from search import search
+
+bp = Blueprint('public', __name__)
+
+
+@bp.route('/')
+@cached_page(content_cache, tags=('Testimonial',))
+def home():
+  def load():
+    # Prefer to show featured testimonials on the homepage; fall back to most recent.
+    try:
+      t = Testimonial.query.filter_by(featured=True).order_by(Testimonial.created_at.desc()).limit(5).all()
+      if not t:
+        t = Testimonial.query.order_by(Testimonial.created_at.desc()).limit(5).all()
+    except Exception:
+      # If the DB schema doesn't have 'featured' yet (older databases), fall back safely.
+      db.session.rollback()
+      t = Testimonial.query.order_by(Testimonial.created_at.desc()).limit(5).all()
+    return [row_snapshot(x) for x in t]
+  t = content_cache.get_or_set('home:testimonials', load, tags=('Testimonial',))
+  return render_template('home.html', title='Home', testimonials=t)
+
+@bp.route('/services')
+@cached_page(content_cache)
+def services():
+  return render_template('services.html', title='Services')
+
+@bp.route('/resources')
+@cached_page(content_cache, tags=('FAQ',))
+def resources():
+  faqs = content_cache.get_or_set('faqs:all', lambda: [row_snapshot(f) for f in FAQ.query.all()], tags=('FAQ',))
+  return render_template('resources.html', title='Resources', faqs=faqs)
+
+@bp.route('/download/sample-diet.pdf')
+def sample_pdf():
+    buf = io.BytesIO()
+    buf.write(b"Diet & Lifestyle Guidelines (placeholder). Replace with real PDF file in production.")
+    buf.seek(0)
+    return send_file(buf, download_name='diet-guidelines.txt', as_attachment=True)
+
+@bp.route('/book', methods=['GET', 'POST'])
+def book():
+  if request.method == 'POST':
+    name = request.form.get('name')
+    email = request.form.get('email')
+    phone = request.form.get('phone')
+    doctor = request.form.get('doctor') or request.args.get('doctor')
+    staff_id = request.form.get('staff_id', type=int)
+    date_str = request.form.get('slot') if staff_id else request.form.get('date')
+    reason = request.form.get('reason')
+    try:
+      date = datetime.fromisoformat(date_str)
+    except Exception:
+      flash('Invalid date format. Use YYYY-MM-DD HH:MM (24h).')
+      return redirect(url_for('public.book'))
+    patient = Patient.query.filter_by(email=email).first()
+    if not patient:
+      patient = Patient(name=name or email.split('@')[0], email=email, phone=phone)
+      db.session.add(patient)
+      db.session.commit()
+    if staff_id:
+      # a slot from the doctor's schedule: booked outright, or refused if someone got there first
+      try:
+        scheduling.book(staff_id, date, patient.id, reason)
+      except scheduling.SlotUnavailable as e:
+        flash(str(e))
+        return redirect(url_for('public.book', staff_id=staff_id))
+    else:
+      # include requested doctor in the reason for simple tracking
+      if doctor:
+        reason = f"Doctor: {doctor} — {reason}"
+      appt = Appointment(patient=patient, date=date, reason=reason)
+      db.session.add(appt)
+      db.session.commit()
+    gcal_text = f"{patient.name} appointment - {reason}"
+    gcal_time = date.strftime('%Y%m%dT%H%M00')
+    gcal_link = (
+      f"https://www.google.com/calendar/render?action=TEMPLATE&text={gcal_text}"
+      f"&dates={gcal_time}/{gcal_time}&details={reason}"
+    )
+    flash('Appointment booked' if staff_id else 'Appointment requested — confirmation shown below')
+    return (
+      f"<p>{'Booked' if staff_id else 'Requested'}. <a href='{gcal_link}' target='_blank'>Add to Google Calendar</a></p>"
+      f"<p><a href='/'>Back home</a></p>"
+    )
+  # Pass any prefill doctor name through to the form
+  prefill_doctor = request.args.get('doctor')
+  doctors = scheduling.doctors_with_schedules()
+  selected = request.args.get('staff_id', type=int)
+  if selected is None and prefill_doctor:
+    selected = next((d.id for d in doctors if prefill_doctor.lower() in f'Dr. {d.name}'.lower()), None)
+  return render_template('book.html', title='Book', prefill_doctor=prefill_doctor, doctors=doctors,
+                         selected_doctor=selected)
+
+@bp.route('/api/slots')
+def api_slots():
+  """Free slots of one doctor: a whole day (?date=YYYY-MM-DD) or the next n (?after=...&n=5)."""
+  staff_id = request.args.get('doctor', type=int)
+  if staff_id is None:
+    return jsonify({'error': 'doctor is required'}), 400
+  try:
+    day = request.args.get('date')
+    day = datetime.fromisoformat(day).date() if day else None
+    after = parse_iso_arg('after')
+  except ValueError:
+    return jsonify({'error': 'date/after must be ISO-8601'}), 400
+  if day:
+    slots = scheduling.free_slots(staff_id, day)
+  else:
+    slots = scheduling.next_free_slots(staff_id, after, n=min(request.args.get('n', 5, type=int), 50))
+  resp = jsonify({'doctor': staff_id, 'date': day.isoformat() if day else None,
+                  'slots': [{'start': s.isoformat(timespec='minutes'), 'end': e.isoformat(timespec='minutes')}
+                            for s, e in slots]})
+  # availability is cached server-side; browsers may reuse it briefly (book() re-checks anyway)
+  resp.cache_control.public = True
+  resp.cache_control.max_age = 15
+  return resp
+
+# Signup route removed by request. Account creation is disabled for now.
+
+@bp.route('/blog')
+@cached_page(content_cache, tags=('BlogPost',))
+def blog():
+    posts = content_cache.get_or_set(
+        'blog:posts', lambda: [row_snapshot(p) for p in BlogPost.query.order_by(BlogPost.created_at.desc()).all()],
+        tags=('BlogPost',))
+    return render_template('blog.html', posts=posts, title='Blog')
+
+@bp.route('/search')
+def search_page():
+  q = request.args.get('q', '').strip()
+  kind = request.args.get('kind')
+  results = search(q, kind=kind) if q else []
+  return render_template('search.html', title='Search', q=q, kind=kind, results=results)
+
+@bp.route('/api/search')
+def api_search():
+  q = request.args.get('q', '').strip()
+  results = search(q, kind=request.args.get('kind'), limit=request.args.get('limit', 20, type=int))
+  return jsonify({'q': q, 'results': [dict(r, snippet=str(r['snippet'])) for r in results]})
+
+@bp.route('/blog/<slug>')
+def blog_post(slug):
+    p = BlogPost.query.filter_by(slug=slug).first_or_404()
+    return f"<h1>{p.title}</h1><div>{p.content}</div><p><a href='/blog'>Back</a></p>"
+
+@bp.route('/testimonials')
+@cached_page(content_cache, tags=('Testimonial',))
+def testimonials():
+    t = content_cache.get_or_set(
+        'testimonials:all', lambda: [row_snapshot(x) for x in Testimonial.query.order_by(Testimonial.created_at.desc()).all()],
+        tags=('Testimonial',))
+    return render_template('testimonials.html', testimonials=t, title='Testimonials')
+
+@bp.route('/telehealth')
+def telehealth():
+    return "<h2>Telehealth</h2><p>To book a video visit, use the appointment booking page and choose 'telehealth' in the reason. Zoom link will be sent in confirmation (placeholder).</p>"
+
+@bp.route('/risk-quiz', methods=['GET', 'POST'])
+def risk_quiz():
+    if request.method == 'POST':
+        age = int(request.form.get('age', 0))
+        bmi = float(request.form.get('bmi', 0))
+        score = 0
+        if age > 45: score += 1
+        if bmi > 30: score += 1
+        if request.form.get('family') == 'yes': score += 1
+        level = 'Low' if score == 0 else ('Moderate' if score == 1 else 'High')
+        return f"<h2>Risk: {level}</h2><p><a href='/resources'>Back</a></p>"
+    return """<form method='post'>Age: <input name='age' /><br/>BMI: <input name='bmi' /><br/>Family history? <select name='family'><option value='no'>No</option><option value='yes'>Yes</option></select><br/><button>Check</button></form>"""
+
+
+@bp.route('/about')
+@cached_page(content_cache)
+def about():
+  return render_template('about.html', title='About')
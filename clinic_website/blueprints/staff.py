@@ -0,0 +1,125 @@
+from datetime import datetime
+
+from flask import Blueprint, flash, redirect, render_template, request, session, url_for
+from sqlalchemy import select
+
+import ics
+import passwords
+from extensions import audit, db, limiter
+from helpers import csv_response, get_serializer, parse_iso_arg, staff_required, stream_csv
+from models import Patient, PatientFile, Staff, Vitals
+from query_guard import query_budget
+from ratelimit import retry_headers
+from sessions import current_staff, rotate
+
+bp = Blueprint('staff', __name__, url_prefix='/staff')
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+  if request.method == 'POST':
+    email = request.form.get('email')
+    password = request.form.get('password')
+    wait = limiter.throttle_login(email)
+    if wait:
+      flash('Too many login attempts. Please wait a minute and try again.')
+      return render_template('staff_login.html'), 429, retry_headers(wait)
+    s = Staff.query.filter_by(email=email).first()
+    if not passwords.verify(s, password):
+      flash('Invalid staff credentials')
+      return redirect(url_for('staff.login'))
+    db.session.commit()  # a rehashed password, if verify() upgraded it
+    rotate()
+    session['staff_email'] = s.email
+    session['staff_id'] = s.id
+    session['staff_role'] = s.role
+    flash('Staff logged in')
+    return redirect(url_for('staff.dashboard'))
+  return render_template('staff_login.html')
+
+
+@bp.route('/logout')
+def logout():
+  # clear staff session but preserve patient session if impersonating
+  session.pop('staff_email', None)
+  session.pop('staff_id', None)
+  session.pop('staff_role', None)
+  flash('Staff logged out')
+  return redirect(url_for('public.home'))
+
+
+@bp.route('')
+@staff_required
+@query_budget(3)  # the patient list, plus the staff lookup on a cold session
+def dashboard():
+  staff = current_staff()
+  patients = Patient.query.order_by(Patient.created_at.desc()).limit(50).all()
+  feed = ics.feed_url('doctor', staff['id']) if staff else None
+  return render_template('staff_dash.html', staff=staff, patients=patients, calendar_feed=feed)
+
+
+@bp.route('/file-token/<int:file_id>')
+@staff_required
+def file_token(file_id):
+  pf = PatientFile.query.get_or_404(file_id)
+  s = get_serializer()
+  token = s.dumps({'file_id': pf.id})
+  link = url_for('files.download', file_id=pf.id, token=token, _external=True)
+  audit.record(session.get('staff_email') or 'staff', f'Generated download token for file {pf.id}')
+  return f'Signed link (valid 1 hour): {link}'
+
+
+@bp.route('/export/vitals')
+@staff_required
+def export_vitals():
+  """Clinic-wide vitals CSV, optionally limited to ?since=/&until= and ?patient_id=."""
+  try:
+    since = parse_iso_arg('since')
+    until = parse_iso_arg('until')
+  except ValueError:
+    flash('Invalid date format. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM.')
+    return redirect(url_for('staff.dashboard'))
+  stmt = select(Vitals.patient_id, Patient.email, Vitals.measured_at, Vitals.systolic,
+                Vitals.diastolic, Vitals.glucose, Vitals.note) \
+    .join(Patient, Patient.id == Vitals.patient_id)
+  if since:
+    stmt = stmt.where(Vitals.measured_at >= since)
+  if until:
+    stmt = stmt.where(Vitals.measured_at < until)
+  patient_id = request.args.get('patient_id', type=int)
+  if patient_id:
+    stmt = stmt.where(Vitals.patient_id == patient_id)
+  stmt = stmt.order_by(Vitals.patient_id.asc(), Vitals.measured_at.asc(), Vitals.id.asc())
+  audit.record(session.get('staff_email') or 'staff',
+               f"Exported clinic vitals (since={since}, until={until}, patient={patient_id or 'all'})")
+  chunks = stream_csv(stmt, ['patient_id','patient_email','measured_at','systolic','diastolic','glucose','note'],
+                      lambda r: [r.patient_id, r.email, r.measured_at.isoformat(), r.systolic, r.diastolic, r.glucose, r.note])
+  return csv_response(chunks, f"clinic-vitals-{datetime.utcnow():%Y%m%d}.csv")
+
+
+@bp.route('/impersonate/<int:patient_id>')
+@staff_required
+def impersonate(patient_id):
+  p = Patient.query.get_or_404(patient_id)
+  # set patient session so staff can view dashboard/files
+  session['patient_email'] = p.email
+  session['patient_id'] = p.id
+  # mark who is impersonating for auditing
+  session['impersonated_by'] = session.get('staff_email')
+  audit.record(session.get('staff_email') or 'staff', f"Impersonated patient {p.id}", critical=True)
+  db.session.commit()
+  flash(f'Now impersonating {p.name} — remember to stop when finished')
+  return redirect(url_for('patient.dashboard'))
+
+
+@bp.route('/stop-impersonation')
+@staff_required
+def stop_impersonation():
+  # remove patient session that was set by impersonation
+  impersonator = session.pop('impersonated_by', None)
+  session.pop('patient_email', None)
+  session.pop('patient_id', None)
+  audit.record(impersonator or session.get('staff_email') or 'staff', 'Stopped impersonation', critical=True)
+  db.session.commit()
+  flash('Stopped impersonation')
+  return redirect(url_for('staff.dashboard'))
@@ -0,0 +1,248 @@
+"""Read-through cache for rarely-changing content.
+
+Two interchangeable backends:
+
+  SQLiteCache  a small SQLite file shared by every worker on the host (default)
+  LocalCache   in-process LRU with per-entry TTL, one copy per worker; for a
+               single process (`flask run`, tests, scripts)
+
+ContentCache sits on top and adds tags. Each cached value is stored under its key
+plus the current generation of each of its tags; invalidating a tag bumps its
+generation, so every entry that depended on it stops matching at once, in every
+worker sharing the backend. Stale entries simply age out. With the local backend
+under several workers, only the worker that committed sees the bump; the others
+keep serving their copy (and, through page_cache.py, public pages and ETags) for
+up to CACHE_TTL.
+
+Invalidation is driven by SQLAlchemy: watch_models() hooks after_insert /
+after_update / after_delete on the given models and bumps their tags when the
+session commits (never for rolled-back work).
+
+Config (env):
+  CACHE_BACKEND       'sqlite' (default) or 'local'
+  CACHE_SQLITE_PATH   file for the sqlite backend (default instance/cache.sqlite3)
+  CACHE_TTL           seconds an entry lives (default 300)
+  CACHE_MAX_ENTRIES   LRU size of the local backend (default 512)
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from per_app import per_app
+
+MISS = object()
+
+
+class LocalCache:
+  def __init__(self, max_entries=512):
+    self.max_entries = max_entries
+    self._data = OrderedDict()
+    self._counters = {}  # tag generations live outside the LRU so they are never evicted
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      item = self._data.get(key)
+      if item is None:
+        return MISS
+      expires, value = item
+      if expires is not None and expires < time.monotonic():
+        del self._data[key]
+        return MISS
+      self._data.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl=None):
+    expires = time.monotonic() + ttl if ttl else None
+    with self._lock:
+      self._data[key] = (expires, value)
+      self._data.move_to_end(key)
+      while len(self._data) > self.max_entries:
+        self._data.popitem(last=False)
+
+  def delete(self, key):
+    with self._lock:
+      self._data.pop(key, None)
+
+  def counter(self, key):
+    return self._counters.get(key, 0)
+
+  def incr(self, key):
+    with self._lock:
+      self._counters[key] = self._counters.get(key, 0) + 1
+      return self._counters[key]
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
+
+
+class SQLiteCache:
+  """Cache shared between processes through one SQLite file (values are pickled)."""
+
+  PURGE_EVERY = 200  # sets between sweeps of expired rows
+
+  def __init__(self, path):
+    self.path = path
+    self._local = threading.local()
+    self._sets = 0
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = self._conn()
+    conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+    conn.execute('CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+  def _conn(self):
+    conn = getattr(self._local, 'conn', None)
+    if conn is None:
+      conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      self._local.conn = conn
+    return conn
+
+  def get(self, key):
+    row = self._conn().execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+    if row is None or (row[1] is not None and row[1] < time.time()):
+      return MISS
+    return pickle.loads(row[0])
+
+  def set(self, key, value, ttl=None):
+    expires = time.time() + ttl if ttl else None
+    conn = self._conn()
+    conn.execute('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                 (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires))
+    self._sets += 1
+    if self._sets % self.PURGE_EVERY == 0:
+      conn.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+
+  def delete(self, key):
+    self._conn().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+  def counter(self, key):
+    row = self._conn().execute('SELECT value FROM counters WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else 0
+
+  def incr(self, key):
+    conn = self._conn()
+    conn.execute('INSERT INTO counters (key, value) VALUES (?, 1) '
+                 'ON CONFLICT(key) DO UPDATE SET value = value + 1', (key,))
+    return self.counter(key)
+
+  def clear(self):
+    self._conn().execute('DELETE FROM cache')
+
+
+class ContentCache:
+  def __init__(self, backend=None, default_ttl=300):
+    self._backend = backend
+    self.default_ttl = default_ttl
+    self._hits = 0
+    self._misses = 0
+    self._invalidations = 0
+
+  @property
+  def bound(self):
+    return self._backend is not None
+
+  def init_app(self, app):
+    # this object exists at import time (models register their hooks on it); each app gets
+    # its own cache on the backend its config names, and calls here go to current_app's
+    app.extensions['content_cache'] = ContentCache(backend_from_env(app.config, app.instance_path),
+                                                   default_ttl=int(app.config.get('CACHE_TTL', 300)))
+
+  @property
+  @per_app('content_cache')
+  def backend(self):
+    return self._backend
+
+  def _versioned_key(self, key, tags):
+    gens = ','.join(f'{tag}={self._backend.counter("gen:" + tag)}' for tag in tags)
+    return f'{key}|{gens}'
+
+  @per_app('content_cache')
+  def get(self, key, tags=()):
+    value = self._backend.get(self._versioned_key(key, tags))
+    if value is MISS:
+      self._misses += 1
+    else:
+      self._hits += 1
+    return value
+
+  @per_app('content_cache')
+  def set(self, key, value, tags=(), ttl=None):
+    self._backend.set(self._versioned_key(key, tags), value, ttl or self.default_ttl)
+
+  @per_app('content_cache')
+  def get_or_set(self, key, loader, tags=(), ttl=None):
+    """Return the cached value for key, calling loader() and storing its result on a miss."""
+    vkey = self._versioned_key(key, tags)
+    value = self._backend.get(vkey)
+    if value is not MISS:
+      self._hits += 1
+      return value
+    self._misses += 1
+    value = loader()
+    self._backend.set(vkey, value, ttl or self.default_ttl)
+    return value
+
+  @per_app('content_cache')
+  def generation(self, tag):
+    """How many times `tag` has been invalidated; lets callers version things they keep themselves."""
+    return self._backend.counter(f'gen:{tag}')
+
+  @per_app('content_cache')
+  def invalidate(self, *tags):
+    for tag in tags:
+      self._backend.incr(f'gen:{tag}')
+      self._invalidations += 1
+
+  @per_app('content_cache')
+  def stats(self):
+    total = self._hits + self._misses
+    return {
+      'backend': type(self._backend).__name__,
+      'hits': self._hits,
+      'misses': self._misses,
+      'hit_ratio': round(self._hits / total, 3) if total else None,
+      'invalidations': self._invalidations,
+    }
+
+  def watch_models(self, *models, tags=None):
+    """Invalidate a model's tag (its class name) whenever a committed flush touched it.
+
+    tags, if given, is called with each touched row and returns the tags to invalidate instead.
+    """
+    def _mark(mapper, connection, target):
+      sess = object_session(target)
+      if sess is not None:
+        sess.info.setdefault('cache_tags', set()).update(tags(target) if tags else (type(target).__name__,))
+
+    for model in models:
+      for ev in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, ev, _mark)
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(sess):
+      tags = sess.info.pop('cache_tags', None)
+      if tags:
+        self.invalidate(*sorted(tags))
+
+    @event.listens_for(Session, 'after_rollback')
+    def _after_rollback(sess):
+      sess.info.pop('cache_tags', None)
+
+
+def backend_from_env(env=os.environ, instance_path='instance'):
+  if env.get('CACHE_BACKEND', 'sqlite').lower() == 'local':
+    return LocalCache(max_entries=int(env.get('CACHE_MAX_ENTRIES', 512)))
+  return SQLiteCache(env.get('CACHE_SQLITE_PATH') or os.path.join(instance_path, 'cache.sqlite3'))
+
+
+def from_env(env=os.environ, instance_path='instance'):
+  return ContentCache(backend_from_env(env, instance_path), default_ttl=int(env.get('CACHE_TTL', 300)))
@@ -0,0 +1,49 @@
+"""`flask ...` commands: init-db, run-jobs, import-uploads, rebuild-search."""
+import os
+
+from sqlalchemy import select
+
+import search
+from extensions import db, file_store, jobs
+from models import PatientFile
+from uploads import copy_upload, legacy_upload_path
+
+
+def register_commands(app):
+  @app.cli.command('init-db')
+  def init_db_command():
+    """Create any missing tables (a new database; existing ones use `flask db upgrade`)."""
+    db.create_all()
+    print('database ready')
+
+  @app.cli.command('run-jobs')
+  def run_jobs_command():
+    """Run every due background job in the foreground and exit."""
+    jobs.schedule_periodic()
+    print(f'ran {jobs.run_pending()} job(s)')
+
+  @app.cli.command('import-uploads')
+  def import_uploads_command():
+    """Move legacy instance/uploads files into the content-addressed store."""
+    moved = 0
+    for pf in db.session.execute(select(PatientFile).where(PatientFile.storage_key.is_(None))).scalars():
+      src = legacy_upload_path(pf)
+      if not os.path.exists(src):
+        continue
+      staged = file_store.staging_path()
+      with open(src, 'rb') as fh:
+        size, digest = copy_upload(fh, staged, limit=float('inf'))
+      file_store.put_file(staged, digest)
+      pf.size, pf.sha256, pf.storage_key = size, digest, digest
+      db.session.commit()
+      os.remove(src)
+      moved += 1
+    print(f'imported {moved} file(s)')
+
+  @app.cli.command('rebuild-search')
+  def rebuild_search_command():
+    """Re-index every blog post, FAQ and testimonial (SQLite only)."""
+    if not search.uses_fts(db.engine):
+      print('search uses LIKE on this database; there is no index to rebuild')
+      return
+    print(f'indexed {search.rebuild()} row(s)')
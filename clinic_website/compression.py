@@ -0,0 +1,193 @@
+"""gzip/brotli response compression as WSGI middleware.
+
+    app.wsgi_app = Compressor(app.wsgi_app, min_size=500)
+
+The encoding is negotiated from Accept-Encoding (brotli when the `brotli` package
+is installed and the client accepts it, else gzip). Only the content types in
+COMPRESSIBLE are touched, and never responses that already carry a
+Content-Encoding (the precompressed files under /static/dist/, see assets.py),
+partial content, or `Cache-Control: no-transform`. File downloads are left alone
+too (Accept-Ranges, Content-Range, or a wsgi.file_wrapper body): a download
+resumed with Range must continue the same bytes it started with, and a
+file_wrapper body goes to the server's sendfile() untouched.
+
+Bodies are compressed chunk by chunk as the app yields them, each chunk flushed
+so streamed responses (the CSV exports) still reach the client progressively.
+The first min_size bytes are held back: a response that ends before then is sent
+as it is, with its Content-Length.
+
+Config (read by create_app):
+  COMPRESS_ENABLED    default on
+  COMPRESS_MIN_SIZE   smallest body worth compressing, in bytes (500)
+  COMPRESS_LEVEL      gzip level (6); brotli uses quality 4, its fast setting
+"""
+import zlib
+
+from werkzeug.wsgi import FileWrapper
+
+COMPRESSIBLE = frozenset((
+  'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript', 'text/xml',
+  'application/javascript', 'application/json', 'application/xml', 'image/svg+xml',
+))
+SKIP_STATUS = ('204', '206', '304')
+
+
+def _have_brotli():
+  try:
+    import brotli  # noqa: F401
+  except ImportError:
+    return False
+  return True
+
+
+def accepted_encoding(header, have_brotli):
+  """'br', 'gzip' or None for an Accept-Encoding header value."""
+  offered = {}
+  for part in (header or '').split(','):
+    name, _, params = part.strip().partition(';')
+    q = 1.0
+    if params.strip().startswith('q='):
+      try:
+        q = float(params.strip()[2:])
+      except ValueError:
+        q = 0.0
+    offered[name.strip().lower()] = q
+  if have_brotli and offered.get('br', 0) > 0:
+    return 'br'
+  if offered.get('gzip', offered.get('*', 0)) > 0:
+    return 'gzip'
+  return None
+
+
+class _Gzip:
+  def __init__(self, level):
+    self._z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 16+15: gzip container
+
+  def chunk(self, data):
+    return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+  def finish(self):
+    return self._z.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+  def __init__(self, quality):
+    import brotli
+    self._b = brotli.Compressor(quality=quality)
+
+  def chunk(self, data):
+    return self._b.process(data) + self._b.flush()
+
+  def finish(self):
+    return self._b.finish()
+
+
+class Compressor:
+  def __init__(self, app, min_size=500, level=6, brotli_quality=4, mimetypes=COMPRESSIBLE):
+    self.app = app
+    self.min_size = min_size
+    self.level = level
+    self.brotli_quality = brotli_quality
+    self.mimetypes = mimetypes
+    self.have_brotli = _have_brotli()
+
+  def __call__(self, environ, start_response):
+    encoding = accepted_encoding(environ.get('HTTP_ACCEPT_ENCODING'), self.have_brotli)
+    if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+      return self.app(environ, start_response)
+
+    state = {}
+
+    def _start(status, headers, exc_info=None):
+      state.update(status=status, headers=headers, exc_info=exc_info)
+      # the body is held until the first min_size bytes show whether to compress;
+      # the legacy write() callable is not supported
+      return None
+
+    app_iter = self.app(environ, _start)
+    if 'status' in state and (_is_file(app_iter, environ) or not self._eligible(state['status'], state['headers'])):
+      # decided before reading the body: hand the app's iterable on as it is
+      start_response(state['status'], state['headers'], state['exc_info'])
+      return app_iter
+    return self._respond(app_iter, state, encoding, start_response)
+
+  def _eligible(self, status, headers):
+    if status[:3] in SKIP_STATUS:
+      return False
+    h = {k.lower(): v for k, v in headers}
+    if 'content-encoding' in h or 'no-transform' in h.get('cache-control', ''):
+      return False
+    # ranged file downloads; attachments alone (the streamed CSV exports) are still compressed
+    if h.get('accept-ranges', 'none').lower() != 'none' or 'content-range' in h:
+      return False
+    if h.get('content-type', '').split(';')[0].strip().lower() not in self.mimetypes:
+      return False
+    length = h.get('content-length')
+    return length is None or int(length) >= self.min_size
+
+  def _respond(self, app_iter, state, encoding, start_response):
+    try:
+      chunks = iter(app_iter)
+      held, size = [], 0
+      for chunk in chunks:
+        if chunk:
+          held.append(chunk)
+          size += len(chunk)
+        if size >= self.min_size:
+          break
+      else:
+        chunks = None  # the whole body fits in `held`
+      status, headers = state['status'], state['headers']
+      eligible = self._eligible(status, headers)
+      if eligible:
+        headers = _add_vary(headers)
+      if not eligible or (chunks is None and size < self.min_size):
+        start_response(status, headers, state.get('exc_info'))
+        yield from held
+        if chunks is not None:
+          yield from chunks
+        return
+
+      start_response(status, _compressed_headers(headers, encoding), state.get('exc_info'))
+      coder = _Brotli(self.brotli_quality) if encoding == 'br' else _Gzip(self.level)
+      out = coder.chunk(b''.join(held))
+      if out:
+        yield out
+      for chunk in chunks or ():
+        if chunk:
+          out = coder.chunk(chunk)
+          if out:
+            yield out
+      yield coder.finish()
+    finally:
+      if hasattr(app_iter, 'close'):
+        app_iter.close()
+
+
+def _is_file(app_iter, environ):
+  wrapper = environ.get('wsgi.file_wrapper')
+  return isinstance(app_iter, FileWrapper) or (isinstance(wrapper, type) and isinstance(app_iter, wrapper))
+
+
+def _add_vary(headers):
+  headers = list(headers)
+  for i, (k, v) in enumerate(headers):
+    if k.lower() == 'vary':
+      if 'accept-encoding' not in v.lower():
+        headers[i] = (k, v + ', Accept-Encoding')
+      return headers
+  headers.append(('Vary', 'Accept-Encoding'))
+  return headers
+
+
+def _compressed_headers(headers, encoding):
+  out = []
+  for k, v in headers:
+    lk = k.lower()
+    if lk == 'content-length':
+      continue
+    if lk == 'etag' and not v.startswith('W/'):
+      v = 'W/' + v  # a different byte sequence than the identity body
+    out.append((k, v))
+  out.append(('Content-Encoding', encoding))
+  return out
@@ -0,0 +1,124 @@
+"""Settings for create_app(), read from the environment (and .env, if python-dotenv is installed).
+
+from_env() returns a plain dict; create_app(overrides) layers the overrides on
+top, so tests and scripts never have to touch os.environ or a shared app.config.
+Each module documents its own keys: db_engine.py, caching.py, page_cache.py,
+query_guard.py, jobs.py, audit.py, storage.py, templating.py,
+compression.py, scheduling.py, ics.py, reminders.py, ratelimit.py,
+passwords.py and sessions.py.
+
+App-level keys defined here:
+  SECRET_KEY            from FH_SECRET
+  ADMIN_PASS            password for the legacy /admin/login (default 'admin')
+  AUTO_CREATE_SCHEMA    run db.create_all() when the app is built (off; use
+                        `flask init-db` or `flask db upgrade` instead)
+  SITE_CONTEXT          doctor/clinic details shown on every page
+"""
+import os
+
+import db_engine
+
+# passed through unchanged to the modules that read them with their own defaults
+_PASSTHROUGH = ('CACHE_BACKEND', 'CACHE_SQLITE_PATH', 'CACHE_TTL', 'CACHE_MAX_ENTRIES',
+                'STORAGE_BACKEND', 'STORAGE_ROOT', 'S3_BUCKET', 'S3_PREFIX', 'S3_ENDPOINT_URL',
+                'SQLITE_TUNING', 'SQLITE_JOURNAL_MODE', 'SQLITE_SYNCHRONOUS', 'SQLITE_BUSY_TIMEOUT_MS',
+                'SQLITE_CACHE_SIZE_KB', 'SQLITE_MMAP_SIZE',
+                'DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'DB_POOL_TIMEOUT', 'DB_POOL_RECYCLE')
+
+
+def _flag(env, name, default):
+  return env.get(name, default) not in ('0', 'false', 'off')
+
+
+def site_context(env):
+  phone = env.get('CLINIC_PHONE', '+1234567890')
+  # whatsapp requires digits without + for wa.me URL
+  wa_num = env.get('CLINIC_WHATSAPP', phone)
+  wa_clean = ''.join([c for c in wa_num if c.isdigit()])
+  return {
+    'doctor_name': env.get('DOCTOR_NAME', 'Amit Patel, MD'),
+    'doctor_bio': env.get('DOCTOR_BIO', 'My mission is to help patients live healthy lives with diabetes and hypertension...'),
+    'doctor_title': env.get('DOCTOR_TITLE', 'Endocrinologist & Hypertension Specialist'),
+    'clinic_phone': phone,
+    'clinic_whatsapp': wa_clean,
+    'clinic_email': env.get('CLINIC_EMAIL', 'clinic@example.com')
+  }
+
+
+def load_dotenv():
+  try:
+    from dotenv import load_dotenv as _load
+  except Exception:
+    return
+  _load()
+
+
+def from_env(env=None):
+  if env is None:
+    load_dotenv()
+    env = os.environ
+  uri = db_engine.database_uri(env)
+  config = {
+    'SECRET_KEY': env.get('FH_SECRET', 'change-this-in-prod'),
+    'ADMIN_PASS': env.get('ADMIN_PASS', 'admin'),
+    'AUTO_CREATE_SCHEMA': _flag(env, 'AUTO_CREATE_SCHEMA', '0'),
+    'SITE_CONTEXT': site_context(env),
+    # Database URL, pool and SQLite pragmas; see db_engine.py
+    'SQLALCHEMY_DATABASE_URI': uri,
+    'SQLALCHEMY_ENGINE_OPTIONS': db_engine.engine_options(uri, env),
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    # Anonymous full-page cache; see page_cache.py
+    'PAGE_CACHE_ENABLED': _flag(env, 'PAGE_CACHE_ENABLED', '1'),
+    'PAGE_CACHE_MAX_AGE': int(env.get('PAGE_CACHE_MAX_AGE', 60)),
+    # Statement budget per request; over-budget requests are logged (or fail under TESTING).
+    'QUERY_GUARD_MAX': int(env.get('QUERY_GUARD_MAX', 25)),
+    # Background jobs (alerts, upload post-processing); see jobs.py
+    'JOBS_WORKERS': int(env.get('JOBS_WORKERS', 2)),
+    'JOBS_QUEUE_SIZE': int(env.get('JOBS_QUEUE_SIZE', 100)),
+    'JOBS_POLL_SECONDS': float(env.get('JOBS_POLL_SECONDS', 2)),
+    'JOBS_EAGER': _flag(env, 'JOBS_EAGER', '0'),
+    # Audit entries: 'buffered' batches routine entries, 'sync' writes them before each response; see audit.py
+    'AUDIT_MODE': env.get('AUDIT_MODE', 'buffered'),
+    'AUDIT_BATCH_SIZE': int(env.get('AUDIT_BATCH_SIZE', 100)),
+    'AUDIT_FLUSH_SECONDS': float(env.get('AUDIT_FLUSH_SECONDS', 2)),
+    # Blobs of deleted files are collected after this grace period; see storage.py
+    'STORAGE_GC_DELAY': int(env.get('STORAGE_GC_DELAY', 60)),
+    # Hand authorised downloads to the front proxy: '' (serve from Python), 'x-sendfile' or 'x-accel' (nginx)
+    'DOWNLOAD_OFFLOAD': env.get('DOWNLOAD_OFFLOAD', '').lower(),
+    'DOWNLOAD_ACCEL_PREFIX': env.get('DOWNLOAD_ACCEL_PREFIX', '/_protected/blobs/'),
+    # gzip/brotli for HTML, JSON and CSV responses; see compression.py
+    'COMPRESS_ENABLED': _flag(env, 'COMPRESS_ENABLED', '1'),
+    'COMPRESS_MIN_SIZE': int(env.get('COMPRESS_MIN_SIZE', 500)),
+    'COMPRESS_LEVEL': int(env.get('COMPRESS_LEVEL', 6)),
+    # Compiled-template cache and render timing; see templating.py
+    'TEMPLATE_CACHE_DIR': env.get('TEMPLATE_CACHE_DIR'),
+    'TEMPLATE_WARMUP': _flag(env, 'TEMPLATE_WARMUP', '1'),
+    'TEMPLATE_SLOW_MS': float(env.get('TEMPLATE_SLOW_MS', 100)),
+    # Slot booking window; see scheduling.py
+    'BOOKING_HORIZON_DAYS': int(env.get('BOOKING_HORIZON_DAYS', 60)),
+    'BOOKING_LEAD_MINUTES': int(env.get('BOOKING_LEAD_MINUTES', 60)),
+    # Calendar feeds; see ics.py
+    'ICS_PAST_DAYS': int(env.get('ICS_PAST_DAYS', 90)),
+    # Appointment reminders; see reminders.py
+    'REMINDER_OFFSETS': env.get('REMINDER_OFFSETS', '24h,2h'),
+    'REMINDER_LOOKAHEAD_MINUTES': int(env.get('REMINDER_LOOKAHEAD_MINUTES', 30)),
+    'REMINDER_LATE_MINUTES': int(env.get('REMINDER_LATE_MINUTES', 60)),
+    # Login throttling and password hashing; see ratelimit.py and passwords.py
+    'RATELIMIT_ENABLED': _flag(env, 'RATELIMIT_ENABLED', '1'),
+    'RATELIMIT_BACKEND': env.get('RATELIMIT_BACKEND', 'sqlite'),
+    'RATELIMIT_SQLITE_PATH': env.get('RATELIMIT_SQLITE_PATH'),
+    'RATELIMIT_LOGIN_IP': env.get('RATELIMIT_LOGIN_IP', '20/minute'),
+    'RATELIMIT_LOGIN_ACCOUNT': env.get('RATELIMIT_LOGIN_ACCOUNT', '5/minute'),
+    'PASSWORD_HASH_METHOD': env.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+    # Server-side sessions and the cached logged-in principal; see sessions.py
+    'SESSION_BACKEND': env.get('SESSION_BACKEND', 'sqlite'),
+    'SESSION_SQLITE_PATH': env.get('SESSION_SQLITE_PATH'),
+    'SESSION_TTL': int(env.get('SESSION_TTL', 86400)),
+    # Resumable uploads: largest file accepted and how long an unfinished one is kept
+    'RESUMABLE_MAX_BYTES': int(env.get('RESUMABLE_MAX_BYTES', 200 * 1024 * 1024)),
+    'RESUMABLE_TTL_HOURS': int(env.get('RESUMABLE_TTL_HOURS', 24)),
+  }
+  for key in _PASSTHROUGH:
+    if env.get(key):
+      config[key] = env[key]
+  return config
@@ -0,0 +1,115 @@
+"""Database engine configuration.
+
+Everything the app needs to know about its database comes from the environment,
+through config.from_env() (so create_app({...}) overrides apply too):
+
+  DATABASE_URL / SQLALCHEMY_DATABASE_URI   any SQLAlchemy URL (default sqlite:///clinic_full.db)
+
+SQLite connections get production pragmas applied on every connect:
+
+  SQLITE_JOURNAL_MODE      WAL        readers no longer block the writer
+  SQLITE_SYNCHRONOUS       NORMAL     safe with WAL, one fsync per checkpoint instead of per commit
+  SQLITE_BUSY_TIMEOUT_MS   5000       wait for the write lock instead of raising "database is locked"
+  SQLITE_CACHE_SIZE_KB     20000      page cache per connection
+  SQLITE_MMAP_SIZE         268435456  bytes of the file to memory-map for reads
+  SQLITE_TUNING            on         set to 'off' to keep SQLite's defaults
+
+Pool settings (ignored for in-memory SQLite, which always uses a single shared connection):
+
+  DB_POOL_SIZE 5, DB_MAX_OVERFLOW 10, DB_POOL_TIMEOUT 30, DB_POOL_RECYCLE 1800
+
+Switching to a server database such as Postgres is only a matter of setting DATABASE_URL.
+"""
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DEFAULT_URI = 'sqlite:///clinic_full.db'
+
+_SYNCHRONOUS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+_JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+
+
+def _env_int(env, name, default):
+  try:
+    return int(env.get(name, default))
+  except (TypeError, ValueError):
+    return default
+
+
+def database_uri(env=os.environ):
+  uri = env.get('DATABASE_URL') or env.get('SQLALCHEMY_DATABASE_URI') or DEFAULT_URI
+  # Heroku-style URLs still use the scheme SQLAlchemy dropped in 1.4
+  if uri.startswith('postgres://'):
+    uri = 'postgresql://' + uri[len('postgres://'):]
+  return uri
+
+
+def is_sqlite(uri):
+  return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory_sqlite(uri):
+  url = make_url(uri)
+  return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def sqlite_pragmas(env=os.environ):
+  """Ordered (pragma, value) pairs to run on each new SQLite connection."""
+  if str(env.get('SQLITE_TUNING', 'on')).lower() in ('0', 'off', 'false', 'no'):
+    return []
+  journal = str(env.get('SQLITE_JOURNAL_MODE', 'WAL')).upper()
+  sync = str(env.get('SQLITE_SYNCHRONOUS', 'NORMAL')).upper()
+  return [
+    ('busy_timeout', _env_int(env, 'SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    ('journal_mode', journal if journal in _JOURNAL_MODES else 'WAL'),
+    ('synchronous', sync if sync in _SYNCHRONOUS else 'NORMAL'),
+    # negative cache_size is in KiB rather than pages
+    ('cache_size', -abs(_env_int(env, 'SQLITE_CACHE_SIZE_KB', 20000))),
+    ('mmap_size', _env_int(env, 'SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    ('temp_store', 'MEMORY'),
+  ]
+
+
+def engine_options(uri, env=os.environ):
+  """SQLALCHEMY_ENGINE_OPTIONS suited to multi-threaded gunicorn workers."""
+  if is_memory_sqlite(uri):
+    # Flask-SQLAlchemy pins in-memory databases to one StaticPool connection
+    return {}
+  opts = {
+    'pool_size': _env_int(env, 'DB_POOL_SIZE', 5),
+    'max_overflow': _env_int(env, 'DB_MAX_OVERFLOW', 10),
+    'pool_timeout': _env_int(env, 'DB_POOL_TIMEOUT', 30),
+  }
+  if is_sqlite(uri):
+    # connections move between a worker's threads; sqlite3's own busy wait matches the pragma
+    opts['connect_args'] = {
+      'check_same_thread': False,
+      'timeout': _env_int(env, 'SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000.0,
+    }
+  else:
+    opts['pool_pre_ping'] = True
+    opts['pool_recycle'] = _env_int(env, 'DB_POOL_RECYCLE', 1800)
+  return opts
+
+
+def install_sqlite_pragmas(engine, env=os.environ):
+  """Apply sqlite_pragmas() to every connection the engine opens. No-op for other backends.
+
+  create_app() passes app.config as `env`.
+  """
+  if engine.dialect.name != 'sqlite':
+    return
+  pragmas = sqlite_pragmas(env)
+  if not pragmas:
+    return
+
+  @event.listens_for(engine, 'connect')
+  def _on_connect(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    try:
+      for name, value in pragmas:
+        cur.execute(f'PRAGMA {name}={value}')
+    finally:
+      cur.close()
@@ -0,0 +1,27 @@
+"""Extension objects shared by the blueprints, bound to an app in create_app().
+
+They are created unbound so that importing a view module costs nothing and
+never opens a database, a cache file or a storage backend. Each app keeps its own
+state in app.extensions and these objects act on current_app's (see per_app.py).
+"""
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy
+from werkzeug.local import LocalProxy
+
+import caching
+from audit import AuditWriter
+from jobs import JobQueue
+from ratelimit import RateLimiter
+
+db = SQLAlchemy()
+# Public content (testimonials, FAQs, blog posts) is served from a read-through cache
+# that is invalidated whenever a commit touches one of these models; see caching.py.
+content_cache = caching.ContentCache()
+# Slow side effects (SMTP, file sniffing) run on background workers; handlers live in tasks.py.
+jobs = JobQueue(db=db)
+# Routine audit entries are batched; critical ones commit with the change they describe.
+audit = AuditWriter(db=db)
+# Login attempts are throttled per client address and per account before any password hash; see ratelimit.py
+limiter = RateLimiter()
+# File contents, stored once per distinct sha256; the backend is chosen per app, see storage.py
+file_store = LocalProxy(lambda: current_app.extensions['file_store'])
@@ -0,0 +1,24 @@
+"""gunicorn settings: `gunicorn -c gunicorn.conf.py clinic_app:app`.
+
+Worker/thread counts come from the environment so the same file works on any box.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+# gthread workers share one engine pool per process; keep DB_POOL_SIZE >= threads
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = 100
+
+
+def post_fork(server, worker):
+  # With --preload the engine (and any pooled SQLite handles) were created in the
+  # master; a forked worker must never reuse them.
+  from clinic_app import app, db, jobs
+  with app.app_context():
+    db.engine.dispose(close=False)
+    # claim jobs left over from before the restart and run the periodic ones
+    # (reminders, upload expiry) whatever the traffic
+    jobs.start()
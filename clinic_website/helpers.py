@@ -0,0 +1,122 @@
+"""Helpers shared by the blueprints: access checks, paging, CSV streaming, template context."""
+import csv
+import io
+from datetime import datetime
+from functools import wraps
+
+from flask import Response, current_app, redirect, request, session, stream_with_context, url_for
+from itsdangerous import URLSafeTimedSerializer
+
+from extensions import db
+from sessions import current_patient, current_staff
+
+
+def staff_role():
+  # a logged-in staff member's role comes from the cached principal (sessions.py), so a
+  # demotion or a deleted account takes effect on their next request
+  if session.get('staff_id'):
+    staff = current_staff()
+    return staff['role'] if staff else None
+  return session.get('staff_role')
+
+
+def staff_logged_in():
+  if session.get('staff_id'):
+    return current_staff() is not None
+  return bool(session.get('staff_email'))
+
+
+def patient_data_allowed(patient_id):
+  # the patient themselves (or staff impersonating them), or any staff/admin login
+  patient = current_patient()
+  if patient and patient['id'] == patient_id:
+    return True
+  return bool(session.get('is_admin')) or staff_logged_in()
+
+
+def admin_required(f):
+  @wraps(f)
+  def decorated(*args, **kwargs):
+    # Allow the legacy ADMIN_PASS flag (session['is_admin']) or a Staff user with role 'admin'
+    if not (session.get('is_admin') or staff_role() == 'admin'):
+      return redirect(url_for('admin.login'))
+    return f(*args, **kwargs)
+  return decorated
+
+
+def staff_required(f):
+  @wraps(f)
+  def decorated(*args, **kwargs):
+    if not (session.get('is_admin') or staff_logged_in()):
+      return redirect(url_for('staff.login'))
+    return f(*args, **kwargs)
+  return decorated
+
+
+# Admin lists are paged; ?per_page= may shrink a page but never grow it past the max.
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 200
+
+
+def paginate(stmt, page_arg='page'):
+  return db.paginate(stmt, page=request.args.get(page_arg, 1, type=int),
+                     per_page=request.args.get('per_page', ADMIN_PAGE_SIZE, type=int),
+                     max_per_page=ADMIN_MAX_PAGE_SIZE, error_out=False)
+
+
+def row_snapshot(obj):
+  """Plain dict of a model's column values, safe to cache and to share between sessions."""
+  return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+
+def page_url(page, page_arg='page'):
+  """URL of the current view with one page argument replaced (used by _pagination.html)."""
+  args = request.args.to_dict()
+  args[page_arg] = page
+  return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def parse_iso_arg(name):
+  """Parse an optional ISO-8601 query argument. Raises ValueError on bad input."""
+  value = request.args.get(name)
+  if not value:
+    return None
+  return datetime.fromisoformat(value)
+
+
+# Rows fetched per round-trip when streaming CSV exports.
+EXPORT_BATCH_ROWS = 1000
+
+
+def stream_csv(stmt, header, to_row):
+  """Yield a CSV document one encoded chunk per fetched batch.
+
+  The query runs with yield_per so only EXPORT_BATCH_ROWS rows are held at a time,
+  and the text buffer is emptied after every chunk, keeping memory flat.
+  """
+  buf = io.StringIO()
+  cw = csv.writer(buf)
+  cw.writerow(header)
+  result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_ROWS))
+  for batch in result.partitions():
+    cw.writerows(to_row(r) for r in batch)
+    yield buf.getvalue().encode('utf-8')
+    buf.seek(0)
+    buf.truncate()
+  if buf.tell():
+    yield buf.getvalue().encode('utf-8')
+
+
+def csv_response(chunks, filename):
+  return Response(stream_with_context(chunks), mimetype='text/csv',
+                  headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def get_serializer(salt=b'itsdangerous'):
+  # a distinct salt per purpose keeps one kind of token from being accepted as another
+  return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=salt)
+
+
+def inject_common():
+  # SITE_CONTEXT is read from the environment once, when the app is built
+  return dict(current_app.config['SITE_CONTEXT'], now=datetime.utcnow())
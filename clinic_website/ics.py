@@ -0,0 +1,218 @@
+"""iCalendar (.ics) feeds of appointments, per doctor and per patient.
+
+Calendar apps poll a feed every few minutes, so serving one must be cheap:
+
+  1. An aggregate over the owner's appointments in the feed window (count and
+     newest updated_at, read from the (owner, date, updated_at) indexes alone),
+     plus the generation of the 'ics-names' cache tag, is the feed's version. A
+     poller whose If-None-Match still matches gets a 304 and nothing else runs.
+  2. Otherwise this process's copy of the feed is brought up to date with only
+     the appointments whose updated_at is newer than its last build, and
+     re-serialised from the per-event text it keeps. If the patched copy then
+     holds a different number of events than the aggregate counted, a row was
+     deleted or moved to another owner, which only a full rebuild can see. So
+     is a feed built before the names generation moved: renaming or deleting a
+     patient or doctor changes event summaries without touching any appointment.
+
+Feed state lives in a small per-process LRU: each gunicorn worker pays one full
+build per feed, then increments. A cached Feed is never changed in place; a build
+works on a copy and then stores it, so two threads polling the same feed
+at once cannot see each other's half-applied events.
+
+Feeds are fetched by calendar apps that have no session, so the URL carries a
+signed token (feed_token()); rotating SECRET_KEY revokes every feed URL. Times
+are floating local times (no TZID), the same clock the appointments are stored in.
+
+Config:
+  ICS_PAST_DAYS   how far back a feed reaches (90)
+"""
+import hashlib
+from datetime import datetime, timedelta
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import func, inspect, select
+
+from caching import MISS, LocalCache
+from extensions import content_cache, db
+from models import Appointment, Patient, Staff
+
+PRODID = '-//Diabetes & Hypertension Clinic//Appointments//EN'
+TOKEN_SALT = 'ics-feed'
+FEED_CACHE_ENTRIES = 256
+NAMES_TAG = 'ics-names'  # bumped when a name shown in event summaries changes
+
+# (kind, owner id) -> feed state, see Feed
+_feeds = LocalCache(max_entries=FEED_CACHE_ENTRIES)
+
+
+def owner_column(kind):
+  return Appointment.staff_id if kind == 'doctor' else Appointment.patient_id
+
+
+def escape_text(value):
+  return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n') \
+    .replace('\n', '\\n')
+
+
+def fold(line):
+  """RFC 5545 3.1: lines longer than 75 octets continue on the next line after a space."""
+  raw = line.encode('utf-8')
+  if len(raw) <= 75:
+    return line
+  parts, limit = [], 75
+  while raw:
+    cut = min(limit, len(raw))
+    while cut < len(raw) and (raw[cut] & 0xC0) == 0x80:  # never split a UTF-8 sequence
+      cut -= 1
+    parts.append(raw[:cut].decode('utf-8'))
+    raw, limit = raw[cut:], 74  # continuation lines start with the space
+  return '\r\n '.join(parts)
+
+
+def _dt(value):
+  return value.strftime('%Y%m%dT%H%M%S')
+
+
+def vevent(row, kind, host):
+  """One appointment as VEVENT text. row: (Appointment, patient name, doctor name)."""
+  appt, patient_name, doctor_name = row
+  end = appt.end or appt.date + timedelta(minutes=30)
+  if kind == 'doctor':
+    summary = f'{patient_name or "Patient"}: {appt.reason}' if appt.reason else (patient_name or 'Patient')
+  else:
+    summary = f'Appointment with Dr. {doctor_name}' if doctor_name else 'Clinic appointment'
+  status = {'cancelled': 'CANCELLED', 'requested': 'TENTATIVE'}.get(appt.status, 'CONFIRMED')
+  lines = [
+    'BEGIN:VEVENT',
+    f'UID:appointment-{appt.id}@{host}',
+    f'DTSTAMP:{_dt(appt.updated_at or appt.created_at or appt.date)}Z',
+    f'DTSTART:{_dt(appt.date)}',
+    f'DTEND:{_dt(end)}',
+    f'SUMMARY:{escape_text(summary)}',
+    f'STATUS:{status}',
+  ]
+  if kind == 'patient' and appt.reason:
+    lines.append(f'DESCRIPTION:{escape_text(appt.reason)}')
+  lines.append('END:VEVENT')
+  return '\r\n'.join(fold(line) for line in lines)
+
+
+class Feed:
+  def __init__(self):
+    self.built_through = None  # newest updated_at folded in
+    self.count = 0
+    self.names = None  # NAMES_TAG generation the events were rendered with
+    self.events = {}  # appointment id -> (start, VEVENT text)
+    self.body = None
+    self.full_builds = 0
+    self.incremental_builds = 0
+
+  def copy(self):
+    feed = Feed()
+    feed.built_through, feed.count, feed.names, feed.body = self.built_through, self.count, self.names, self.body
+    feed.events = dict(self.events)
+    feed.full_builds, feed.incremental_builds = self.full_builds, self.incremental_builds
+    return feed
+
+
+def _window_start():
+  return datetime.now() - timedelta(days=current_app.config['ICS_PAST_DAYS'])
+
+
+def version(kind, owner_id):
+  """(count, newest updated_at) of the owner's appointments in the window, one indexed aggregate,
+  plus the names generation."""
+  col = owner_column(kind)
+  row = db.session.execute(
+    select(func.count(), func.max(Appointment.updated_at))
+    .where(col == owner_id, Appointment.date >= _window_start())).one()
+  return row[0], row[1], content_cache.generation(NAMES_TAG)
+
+
+def etag_for(kind, owner_id, ver):
+  count, newest, names = ver
+  return hashlib.sha256(f'{kind}:{owner_id}:{count}:{newest}:{names}'.encode()).hexdigest()[:32]
+
+
+def _changed_rows(kind, owner_id, since):
+  stmt = (select(Appointment, Patient.name, Staff.name)
+          .outerjoin(Patient, Appointment.patient_id == Patient.id)
+          .outerjoin(Staff, Appointment.staff_id == Staff.id)
+          .where(owner_column(kind) == owner_id, Appointment.date >= _window_start()))
+  if since is not None:
+    # >=: rows stamped in the same instant as the last build are simply redone
+    stmt = stmt.where(Appointment.updated_at >= since)
+  return db.session.execute(stmt).all()
+
+
+def _apply(feed, rows, kind, host):
+  for row in rows:
+    feed.events[row[0].id] = (row[0].date, vevent(row, kind, host))
+  start = _window_start()
+  # appointments that slid out of the window since the last build
+  for appt_id in [i for i, (when, _) in feed.events.items() if when < start]:
+    del feed.events[appt_id]
+
+
+def build(kind, owner_id, ver=None):
+  """The owner's Feed, brought up to date with what changed since this process last built it."""
+  ver = ver or version(kind, owner_id)
+  key = (kind, owner_id)
+  host = request.host.split(':')[0] if has_request_context() else 'clinic'
+  feed = _feeds.get(key)
+  if feed is not MISS and feed.names != ver[2]:
+    feed = MISS  # every summary may show a stale name
+  if feed is not MISS:
+    feed = feed.copy()  # other threads may be serving the cached one
+    _apply(feed, _changed_rows(kind, owner_id, feed.built_through), kind, host)
+    feed.incremental_builds += 1
+    # an event that should not be there (deleted, or moved to another doctor/patient) only shows as a count
+    # mismatch; start over
+    if len(feed.events) != ver[0]:
+      feed = MISS
+  if feed is MISS:
+    feed = Feed()
+    _apply(feed, _changed_rows(kind, owner_id, None), kind, host)
+    feed.full_builds += 1
+  feed.count, feed.built_through, feed.names = ver
+  feed.body = '\r\n'.join(['BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN',
+                            'METHOD:PUBLISH']
+                           + [text for _, text in sorted(feed.events.values())]
+                           + ['END:VCALENDAR', ''])
+  _feeds.set(key, feed)
+  return feed
+
+
+
+def name_tags(target):
+  """Cache tags for a committed Patient / Staff change: the names generation, on a rename or delete."""
+  state = inspect(target)
+  if state.attrs.name.history.deleted or target in state.session.deleted:
+    return (NAMES_TAG,)
+  return ()
+
+
+def feed_token(kind, owner_id):
+  from helpers import get_serializer
+  return get_serializer(salt=TOKEN_SALT).dumps({'kind': kind, 'id': owner_id})
+
+
+def check_token(token, kind, owner_id):
+  from itsdangerous import BadSignature
+
+  from helpers import get_serializer
+  try:
+    data = get_serializer(salt=TOKEN_SALT).loads(token or '')
+  except BadSignature:
+    return False
+  return data == {'kind': kind, 'id': owner_id}
+
+
+def feed_url(kind, owner_id):
+  """The subscribable (webcal-ready) URL of an owner's feed, token included."""
+  from flask import url_for
+  return url_for(f'calendar.{kind}_feed', owner_id=owner_id, token=feed_token(kind, owner_id), _external=True)
+
+
+# summaries carry patient and doctor names, which no appointment's updated_at follows
+content_cache.watch_models(Patient, Staff, tags=name_tags)
@@ -0,0 +1,276 @@
+"""In-process background jobs backed by a database table.
+
+Request handlers call `jobs.enqueue(kind, payload)`; the row is committed to the
+`job` table, so queued work survives a restart. Each process runs one dispatcher
+thread and a small pool of worker threads:
+
+  dispatcher  claims due rows (UPDATE ... WHERE status='pending', so two gunicorn
+              workers never claim the same job) and feeds a bounded queue.Queue;
+              when the queue is full it stops claiming, which is the backpressure
+  workers     run the registered handler inside an app context, then mark the row
+              done, or pending again with exponential backoff, or failed after
+              max_attempts
+
+Handlers registered with batch_size > 1 receive a list of payloads (e.g. all due
+emails, sent over one SMTP connection) and return one result per payload: None on
+success or an error string.
+
+Handlers registered with every=<seconds> are also enqueued periodically by the
+dispatcher (at most one pending/running copy at a time across all processes),
+for housekeeping such as expiring abandoned uploads.
+
+Jobs left 'running' by a crashed process are re-queued once their lease expires.
+Nothing is spawned at import time or in a gunicorn master before fork: each
+worker calls start() once it is forked (gunicorn.conf.py post_fork; the dev
+runners call it too), so rows left pending by a previous process, and the
+periodic jobs, run without waiting for new traffic. An enqueue in a process that
+was never started starts it as well. Every app has its own queue and threads;
+`jobs` in extensions.py acts on current_app's (see per_app.py), so start() is
+called inside an app context.
+
+Config:
+  JOBS_WORKERS        worker threads per process (2)
+  JOBS_QUEUE_SIZE     bounded in-memory queue length (100)
+  JOBS_POLL_SECONDS   how often the dispatcher looks for due/retrying jobs (2)
+  JOBS_LEASE_SECONDS  after this long a 'running' job is assumed abandoned (300)
+  JOBS_EAGER          run jobs synchronously at enqueue time (tests, scripts)
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from per_app import per_app
+
+
+class JobQueue:
+  def __init__(self, app=None, db=None, model=None, handlers=None):
+    self.app = app
+    self.db = db
+    self.model = model
+    self.handlers = {} if handlers is None else handlers
+    self._next_run = {}  # periodic kind -> monotonic time it is next due
+    self._queue = None
+    self._wake = threading.Event()
+    self._stop = threading.Event()
+    self._threads = []
+    self._pid = None
+    self._lock = threading.Lock()
+    if app is not None:
+      app.extensions['jobs'] = self
+
+  @property
+  def bound(self):
+    return self.app is not None
+
+  def init_app(self, app, db=None, model=None):
+    # handlers are registered on the shared queue at import time; each app gets its own
+    # queue and threads over the same handlers, and calls here go to current_app's
+    JobQueue(app, db or self.db, model or self.model, handlers=self.handlers)
+
+  # ---- registration / enqueueing ----
+  def register(self, kind, batch_size=1, max_attempts=5, every=None):
+    def decorator(fn):
+      self.handlers[kind] = {'fn': fn, 'batch_size': batch_size, 'max_attempts': max_attempts, 'every': every}
+      return fn
+    return decorator
+
+  @per_app('jobs')
+  def schedule_periodic(self):
+    """Enqueue every periodic job that is due and not already queued. Returns the kinds enqueued."""
+    now = time.monotonic()
+    queued = []
+    for kind, handler in self.handlers.items():
+      if not handler['every'] or self._next_run.get(kind, 0) > now:
+        continue
+      self._next_run[kind] = now + handler['every']
+      busy = self.db.session.execute(select(self.model.id).where(
+        self.model.kind == kind, self.model.status.in_(('pending', 'running'))).limit(1)).first()
+      if busy is None:
+        self.enqueue(kind, {}, commit=False)
+        queued.append(kind)
+    if queued:
+      self.db.session.commit()
+      self.kick()
+    return queued
+
+  @per_app('jobs')
+  def enqueue(self, kind, payload=None, delay=0, commit=True):
+    """Persist a job. With commit=False the row rides along with the caller's commit."""
+    if kind not in self.handlers:
+      raise KeyError(f'no handler registered for job kind {kind!r}')
+    job = self.model(kind=kind, payload=json.dumps(payload or {}), status='pending', attempts=0,
+                     max_attempts=self.handlers[kind]['max_attempts'],
+                     run_after=datetime.utcnow() + timedelta(seconds=delay))
+    self.db.session.add(job)
+    if not commit:
+      return job
+    self.db.session.commit()
+    self.kick()
+    return job
+
+  @per_app('jobs')
+  def kick(self):
+    """Look for due jobs now; call after committing jobs enqueued with commit=False."""
+    if self.app.config.get('JOBS_EAGER'):
+      self.run_pending()
+    else:
+      self.start()
+
+  @per_app('jobs')
+  def start(self):
+    """Start this process's dispatcher and workers (once per process) and have them look for due jobs."""
+    if self.app.config.get('JOBS_EAGER'):
+      return
+    self._ensure_started()
+    self._wake.set()
+
+  # ---- claiming / running ----
+  def _claim(self, limit):
+    """Atomically mark up to `limit` due jobs as running; return [(kind, [jobs])] work items."""
+    s = self.db.session
+    now = datetime.utcnow()
+    lease = timedelta(seconds=self.app.config.get('JOBS_LEASE_SECONDS', 300))
+    # give abandoned jobs back to the pool
+    s.execute(update(self.model).where(self.model.status == 'running', self.model.locked_at < now - lease)
+              .values(status='pending'))
+    ids = s.execute(select(self.model.id).where(self.model.status == 'pending', self.model.run_after <= now)
+                    .order_by(self.model.run_after, self.model.id).limit(limit)).scalars().all()
+    claimed = []
+    for job_id in ids:
+      res = s.execute(update(self.model).where(self.model.id == job_id, self.model.status == 'pending')
+                      .values(status='running', locked_at=now))
+      if res.rowcount == 1:
+        claimed.append(job_id)
+    s.commit()
+    if not claimed:
+      return []
+    jobs = s.execute(select(self.model).where(self.model.id.in_(claimed))
+                     .order_by(self.model.run_after, self.model.id)).scalars().all()
+    items = []
+    batches = {}
+    for job in jobs:
+      handler = self.handlers.get(job.kind)
+      if handler and handler['batch_size'] > 1:
+        batch = batches.get(job.kind)
+        if batch is None or len(batch) >= handler['batch_size']:
+          batch = batches[job.kind] = []
+          items.append((job.kind, batch))
+        batch.append(job)
+      else:
+        items.append((job.kind, [job]))
+    return items
+
+  def _run(self, kind, jobs):
+    s = self.db.session
+    handler = self.handlers.get(kind)
+    payloads = [json.loads(j.payload or '{}') for j in jobs]
+    try:
+      if handler is None:
+        raise KeyError(f'no handler registered for job kind {kind!r}')
+      if handler['batch_size'] > 1:
+        results = handler['fn'](payloads)
+      else:
+        handler['fn'](payloads[0])
+        results = [None]
+    except Exception:
+      s.rollback()
+      results = [traceback.format_exc(limit=3)] * len(jobs)
+    now = datetime.utcnow()
+    for job, error in zip(jobs, results):
+      job = s.merge(job)
+      job.attempts = (job.attempts or 0) + 1
+      job.locked_at = None
+      if error is None:
+        job.status = 'done'
+        job.last_error = None
+      elif job.attempts >= job.max_attempts:
+        job.status = 'failed'
+        job.last_error = str(error)[-1000:]
+      else:
+        job.status = 'pending'
+        job.last_error = str(error)[-1000:]
+        job.run_after = now + self.backoff(job.attempts)
+    s.commit()
+
+  @staticmethod
+  def backoff(attempts):
+    # 5s, 10s, 20s, ... capped at an hour, with jitter so retries don't stampede
+    base = min(5 * 2 ** (attempts - 1), 3600)
+    return timedelta(seconds=base * random.uniform(0.8, 1.2))
+
+  @per_app('jobs')
+  def run_pending(self, limit=100):
+    """Claim and run every due job in the calling thread. Returns the number of jobs run."""
+    count = 0
+    while True:
+      items = self._claim(limit)
+      if not items:
+        return count
+      for kind, jobs in items:
+        self._run(kind, jobs)
+        count += len(jobs)
+
+  # ---- threads ----
+  def _ensure_started(self):
+    if self._pid == os.getpid():
+      return
+    with self._lock:
+      if self._pid == os.getpid():
+        return
+      # first use in this process (or first use after a fork): start fresh threads
+      self._pid = os.getpid()
+      self._stop.clear()
+      self._queue = queue.Queue(maxsize=self.app.config.get('JOBS_QUEUE_SIZE', 100))
+      self._threads = [threading.Thread(target=self._dispatch_loop, name='jobs-dispatcher', daemon=True)]
+      for i in range(self.app.config.get('JOBS_WORKERS', 2)):
+        self._threads.append(threading.Thread(target=self._worker_loop, name=f'jobs-worker-{i}', daemon=True))
+      for t in self._threads:
+        t.start()
+
+  def _dispatch_loop(self):
+    poll = self.app.config.get('JOBS_POLL_SECONDS', 2)
+    while not self._stop.is_set():
+      self._wake.wait(poll)
+      self._wake.clear()
+      try:
+        with self.app.app_context():
+          self.schedule_periodic()
+          # only claim what the queue can take right now
+          room = self._queue.maxsize - self._queue.qsize()
+          items = self._claim(room) if room > 0 else []
+          self.db.session.expunge_all()
+      except Exception:
+        self.app.logger.exception('job dispatcher failed to claim jobs')
+        continue
+      for item in items:
+        self._queue.put(item)
+
+  def _worker_loop(self):
+    while not self._stop.is_set():
+      try:
+        item = self._queue.get(timeout=1)
+      except queue.Empty:
+        continue
+      try:
+        with self.app.app_context():
+          self._run(*item)
+      except Exception:
+        self.app.logger.exception('job worker failed while recording a result')
+      finally:
+        self._queue.task_done()
+
+  @per_app('jobs')
+  def shutdown(self, timeout=5):
+    self._stop.set()
+    self._wake.set()
+    for t in self._threads:
+      t.join(timeout)
+    self._threads = []
+    self._pid = None
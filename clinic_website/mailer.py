@@ -0,0 +1,85 @@
+"""Outbound email over one reusable SMTP connection.
+
+Settings come from the environment (all optional; without SMTP_HOST nothing is sent):
+
+  SMTP_HOST, SMTP_PORT (587), SMTP_USER, SMTP_PASS
+  SMTP_STARTTLS   '1' (default) to upgrade the connection with STARTTLS
+  SMTP_TIMEOUT    socket timeout in seconds (10)
+  SMTP_FROM       envelope/From address (defaults to SMTP_USER or noreply@example.com)
+"""
+import os
+
+
+class Mailer:
+  def __init__(self, host, port=587, user=None, password=None, starttls=True, timeout=10, sender=None):
+    self.host = host
+    self.port = port
+    self.user = user
+    self.password = password
+    self.starttls = starttls
+    self.timeout = timeout
+    self.sender = sender or user or 'noreply@example.com'
+
+  @classmethod
+  def from_env(cls, env=os.environ):
+    host = env.get('SMTP_HOST')
+    if not host:
+      return None
+    return cls(host, int(env.get('SMTP_PORT', 587)), env.get('SMTP_USER'), env.get('SMTP_PASS'),
+               starttls=env.get('SMTP_STARTTLS', '1') not in ('0', 'false', 'off'),
+               timeout=float(env.get('SMTP_TIMEOUT', 10)), sender=env.get('SMTP_FROM'))
+
+  def build(self, to, subject, body, headers=None):
+    from email.message import EmailMessage  # like smtplib, only loaded where mail is sent
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    msg['From'] = self.sender
+    msg['To'] = to
+    for name, value in (headers or {}).items():
+      msg[name] = value
+    msg.set_content(body)
+    return msg
+
+  def connect(self):
+    import smtplib  # only loaded by processes that actually send mail
+    conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+    if self.starttls:
+      conn.starttls()
+    if self.user and self.password:
+      conn.login(self.user, self.password)
+    return conn
+
+  def send_many(self, messages):
+    """Send EmailMessages over a single connection.
+
+    Returns one entry per message: None on success, else the error text. A dropped
+    connection is re-opened once; a per-recipient refusal only fails that message.
+    """
+    import smtplib
+    results = []
+    conn = None
+    try:
+      for msg in messages:
+        for attempt in (1, 2):
+          try:
+            if conn is None:
+              conn = self.connect()
+            conn.send_message(msg)
+            results.append(None)
+            break
+          except smtplib.SMTPServerDisconnected as e:
+            conn = None
+            if attempt == 2:
+              results.append(f'disconnected: {e}')
+          except OSError as e:  # SMTPException is an OSError too
+            if not isinstance(e, smtplib.SMTPException):
+              conn = None  # socket-level failure; reconnect for the next message
+            results.append(f'{type(e).__name__}: {e}')
+            break
+    finally:
+      if conn is not None:
+        try:
+          conn.quit()
+        except Exception:
+          pass
+    return results
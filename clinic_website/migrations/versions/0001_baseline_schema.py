@@ -0,0 +1,117 @@
+"""baseline schema
+
+Creates any of the original tables that are missing and adds testimonial.featured
+to databases that predate it, so installs made with db.create_all() or patched by
+scripts/*.py can all be brought under migration control with `db upgrade`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'patient' not in tables:
+        op.create_table(
+            'patient',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=120)),
+            sa.Column('email', sa.String(length=120), nullable=False, unique=True),
+            sa.Column('phone', sa.String(length=40)),
+            sa.Column('password_hash', sa.String(length=200)),
+            sa.Column('created_at', sa.DateTime()),
+        )
+    if 'staff' not in tables:
+        op.create_table(
+            'staff',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=120)),
+            sa.Column('email', sa.String(length=120), nullable=False, unique=True),
+            sa.Column('password_hash', sa.String(length=200)),
+            sa.Column('role', sa.String(length=40)),
+            sa.Column('created_at', sa.DateTime()),
+        )
+    if 'appointment' not in tables:
+        op.create_table(
+            'appointment',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patient.id')),
+            sa.Column('date', sa.DateTime(), nullable=False),
+            sa.Column('reason', sa.String(length=300)),
+            sa.Column('status', sa.String(length=40)),
+            sa.Column('created_at', sa.DateTime()),
+        )
+    if 'vitals' not in tables:
+        op.create_table(
+            'vitals',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patient.id')),
+            sa.Column('systolic', sa.Integer()),
+            sa.Column('diastolic', sa.Integer()),
+            sa.Column('glucose', sa.Float()),
+            sa.Column('note', sa.String(length=300)),
+            sa.Column('measured_at', sa.DateTime()),
+        )
+    if 'blog_post' not in tables:
+        op.create_table(
+            'blog_post',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('title', sa.String(length=200)),
+            sa.Column('slug', sa.String(length=200), unique=True),
+            sa.Column('content', sa.Text()),
+            sa.Column('created_at', sa.DateTime()),
+        )
+    if 'testimonial' not in tables:
+        op.create_table(
+            'testimonial',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('author', sa.String(length=120)),
+            sa.Column('text', sa.String(length=600)),
+            sa.Column('featured', sa.Boolean()),
+            sa.Column('created_at', sa.DateTime()),
+        )
+    else:
+        cols = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('testimonial')}
+        if 'featured' not in cols:
+            op.add_column('testimonial', sa.Column('featured', sa.Boolean(), server_default=sa.false()))
+    if 'faq' not in tables:
+        op.create_table(
+            'faq',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('q', sa.String(length=400)),
+            sa.Column('a', sa.String(length=1000)),
+        )
+    if 'patient_file' not in tables:
+        op.create_table(
+            'patient_file',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patient.id')),
+            sa.Column('filename', sa.String(length=300)),
+            sa.Column('original_name', sa.String(length=300)),
+            sa.Column('uploaded_at', sa.DateTime()),
+        )
+    if 'audit_log' not in tables:
+        op.create_table(
+            'audit_log',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('actor', sa.String(length=200)),
+            sa.Column('action', sa.String(length=400)),
+            sa.Column('created_at', sa.DateTime()),
+        )
+
+
+def downgrade():
+    # The baseline is the oldest schema we support; there is nothing to go back to.
+    pass
@@ -0,0 +1,47 @@
+"""indexes for hot lookup and sort columns
+
+Vitals and patient files are always read per patient in time order, the admin
+appointment list sorts by date and the audit page sorts by created_at. Without
+these every one of those queries is a full table scan plus a temp-b-tree sort.
+Patient.email / Staff.email already have the implicit index from their UNIQUE
+constraints.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_vitals_patient_measured', 'vitals', ['patient_id', 'measured_at']),
+    ('ix_patient_file_patient_uploaded', 'patient_file', ['patient_id', 'uploaded_at']),
+    ('ix_appointment_patient_id', 'appointment', ['patient_id']),
+    ('ix_appointment_date', 'appointment', ['date']),
+    ('ix_audit_log_created_at', 'audit_log', ['created_at']),
+]
+
+
+def _existing(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        # databases created by db.create_all() after this change already have them
+        if name not in _existing(table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _columns in reversed(INDEXES):
+        if name in _existing(table):
+            op.drop_index(name, table_name=table)
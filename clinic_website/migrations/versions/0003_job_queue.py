@@ -0,0 +1,47 @@
+"""background job table
+
+Durable queue for work that should not run inside a request (SMTP alerts, upload
+sniffing). Workers claim rows by status and run_after, hence the composite index.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases created by db.create_all() after this change already have it
+    if 'job' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_after', sa.DateTime(), nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_job_status_run_after', 'job', ['status', 'run_after'])
+
+
+def downgrade():
+    if 'job' in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_index('ix_job_status_run_after', table_name='job')
+        op.drop_table('job')
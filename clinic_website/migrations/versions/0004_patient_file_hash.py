@@ -0,0 +1,44 @@
+"""patient_file size and sha256
+
+Uploads are hashed while they are streamed to disk; keep the digest and byte
+count with the row.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('sha256', sa.String(length=64), nullable=True),
+]
+
+
+def _existing():
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns('patient_file')}
+
+
+def upgrade():
+    missing = [c for c in COLUMNS if c.name not in _existing()]
+    if missing:
+        with op.batch_alter_table('patient_file') as batch:
+            for column in missing:
+                batch.add_column(column)
+
+
+def downgrade():
+    present = [c.name for c in COLUMNS if c.name in _existing()]
+    if present:
+        with op.batch_alter_table('patient_file') as batch:
+            for name in present:
+                batch.drop_column(name)
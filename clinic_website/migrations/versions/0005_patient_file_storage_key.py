@@ -0,0 +1,43 @@
+"""patient_file.storage_key
+
+Content-addressed storage: rows reference their blob by sha256, and garbage
+collection counts references by key, hence the index.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def _inspect():
+    insp = sa.inspect(op.get_bind())
+    return ({c['name'] for c in insp.get_columns('patient_file')},
+            {ix['name'] for ix in insp.get_indexes('patient_file')})
+
+
+def upgrade():
+    columns, indexes = _inspect()
+    if 'storage_key' not in columns:
+        with op.batch_alter_table('patient_file') as batch:
+            batch.add_column(sa.Column('storage_key', sa.String(length=64), nullable=True))
+    if 'ix_patient_file_storage_key' not in indexes:
+        op.create_index('ix_patient_file_storage_key', 'patient_file', ['storage_key'])
+
+
+def downgrade():
+    columns, indexes = _inspect()
+    if 'ix_patient_file_storage_key' in indexes:
+        op.drop_index('ix_patient_file_storage_key', table_name='patient_file')
+    if 'storage_key' in columns:
+        with op.batch_alter_table('patient_file') as batch:
+            batch.drop_column('storage_key')
@@ -0,0 +1,52 @@
+"""patient_file preview columns
+
+Previews are blobs in the same content-addressed store as the files; garbage
+collection looks them up by key.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    sa.Column('preview_key', sa.String(length=64), nullable=True),
+    sa.Column('preview_meta', sa.Text(), nullable=True),
+]
+
+
+def _inspect():
+    insp = sa.inspect(op.get_bind())
+    return ({c['name'] for c in insp.get_columns('patient_file')},
+            {ix['name'] for ix in insp.get_indexes('patient_file')})
+
+
+def upgrade():
+    columns, indexes = _inspect()
+    missing = [c for c in COLUMNS if c.name not in columns]
+    if missing:
+        with op.batch_alter_table('patient_file') as batch:
+            for column in missing:
+                batch.add_column(column)
+    if 'ix_patient_file_preview_key' not in indexes:
+        op.create_index('ix_patient_file_preview_key', 'patient_file', ['preview_key'])
+
+
+def downgrade():
+    columns, indexes = _inspect()
+    if 'ix_patient_file_preview_key' in indexes:
+        op.drop_index('ix_patient_file_preview_key', table_name='patient_file')
+    present = [c.name for c in COLUMNS if c.name in columns]
+    if present:
+        with op.batch_alter_table('patient_file') as batch:
+            for name in present:
+                batch.drop_column(name)
@@ -0,0 +1,42 @@
+"""resumable upload sessions
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases created by db.create_all() after this change already have it
+    if 'upload_session' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'upload_session',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('patient_id', sa.Integer(), sa.ForeignKey('patient.id'), nullable=False),
+        sa.Column('original_name', sa.String(length=300), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('received', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('created_by', sa.String(length=200), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_upload_session_expires_at', 'upload_session', ['expires_at'])
+
+
+def downgrade():
+    if 'upload_session' in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_index('ix_upload_session_expires_at', table_name='upload_session')
+        op.drop_table('upload_session')
@@ -0,0 +1,56 @@
+"""full-text search index (SQLite FTS5)
+
+One FTS5 table over blog posts, FAQs and testimonials, kept current by triggers
+on the three source tables; see search.py. Other databases search with LIKE and
+get nothing here.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+# table, rowid offset, kind, ref column, title column, body column (as in search.SOURCES)
+SOURCES = [
+    ('blog_post', 1, 'post', 'slug', 'title', 'content'),
+    ('faq', 2, 'faq', 'id', 'q', 'a'),
+    ('testimonial', 3, 'testimonial', 'id', 'author', 'text'),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    # databases created by db.create_all() after this change already have it
+    if bind.dialect.name != 'sqlite' or 'search_index' in sa.inspect(bind).get_table_names():
+        return
+    op.execute("CREATE VIRTUAL TABLE search_index USING fts5("
+               "kind UNINDEXED, ref UNINDEXED, title, body, tokenize='porter unicode61 remove_diacritics 2')")
+    for table, offset, kind, ref, title, body in SOURCES:
+        insert = (f"INSERT INTO search_index(rowid, kind, ref, title, body) "
+                  f"VALUES (new.id * 4 + {offset}, '{kind}', new.{ref}, new.{title}, new.{body});")
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {offset};"
+        op.execute(f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        op.execute(f"CREATE TRIGGER {table}_search_au AFTER UPDATE ON {table} BEGIN {delete} {insert} END")
+        op.execute(f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END")
+        # index what is already there
+        op.execute(f"INSERT INTO search_index(rowid, kind, ref, title, body) "
+                   f"SELECT id * 4 + {offset}, '{kind}', {ref}, {title}, {body} FROM {table}")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    for table, *_ in SOURCES:
+        for suffix in ('ai', 'au', 'ad'):
+            op.execute(f'DROP TRIGGER IF EXISTS {table}_search_{suffix}')
+    op.execute('DROP TABLE IF EXISTS search_index')
@@ -0,0 +1,74 @@
+"""doctor schedules and slot-booked appointments
+
+Schedule rows are weekly slot templates per doctor. Appointments booked into a
+slot carry the doctor (staff_id) and their end time; the (staff_id, date) index
+serves availability lookups and the partial unique index rejects a second live
+booking of the same slot.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+LIVE = sa.text("status != 'cancelled'")
+
+
+def _inspect():
+    insp = sa.inspect(op.get_bind())
+    return (insp.get_table_names(),
+            {c['name'] for c in insp.get_columns('appointment')},
+            {ix['name'] for ix in insp.get_indexes('appointment')})
+
+
+def upgrade():
+    tables, columns, indexes = _inspect()
+    # databases created by db.create_all() after this change already have these
+    if 'schedule' not in tables:
+        op.create_table(
+            'schedule',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('staff_id', sa.Integer(), sa.ForeignKey('staff.id'), nullable=False),
+            sa.Column('weekday', sa.Integer(), nullable=False),
+            sa.Column('start', sa.Time(), nullable=False),
+            sa.Column('end', sa.Time(), nullable=False),
+            sa.Column('slot_minutes', sa.Integer(), nullable=False),
+            sa.Column('valid_from', sa.Date(), nullable=True),
+            sa.Column('valid_until', sa.Date(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_schedule_staff_id', 'schedule', ['staff_id'])
+    if 'staff_id' not in columns:
+        with op.batch_alter_table('appointment') as batch:
+            batch.add_column(sa.Column('staff_id', sa.Integer(), nullable=True))
+            batch.add_column(sa.Column('end', sa.DateTime(), nullable=True))
+            batch.create_foreign_key('fk_appointment_staff_id', 'staff', ['staff_id'], ['id'])
+    if 'ix_appointment_staff_date' not in indexes:
+        op.create_index('ix_appointment_staff_date', 'appointment', ['staff_id', 'date'])
+    if 'uq_appointment_staff_slot' not in indexes:
+        op.create_index('uq_appointment_staff_slot', 'appointment', ['staff_id', 'date'], unique=True,
+                        sqlite_where=LIVE, postgresql_where=LIVE)
+
+
+def downgrade():
+    tables, columns, indexes = _inspect()
+    for name in ('uq_appointment_staff_slot', 'ix_appointment_staff_date'):
+        if name in indexes:
+            op.drop_index(name, table_name='appointment')
+    if 'staff_id' in columns:
+        with op.batch_alter_table('appointment') as batch:
+            batch.drop_constraint('fk_appointment_staff_id', type_='foreignkey')
+            batch.drop_column('end')
+            batch.drop_column('staff_id')
+    if 'schedule' in tables:
+        op.drop_index('ix_schedule_staff_id', table_name='schedule')
+        op.drop_table('schedule')
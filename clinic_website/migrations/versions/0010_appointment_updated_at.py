@@ -0,0 +1,54 @@
+"""appointment.updated_at for incremental calendar feeds
+
+Every change to an appointment bumps updated_at; ics.py rebuilds a feed from the
+rows changed since its last build and versions it by (count, max(updated_at)).
+The (owner, date, updated_at) indexes answer that aggregate without reading the
+table, and the doctor's one supersedes ix_appointment_staff_date.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def _inspect():
+    insp = sa.inspect(op.get_bind())
+    return ({c['name'] for c in insp.get_columns('appointment')},
+            {ix['name'] for ix in insp.get_indexes('appointment')})
+
+
+def upgrade():
+    columns, indexes = _inspect()
+    # databases created by db.create_all() after this change already have these
+    if 'updated_at' not in columns:
+        with op.batch_alter_table('appointment') as batch:
+            batch.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute('UPDATE appointment SET updated_at = COALESCE(created_at, date)')
+    if 'ix_appointment_staff_date_updated' not in indexes:
+        op.create_index('ix_appointment_staff_date_updated', 'appointment', ['staff_id', 'date', 'updated_at'])
+    if 'ix_appointment_patient_date_updated' not in indexes:
+        op.create_index('ix_appointment_patient_date_updated', 'appointment', ['patient_id', 'date', 'updated_at'])
+    if 'ix_appointment_staff_date' in indexes:
+        op.drop_index('ix_appointment_staff_date', table_name='appointment')
+
+
+def downgrade():
+    columns, indexes = _inspect()
+    if 'ix_appointment_staff_date' not in indexes:
+        op.create_index('ix_appointment_staff_date', 'appointment', ['staff_id', 'date'])
+    for name in ('ix_appointment_patient_date_updated', 'ix_appointment_staff_date_updated'):
+        if name in indexes:
+            op.drop_index(name, table_name='appointment')
+    if 'updated_at' in columns:
+        with op.batch_alter_table('appointment') as batch:
+            batch.drop_column('updated_at')
@@ -0,0 +1,46 @@
+"""appointment reminders and their delivery state
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases created by db.create_all() after this change already have it
+    if 'reminder' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'reminder',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('appointment_id', sa.Integer(), sa.ForeignKey('appointment.id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('offset_minutes', sa.Integer(), nullable=False),
+        sa.Column('recipient', sa.String(length=200), nullable=False),
+        sa.Column('send_at', sa.DateTime(), nullable=False),
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('key'),
+    )
+    op.create_index('ix_reminder_appointment_id', 'reminder', ['appointment_id'])
+
+
+def downgrade():
+    if 'reminder' in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_index('ix_reminder_appointment_id', table_name='reminder')
+        op.drop_table('reminder')
@@ -0,0 +1,164 @@
+"""ORM models. Schema changes ship as Alembic revisions under migrations/versions/."""
+from datetime import datetime
+
+from extensions import content_cache, db
+
+
+class Patient(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120))
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    phone = db.Column(db.String(40))
+    password_hash = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Staff(db.Model):
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String(120))
+  email = db.Column(db.String(120), unique=True, nullable=False)
+  password_hash = db.Column(db.String(200))
+  role = db.Column(db.String(40), default='staff')  # 'staff' or 'doctor' or 'admin'
+  created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Appointment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), index=True)
+    patient = db.relationship('Patient', backref='appointments')
+    date = db.Column(db.DateTime, nullable=False, index=True)
+    reason = db.Column(db.String(300))
+    status = db.Column(db.String(40), default='requested')  # requested|booked|confirmed|cancelled
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # set for appointments booked into a doctor's slot; see scheduling.py
+    staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'))
+    doctor = db.relationship('Staff')
+    end = db.Column(db.DateTime)
+    # bumped on every change; calendar feeds rebuild from it (see ics.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # (owner, date) range scans for slots and feeds; updated_at makes the feed version index-only
+        db.Index('ix_appointment_staff_date_updated', 'staff_id', 'date', 'updated_at'),
+        db.Index('ix_appointment_patient_date_updated', 'patient_id', 'date', 'updated_at'),
+        # last line of defence against two bookings of one slot; see scheduling.book()
+        db.Index('uq_appointment_staff_slot', 'staff_id', 'date', unique=True,
+                 sqlite_where=db.text("status != 'cancelled'"), postgresql_where=db.text("status != 'cancelled'")),
+    )
+
+
+class Schedule(db.Model):
+  """A slot template: the doctor sees patients on `weekday` from start to end, slot_minutes each."""
+  id = db.Column(db.Integer, primary_key=True)
+  staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False, index=True)
+  doctor = db.relationship('Staff')
+  weekday = db.Column(db.Integer, nullable=False)  # 0 = Monday
+  start = db.Column(db.Time, nullable=False)
+  end = db.Column(db.Time, nullable=False)
+  slot_minutes = db.Column(db.Integer, nullable=False, default=20)
+  valid_from = db.Column(db.Date)
+  valid_until = db.Column(db.Date)
+
+class Vitals(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'))
+    patient = db.relationship('Patient', backref='vitals')
+    systolic = db.Column(db.Integer)
+    diastolic = db.Column(db.Integer)
+    glucose = db.Column(db.Float)
+    note = db.Column(db.String(300))
+    measured_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # per-patient time-ordered reads (api_vitals, exports); id rides along as the rowid
+    __table_args__ = (db.Index('ix_vitals_patient_measured', 'patient_id', 'measured_at'),)
+
+class BlogPost(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200))
+    slug = db.Column(db.String(200), unique=True)
+    content = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Testimonial(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    author = db.Column(db.String(120))
+    text = db.Column(db.String(600))
+    featured = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class FAQ(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    q = db.Column(db.String(400))
+    a = db.Column(db.String(1000))
+
+
+class PatientFile(db.Model):
+  id = db.Column(db.Integer, primary_key=True)
+  patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'))
+  # deleting a patient deletes their file rows; the blobs go once nothing else references them
+  patient = db.relationship('Patient', backref=db.backref('files', cascade='all, delete-orphan'))
+  filename = db.Column(db.String(300))  # legacy per-upload copy under instance/uploads/<patient_id>/
+  storage_key = db.Column(db.String(64), index=True)  # sha256 of the content; see storage.py
+  preview_key = db.Column(db.String(64), index=True)  # small JPEG made by the 'make_preview' job
+  preview_meta = db.Column(db.Text)  # JSON: dimensions / page count of the original
+  original_name = db.Column(db.String(300))
+  uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+  size = db.Column(db.Integer)
+  sha256 = db.Column(db.String(64))
+
+  __table_args__ = (db.Index('ix_patient_file_patient_uploaded', 'patient_id', 'uploaded_at'),)
+
+
+class AuditLog(db.Model):
+  id = db.Column(db.Integer, primary_key=True)
+  actor = db.Column(db.String(200))
+  action = db.Column(db.String(400))
+  created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class UploadSession(db.Model):
+  # one in-progress resumable upload; the bytes so far live in a partial file on disk
+  id = db.Column(db.String(32), primary_key=True)
+  patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+  original_name = db.Column(db.String(300), nullable=False)
+  size = db.Column(db.Integer, nullable=False)  # declared total
+  received = db.Column(db.Integer, nullable=False, default=0)  # contiguous bytes on disk
+  sha256 = db.Column(db.String(64))  # expected digest, if the client sent one up front
+  created_by = db.Column(db.String(200))
+  created_at = db.Column(db.DateTime, default=datetime.utcnow)
+  expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class Job(db.Model):
+  id = db.Column(db.Integer, primary_key=True)
+  kind = db.Column(db.String(50), nullable=False)
+  payload = db.Column(db.Text)  # JSON
+  status = db.Column(db.String(20), nullable=False, default='pending')  # pending|running|done|failed
+  attempts = db.Column(db.Integer, nullable=False, default=0)
+  max_attempts = db.Column(db.Integer, nullable=False, default=5)
+  run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+  locked_at = db.Column(db.DateTime)
+  last_error = db.Column(db.Text)
+  created_at = db.Column(db.DateTime, default=datetime.utcnow)
+  updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+  __table_args__ = (db.Index('ix_job_status_run_after', 'status', 'run_after'),)
+
+
+class Reminder(db.Model):
+  # one reminder email for one appointment; see reminders.py
+  id = db.Column(db.Integer, primary_key=True)
+  appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id', ondelete='CASCADE'), nullable=False,
+                             index=True)
+  offset_minutes = db.Column(db.Integer, nullable=False)
+  recipient = db.Column(db.String(200), nullable=False)
+  send_at = db.Column(db.DateTime, nullable=False)  # local time, like Appointment.date
+  key = db.Column(db.String(64), nullable=False, unique=True)  # idempotency key, also the Message-ID
+  status = db.Column(db.String(20), nullable=False, default='queued')  # queued|sending|sent|failed|skipped
+  attempts = db.Column(db.Integer, nullable=False, default=0)
+  last_error = db.Column(db.Text)
+  sent_at = db.Column(db.DateTime)
+  created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# cached public content is invalidated by commits that touch these; see caching.py
+content_cache.watch_models(Testimonial, FAQ, BlogPost, Schedule)
@@ -0,0 +1,61 @@
+"""Opt-in full-page caching for anonymous visitors.
+
+    @app.route('/blog')
+    @cached_page(content_cache, tags=('BlogPost',))
+    def blog(): ...
+
+For a visitor with no login and no pending flash messages, the rendered body is
+stored in the ContentCache under the request path and the page's tags, and later
+hits return it without running the view or Jinja at all. Every such response
+carries a strong ETag (hash of the body) and a public Cache-Control, and
+conditional requests are answered with 304. There is no Last-Modified: no
+timestamp column moves on every edit and delete that changes a page, while the
+body hash does.
+
+Anyone with session state (patients, staff, admins, flashes) always gets a
+freshly rendered page marked private.
+
+Config:
+  PAGE_CACHE_ENABLED   default True
+  PAGE_CACHE_MAX_AGE   seconds browsers/proxies may reuse a page (default 60)
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from caching import MISS
+
+# any of these in the session means the page may be personalised
+SESSION_MARKERS = ('patient_email', 'staff_email', 'is_admin', '_flashes')
+
+
+def is_anonymous():
+  return not any(k in session for k in SESSION_MARKERS)
+
+
+def cached_page(cache, tags=()):
+  def decorator(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+      if not current_app.config.get('PAGE_CACHE_ENABLED', True) or request.method != 'GET' or not is_anonymous():
+        resp = make_response(f(*args, **kwargs))
+        resp.cache_control.private = True
+        return resp
+      key = 'page:' + request.path
+      entry = cache.get(key, tags)
+      if entry is MISS:
+        resp = make_response(f(*args, **kwargs))
+        if resp.status_code != 200 or 'Set-Cookie' in resp.headers:
+          return resp
+        body = resp.get_data()
+        entry = {'body': body, 'mimetype': resp.mimetype, 'etag': hashlib.sha256(body).hexdigest()[:32]}
+        cache.set(key, entry, tags)
+      resp = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+      resp.set_etag(entry['etag'])
+      resp.cache_control.public = True
+      resp.cache_control.max_age = current_app.config.get('PAGE_CACHE_MAX_AGE', 60)
+      resp.vary.add('Cookie')
+      return resp.make_conditional(request)
+    return decorated
+  return decorator
@@ -0,0 +1,50 @@
+"""Password hashing policy, with rehash-on-login.
+
+New hashes use PASSWORD_HASH_METHOD, in Werkzeug's method syntax:
+
+  scrypt:32768:8:1        the default (Werkzeug's own; ~0.1 s of CPU and 32 MB per hash)
+  pbkdf2:sha256:600000    where scrypt's memory use per login is too much
+
+A stored hash made with any other method or cost (accounts created before a policy
+change, or by an older Werkzeug) still verifies. The first successful login then
+replaces it with one under the current policy: verify() returns True and
+updates user.password_hash, and the caller's commit saves it.
+
+Config:
+  PASSWORD_HASH_METHOD   see above
+"""
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+def policy():
+  return current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_METHOD
+
+
+@lru_cache(maxsize=8)
+def _canonical(method):
+  # 'scrypt' and 'scrypt:32768:8:1' are the same policy; compare what Werkzeug would write
+  return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def hash_password(password):
+  return generate_password_hash(password, method=policy())
+
+
+def needs_rehash(stored):
+  """Was `stored` made with anything but the current method and cost?"""
+  return stored.split('$', 1)[0] != _canonical(policy())
+
+
+def verify(user, password):
+  """Check `password` against user.password_hash, upgrading the hash if it is outdated."""
+  stored = user.password_hash if user is not None else None
+  if not stored or not password or not check_password_hash(stored, password):
+    return False
+  if needs_rehash(stored):
+    user.password_hash = hash_password(password)
+  return True
@@ -0,0 +1,24 @@
+"""Per-app instances behind the shared extension objects in extensions.py.
+
+The objects in extensions.py exist at import time, so views and tasks can use
+them (and register job handlers or model hooks on them) before any app is built.
+init_app() gives each app its own bound instance in app.extensions; a call on the
+shared, unbound object runs on current_app's instance, the way db finds the
+current app's engine. Two apps in one process never share a queue, an audit
+buffer or a cache backend.
+"""
+import functools
+
+from flask import current_app
+
+
+def per_app(key):
+  """Run the decorated method on current_app.extensions[key] when called on an unbound instance."""
+  def decorator(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+      if not self.bound:
+        self = current_app.extensions[key]
+      return method(self, *args, **kwargs)
+    return wrapper
+  return decorator
@@ -0,0 +1,68 @@
+"""Small preview images and metadata for uploaded scans.
+
+  make_preview(fileobj, ext)  ->  (jpeg_bytes, meta) or None
+
+Photos are decoded with Pillow and downscaled; PDFs have their first page
+rendered with PyMuPDF. Both libraries are optional: without them (or for
+other file types) there is simply no preview and the file list falls back to
+the filename. Runs on a job worker, never in a request.
+"""
+import io
+from importlib.util import find_spec
+
+# Pillow and PyMuPDF are imported by the job that needs them, not by every web worker
+HAVE_PIL = find_spec('PIL') is not None
+HAVE_FITZ = find_spec('fitz') is not None
+
+PREVIEW_SIZE = (320, 320)
+PREVIEW_QUALITY = 75
+IMAGE_EXTS = ('jpg', 'jpeg', 'png')
+
+
+def supported(ext):
+  return (ext in IMAGE_EXTS and HAVE_PIL) or (ext == 'pdf' and HAVE_FITZ and HAVE_PIL)
+
+
+def _jpeg(img):
+  img.thumbnail(PREVIEW_SIZE)
+  if img.mode not in ('RGB', 'L'):
+    img = img.convert('RGB')
+  out = io.BytesIO()
+  img.save(out, 'JPEG', quality=PREVIEW_QUALITY, optimize=True)
+  return out.getvalue(), img.size
+
+
+def image_preview(fileobj):
+  from PIL import Image
+  img = Image.open(fileobj)
+  # decode at reduced scale where the codec allows it (JPEG) instead of at full size
+  img.draft('RGB', (PREVIEW_SIZE[0] * 2, PREVIEW_SIZE[1] * 2))
+  meta = {'format': img.format, 'width': img.width, 'height': img.height}
+  data, size = _jpeg(img)
+  meta['preview_width'], meta['preview_height'] = size
+  return data, meta
+
+
+def pdf_preview(fileobj):
+  import fitz  # PyMuPDF
+  from PIL import Image
+  doc = fitz.open(stream=fileobj.read(), filetype='pdf')
+  try:
+    page = doc[0]
+    scale = min(PREVIEW_SIZE[0] / page.rect.width, PREVIEW_SIZE[1] / page.rect.height)
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    img = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+    meta = {'format': 'PDF', 'pages': doc.page_count, 'title': (doc.metadata or {}).get('title') or None}
+  finally:
+    doc.close()
+  data, size = _jpeg(img)
+  meta['preview_width'], meta['preview_height'] = size
+  return data, meta
+
+
+def make_preview(fileobj, ext):
+  if not supported(ext):
+    return None
+  if ext == 'pdf':
+    return pdf_preview(fileobj)
+  return image_preview(fileobj)
@@ -0,0 +1,72 @@
+"""Per-request SQL statement counting.
+
+Every statement the engine executes while handling a request is counted. If a
+request goes over its budget the guard logs a warning, or raises
+TooManyQueries when QUERY_GUARD_RAISE is set (the default under TESTING), so an
+N+1 regression fails the test suite instead of quietly slowing production.
+
+Config:
+  QUERY_GUARD_MAX     default statement budget per request (None disables the guard)
+  QUERY_GUARD_RAISE   raise instead of log (defaults to app.testing)
+
+Views can tighten or loosen their own budget with @query_budget(n).
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+_counters = []  # active count_queries() blocks (outside of requests, e.g. in tests)
+
+
+class TooManyQueries(AssertionError):
+  pass
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+  if has_request_context():
+    g._query_count = g.get('_query_count', 0) + 1
+  for c in _counters:
+    c.append(statement)
+
+
+def init_query_guard(app, engine):
+  event.listen(engine, 'before_cursor_execute', _on_execute)
+
+  @app.after_request
+  def _check_query_budget(response):
+    count = g.get('_query_count', 0)
+    budget = g.get('_query_budget', app.config.get('QUERY_GUARD_MAX'))
+    if budget is not None and count > budget:
+      msg = f'{request.method} {request.path} ran {count} SQL statements (budget {budget})'
+      if app.config.get('QUERY_GUARD_RAISE', app.testing):
+        raise TooManyQueries(msg)
+      app.logger.warning(msg)
+    return response
+
+
+def query_budget(n):
+  """Override QUERY_GUARD_MAX for one view."""
+  def decorator(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+      g._query_budget = n
+      return f(*args, **kwargs)
+    return decorated
+  return decorator
+
+
+def queries_this_request():
+  return g.get('_query_count', 0)
+
+
+@contextmanager
+def count_queries():
+  """Collect every statement executed inside the block: `with count_queries() as stmts: ...`."""
+  stmts = []
+  _counters.append(stmts)
+  try:
+    yield stmts
+  finally:
+    _counters.remove(stmts)
@@ -0,0 +1,161 @@
+"""Token-bucket rate limiting for the login forms.
+
+A bucket holds up to `burst` tokens and refills at `burst` per period; each attempt
+takes a token or is refused with the seconds until the next one. A login attempt
+is charged to two buckets, both checked before any database lookup or password
+hash (see throttle_login()):
+
+  login-ip:<address>   every login form, per client address
+  login-acct:<email>   one account, wherever it is tried from
+
+so once a credential-stuffing burst has emptied its buckets, each further request
+costs a bucket update instead of an scrypt computation.
+
+Two interchangeable stores, as in caching.py:
+
+  SQLiteBuckets  one SQLite file shared by every worker on the host (default); a take is
+                 a single INSERT ... ON CONFLICT DO UPDATE ... RETURNING, atomic across processes
+  LocalBuckets   in-process, for a single process (`flask run`, tests, scripts); under
+                 several gunicorn workers each keeps its own, so the effective limit
+                 would be up to workers x burst
+
+Behind a proxy, client addresses come from request.remote_addr, so deploy with
+Werkzeug's ProxyFix (or the proxy's own limiting) rather than keying on the proxy.
+
+Config:
+  RATELIMIT_ENABLED        default on
+  RATELIMIT_BACKEND        'sqlite' (default) or 'local'
+  RATELIMIT_SQLITE_PATH    file for the sqlite store (default instance/ratelimit.sqlite3)
+  RATELIMIT_LOGIN_IP       '<n>/<second|minute|hour>' per client address (20/minute)
+  RATELIMIT_LOGIN_ACCOUNT  per account (5/minute)
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_rate(value):
+  """'5/minute' -> (burst 5, refill 5/60 tokens per second)."""
+  count, _, period = str(value).partition('/')
+  seconds = _PERIODS.get(period.strip().lower().rstrip('s'))
+  if not seconds or not count.strip().isdigit() or int(count) < 1:
+    raise ValueError(f'bad rate {value!r}; use e.g. 5/minute')
+  return int(count), int(count) / seconds
+
+
+class LocalBuckets:
+  def __init__(self, max_keys=10000):
+    self.max_keys = max_keys
+    self._buckets = OrderedDict()  # key -> (tokens, monotonic time of last update)
+    self._lock = threading.Lock()
+
+  def take(self, key, burst, rate, cost=1):
+    """Seconds to wait before `cost` tokens are available; 0 when they were taken."""
+    now = time.monotonic()
+    with self._lock:
+      tokens, updated = self._buckets.get(key, (burst, now))
+      tokens = min(burst, tokens + (now - updated) * rate)
+      allowed = tokens >= cost
+      if allowed:
+        tokens -= cost
+      self._buckets[key] = (tokens, now)
+      self._buckets.move_to_end(key)
+      # evicting the least recently used bucket forgets it: a full bucket again
+      while len(self._buckets) > self.max_keys:
+        self._buckets.popitem(last=False)
+    return 0 if allowed else (cost - tokens) / rate
+
+  def clear(self):
+    with self._lock:
+      self._buckets.clear()
+
+
+class SQLiteBuckets:
+  """Buckets shared between processes through one SQLite file."""
+
+  PURGE_EVERY = 500  # takes between sweeps of buckets idle for a day
+
+  # SET expressions all see the old row, so `allowed` is decided on the refilled,
+  # not yet charged, token count
+  TAKE = ('INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :burst - :cost, :now, 1) '
+          'ON CONFLICT(key) DO UPDATE SET '
+          ' tokens = min(:burst, tokens + (:now - updated) * :rate)'
+          '   - CASE WHEN min(:burst, tokens + (:now - updated) * :rate) >= :cost THEN :cost ELSE 0 END,'
+          ' updated = :now,'
+          ' allowed = min(:burst, tokens + (:now - updated) * :rate) >= :cost '
+          'RETURNING tokens, allowed')
+
+  def __init__(self, path):
+    self.path = path
+    self._local = threading.local()
+    self._takes = 0
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    self._conn().execute('CREATE TABLE IF NOT EXISTS buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER)')
+
+  def _conn(self):
+    conn = getattr(self._local, 'conn', None)
+    if conn is None:
+      conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      self._local.conn = conn
+    return conn
+
+  def take(self, key, burst, rate, cost=1):
+    now = time.time()
+    conn = self._conn()
+    tokens, allowed = conn.execute(self.TAKE, {'key': key, 'burst': burst, 'rate': rate, 'cost': cost,
+                                               'now': now}).fetchone()
+    self._takes += 1
+    if self._takes % self.PURGE_EVERY == 0:
+      conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 86400,))
+    return 0 if allowed else (cost - tokens) / rate
+
+  def clear(self):
+    self._conn().execute('DELETE FROM buckets')
+
+
+def retry_headers(wait):
+  return {'Retry-After': str(max(1, math.ceil(wait)))}
+
+
+class RateLimiter:
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    if app.config.get('RATELIMIT_BACKEND', 'sqlite').lower() == 'local':
+      app.extensions['ratelimit'] = LocalBuckets()
+    else:
+      path = app.config.get('RATELIMIT_SQLITE_PATH') or os.path.join(app.instance_path, 'ratelimit.sqlite3')
+      app.extensions['ratelimit'] = SQLiteBuckets(path)
+
+  @property
+  def store(self):
+    """current_app's buckets."""
+    return current_app.extensions['ratelimit']
+
+  def take(self, key, rate, cost=1):
+    """Charge `cost` to the bucket at `key` under `rate` ('5/minute'). Returns seconds to wait, 0 if allowed."""
+    if not current_app.config.get('RATELIMIT_ENABLED', True):
+      return 0
+    burst, per_second = parse_rate(rate)
+    return self.store.take(key, burst, per_second, cost)
+
+  def throttle_login(self, account=None):
+    """Seconds this login attempt must wait, or 0 when it may go on to the password check."""
+    cfg = current_app.config
+    wait = self.take(f'login-ip:{request.remote_addr}', cfg['RATELIMIT_LOGIN_IP'])
+    if wait or account is None:
+      # a refused address is not charged to the account, so it cannot lock the owner out faster
+      return wait
+    return self.take(f'login-acct:{(account or "").strip().lower()}', cfg['RATELIMIT_LOGIN_ACCOUNT'])
@@ -0,0 +1,159 @@
+"""Appointment reminders, emailed to the patient at fixed offsets before the visit.
+
+The 'schedule_reminders' job (every SCAN_SECONDS, see tasks.py) is enqueued by
+the job dispatcher that each worker starts at boot (jobs.start()), so scans run
+whether or not the site gets traffic. It only looks at appointments whose
+reminder falls due soon: per offset, one range on ix_appointment_date,
+[now + offset - late, now + offset + lookahead). A scan reads
+about `lookahead` worth of appointments per offset however large the table is.
+
+Each reminder found becomes a Reminder row plus a 'reminder' job delayed until it
+is due. The job runner hands due reminders to deliver() in batches of
+BATCH_SIZE, which sends them over one SMTP connection and records each row's state:
+
+  queued -> sending -> sent | failed
+         -> skipped   (cancelled, moved, or no email address by the time it is due)
+
+The row's key (appointment, offset, start time, recipient) is its idempotency key:
+overlapping scans find it and add nothing, a retried job skips rows already
+'sent', and it is the email's Message-ID, so a resend after a crash mid-batch
+collapses into one message in the recipient's mail client. Moving an appointment
+changes the key, so the new time gets reminders of its own.
+
+Config:
+  REMINDER_OFFSETS            before the appointment, e.g. '24h,2h' or '90m'
+  REMINDER_LOOKAHEAD_MINUTES  how far ahead each scan queues reminders (30)
+  REMINDER_LATE_MINUTES       how late a reminder may still go out, e.g. after downtime (60)
+"""
+import hashlib
+import re
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from extensions import db, jobs
+from models import Appointment, Patient, Reminder
+from scheduling import LIVE_STATUSES
+
+SCAN_SECONDS = 300
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+
+_OFFSET = re.compile(r'^\s*(\d+)\s*([dhm]?)\s*$')
+_UNIT_MINUTES = {'d': 1440, 'h': 60, 'm': 1, '': 1}
+
+
+def parse_offsets(value):
+  """'24h,2h' -> [1440, 120] (minutes, largest first). Bare numbers are minutes."""
+  if isinstance(value, str):
+    out = []
+    for part in filter(None, (p.strip() for p in value.lower().split(','))):
+      m = _OFFSET.match(part)
+      if not m:
+        raise ValueError(f'bad reminder offset {part!r}; use e.g. 24h, 90m or 2d')
+      out.append(int(m.group(1)) * _UNIT_MINUTES[m.group(2)])
+    value = out
+  return sorted({int(v) for v in value if int(v) > 0}, reverse=True)
+
+
+def reminder_key(appointment_id, offset_minutes, start, recipient):
+  raw = f'{appointment_id}:{offset_minutes}:{start:%Y-%m-%dT%H:%M}:{recipient.strip().lower()}'
+  return hashlib.sha256(raw.encode()).hexdigest()[:40]
+
+
+def _due_soon(offset, now, ahead, late):
+  """(appointment id, start, patient email) whose `offset` reminder is due in [now - late, now + ahead)."""
+  lo, hi = now + offset - late, now + offset + ahead
+  return db.session.execute(
+    select(Appointment.id, Appointment.date, Patient.email)
+    .join(Patient, Appointment.patient_id == Patient.id)
+    .where(Appointment.date >= max(lo, now), Appointment.date < hi, Appointment.status.in_(LIVE_STATUSES))).all()
+
+
+def scan(now=None):
+  """Queue the reminders falling due within the lookahead. Returns how many were queued."""
+  now = now or datetime.now()
+  cfg = current_app.config
+  ahead = timedelta(minutes=cfg['REMINDER_LOOKAHEAD_MINUTES'])
+  late = timedelta(minutes=cfg['REMINDER_LATE_MINUTES'])
+  candidates = {}
+  for minutes in parse_offsets(cfg['REMINDER_OFFSETS']):
+    for appt_id, start, email in _due_soon(timedelta(minutes=minutes), now, ahead, late):
+      if email:
+        key = reminder_key(appt_id, minutes, start, email)
+        candidates[key] = Reminder(appointment_id=appt_id, offset_minutes=minutes, recipient=email,
+                                   send_at=start - timedelta(minutes=minutes), key=key, status='queued')
+  if not candidates:
+    return 0
+  known = set(db.session.execute(select(Reminder.key).where(Reminder.key.in_(list(candidates)))).scalars())
+  new = [r for k, r in candidates.items() if k not in known]
+  db.session.add_all(new)
+  db.session.flush()
+  for r in new:
+    jobs.enqueue('reminder', {'id': r.id}, delay=max(0, (r.send_at - now).total_seconds()), commit=False)
+  db.session.commit()
+  jobs.kick()
+  return len(new)
+
+
+def _still_wanted(reminder, appt):
+  if appt is None or appt.status not in LIVE_STATUSES or appt.date <= datetime.now():
+    return False
+  patient = appt.patient
+  # moved, or a different address since: the key no longer matches what would be sent
+  return bool(patient and patient.email) and \
+      reminder_key(appt.id, reminder.offset_minutes, appt.date, patient.email) == reminder.key
+
+
+def render(reminder, appt):
+  when = appt.date.strftime('%A %d %B at %H:%M')
+  doctor = f' with Dr. {appt.doctor.name}' if appt.doctor else ''
+  subject = f'Reminder: your appointment{doctor} on {appt.date:%d %b, %H:%M}'
+  body = (f'Dear {appt.patient.name or "patient"},\n\n'
+          f'This is a reminder of your appointment{doctor} on {when}.\n'
+          + (f'Reason: {appt.reason}\n' if appt.reason else '')
+          + '\nIf you cannot make it, please call the clinic to cancel or reschedule.\n')
+  return subject, body
+
+
+def deliver(reminder_ids, mailer):
+  """Send the given reminders over one connection. Returns one result per id: None or an error."""
+  rows = {r.id: r for r in db.session.execute(select(Reminder).where(Reminder.id.in_(reminder_ids))).scalars()}
+  appts = {a.id: a for a in db.session.execute(
+    select(Appointment).options(joinedload(Appointment.patient), joinedload(Appointment.doctor))
+    .where(Appointment.id.in_({r.appointment_id for r in rows.values()}))).scalars()}
+  outgoing = []
+  for r in rows.values():
+    if r.status in ('sent', 'skipped', 'failed'):
+      continue  # the idempotency guarantee: a retried or duplicated job sends nothing twice
+    if not _still_wanted(r, appts.get(r.appointment_id)):
+      r.status = 'skipped'
+      continue
+    if mailer is None:
+      r.status, r.last_error = 'skipped', 'SMTP is not configured'
+      continue
+    r.status = 'sending'
+    r.attempts = (r.attempts or 0) + 1
+    outgoing.append(r)
+  # 'sending' is on disk before anything leaves, so a crash shows as such rather than as queued
+  db.session.commit()
+
+  messages = []
+  for r in outgoing:
+    subject, body = render(r, appts[r.appointment_id])
+    messages.append(mailer.build(r.recipient, subject, body, headers={'Message-ID': f'<reminder-{r.key}@clinic>'}))
+  errors = mailer.send_many(messages) if messages else []
+  failed = {}
+  now = datetime.utcnow()
+  for r, error in zip(outgoing, errors):
+    if error is None:
+      r.status, r.sent_at, r.last_error = 'sent', now, None
+    else:
+      r.last_error = error[-1000:]
+      r.status = 'failed' if r.attempts >= MAX_ATTEMPTS else 'queued'
+      failed[r.id] = error
+  db.session.commit()
+  # the job runner retries what failed with backoff, up to the same MAX_ATTEMPTS
+  return [failed.get(i) for i in reminder_ids]
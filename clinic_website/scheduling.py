@@ -0,0 +1,192 @@
+"""Doctor availability and slot booking.
+
+Each doctor's week is described by Schedule rows (slot templates): weekday, start,
+end and slot length, optionally limited to a date range. A day's slots are cut
+from its templates; what is free is the slots minus that doctor's live
+appointments that day.
+
+Availability is computed per (doctor, day) from one indexed query
+(ix_appointment_staff_date_updated) and kept in the ContentCache under the tag
+'slots:<staff_id>', so /api/slots is usually served without touching the
+database. Any committed change to a doctor's appointments (and every booking)
+invalidates that tag; a change to any Schedule invalidates 'Schedule'.
+
+The booked intervals of a day are a sorted, non-overlapping array, so a conflict
+check is two bisections (Intervals.conflicts()). Booking itself never trusts the cache:
+book() inserts with INSERT ... SELECT ... WHERE NOT EXISTS (overlapping live
+appointment), a single statement, so two requests racing for one slot cannot
+both succeed. The partial unique index on (staff_id, date) backs that up on
+databases where the statement could interleave.
+
+Config:
+  BOOKING_HORIZON_DAYS   how far ahead slots are offered (60)
+  BOOKING_LEAD_MINUTES   earliest bookable slot, from now (60)
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, exists, insert, inspect, literal, or_, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from extensions import content_cache, db
+from models import Appointment, Schedule, Staff
+
+LIVE_STATUSES = ('requested', 'booked', 'confirmed')
+BOOK_RETRIES = 3
+
+
+class SlotUnavailable(Exception):
+  pass
+
+
+def slots_tag(staff_id):
+  return f'slots:{staff_id}'
+
+
+def appointment_tags(appt):
+  """Cache tags a changed appointment invalidates: its doctor's, and its old doctor's if reassigned."""
+  ids = {appt.staff_id}
+  ids.update(inspect(appt).attrs.staff_id.history.deleted or ())
+  return {slots_tag(i) for i in ids if i is not None}
+
+
+def template_slots(schedules, day):
+  """[(start, end)] cut from the templates that apply to `day`, sorted, duplicates dropped."""
+  slots = set()
+  for s in schedules:
+    if s.weekday != day.weekday() or (s.valid_from and day < s.valid_from) or (s.valid_until and day > s.valid_until):
+      continue
+    step = timedelta(minutes=s.slot_minutes)
+    t, end = datetime.combine(day, s.start), datetime.combine(day, s.end)
+    while t + step <= end:
+      slots.add((t, t + step))
+      t += step
+  return sorted(slots)
+
+
+class Intervals:
+  """One doctor's booked [start, end) intervals of a day: sorted and non-overlapping."""
+
+  def __init__(self, items):
+    self.items = sorted(items)
+    self.starts = [i[0] for i in self.items]
+
+  def conflicts(self, start, end):
+    """Does [start, end) overlap a booked interval? Two bisections, O(log n)."""
+    i = bisect_left(self.starts, start)
+    if i and self.items[i - 1][1] > start:
+      return True
+    return i < len(self.items) and self.items[i][0] < end
+
+
+def booked_intervals(staff_id, day):
+  """The doctor's live appointments on `day`, from the (staff_id, date) index."""
+  start = datetime.combine(day, datetime.min.time())
+  rows = db.session.execute(
+    select(Appointment.date, Appointment.end)
+    .where(Appointment.staff_id == staff_id, Appointment.date >= start, Appointment.date < start + timedelta(days=1),
+           Appointment.status.in_(LIVE_STATUSES)))
+  return Intervals((r.date, r.end or r.date) for r in rows)
+
+
+def _day_availability(staff_id, day):
+  schedules = db.session.execute(select(Schedule).where(Schedule.staff_id == staff_id)).scalars().all()
+  booked = booked_intervals(staff_id, day)
+  return [slot for slot in template_slots(schedules, day) if not booked.conflicts(*slot)]
+
+
+def booking_window():
+  """(earliest, latest) start time a slot may be booked for: the lead time and the horizon from now."""
+  now = datetime.now()
+  cfg = current_app.config
+  return (now + timedelta(minutes=cfg['BOOKING_LEAD_MINUTES']), now + timedelta(days=cfg['BOOKING_HORIZON_DAYS']))
+
+
+def free_slots(staff_id, day):
+  """Free [(start, end)] of one doctor's day within the booking window, from the cache when nothing changed since."""
+  earliest, latest = booking_window()
+  if day < earliest.date() or day > latest.date():
+    return []
+  slots = content_cache.get_or_set(f'slots:{staff_id}:{day.isoformat()}', lambda: _day_availability(staff_id, day),
+                                   tags=(slots_tag(staff_id), 'Schedule'))
+  return [s for s in slots if earliest <= s[0] <= latest]
+
+
+def next_free_slots(staff_id, after=None, n=5):
+  """The first n free slots of the doctor at or after `after` (default now), within the booking horizon."""
+  after = after or datetime.now()
+  found = []
+  day = after.date()
+  for _ in range(current_app.config['BOOKING_HORIZON_DAYS'] + 1):
+    found += [s for s in free_slots(staff_id, day) if s[0] >= after]
+    if len(found) >= n:
+      break
+    day += timedelta(days=1)
+  return found[:n]
+
+
+def slot_end(staff_id, start):
+  """The end of the template slot starting at `start`, or None if no template has one there."""
+  schedules = db.session.execute(select(Schedule).where(Schedule.staff_id == staff_id)).scalars().all()
+  for s, e in template_slots(schedules, start.date()):
+    if s == start:
+      return e
+  return None
+
+
+def book(staff_id, start, patient_id, reason=None):
+  """Book the slot at `start` with the doctor. Returns the new Appointment's id.
+
+  Raises SlotUnavailable if the time is not a slot of the doctor's schedule, is too
+  soon or too far ahead, or overlaps a live appointment (including one committed
+  by a concurrent request a moment ago).
+  """
+  earliest, latest = booking_window()
+  if not earliest <= start <= latest:
+    raise SlotUnavailable('That time can no longer be booked.')
+  end = slot_end(staff_id, start)
+  if end is None:
+    raise SlotUnavailable('That time is not one of the doctor\'s appointment slots.')
+
+  stamp = datetime.utcnow()  # created_at / updated_at are UTC, like everywhere else in the schema
+  overlapping = exists().where(
+    Appointment.staff_id == staff_id, Appointment.status.in_(LIVE_STATUSES), Appointment.date < end,
+    or_(Appointment.end > start, and_(Appointment.end.is_(None), Appointment.date >= start)))
+  values = select(literal(patient_id), literal(staff_id), literal(start, db.DateTime), literal(end, db.DateTime),
+                  literal(reason, db.String), literal('booked'), literal(stamp, db.DateTime),
+                  literal(stamp, db.DateTime)).where(~overlapping)
+  stmt = insert(Appointment).from_select(
+    ['patient_id', 'staff_id', 'date', 'end', 'reason', 'status', 'created_at', 'updated_at'], values)
+
+  for attempt in range(BOOK_RETRIES):
+    try:
+      result = db.session.execute(stmt)
+      db.session.commit()
+      break
+    except IntegrityError:
+      db.session.rollback()
+      result = None
+      break
+    except OperationalError:
+      # SQLite: another booking committed after our snapshot (SQLITE_BUSY); the retry sees it
+      db.session.rollback()
+      if attempt == BOOK_RETRIES - 1:
+        raise
+  if result is None or result.rowcount != 1:
+    raise SlotUnavailable('Sorry, that slot was just taken. Please pick another.')
+  # a Core insert fires no ORM events, so invalidate by hand
+  content_cache.invalidate(slots_tag(staff_id))
+  return db.session.execute(
+    select(Appointment.id).where(Appointment.staff_id == staff_id, Appointment.date == start,
+                                 Appointment.status.in_(LIVE_STATUSES))).scalar_one()
+
+
+def doctors_with_schedules():
+  return db.session.execute(
+    select(Staff).where(Staff.id.in_(select(Schedule.staff_id))).order_by(Staff.name)).scalars().all()
+
+
+
+# a committed change to an appointment drops its doctor's cached days
+content_cache.watch_models(Appointment, tags=appointment_tags)
@@ -0,0 +1,120 @@
+"""Login latency for a real patient while a credential-stuffing burst hits /login.
+
+Attacker threads post wrong passwords for random accounts from a handful of
+addresses, as fast as they are answered; meanwhile a real patient logs in
+correctly every --interval seconds (a different account and address each time).
+It runs three times: no attack (the baseline), attack with the rate limiter off,
+and attack with it on, and prints for each:
+
+  attack req/s      requests the attackers got answered
+  hashes            password hashes computed (check_password_hash calls)
+  patient p50/p95   latency of the real patient's logins
+
+Everything runs in one process against a throwaway SQLite file, like the threads
+of one gunicorn worker. Usage:
+
+    python scripts/bench_login.py [--attackers 8] [--seconds 40]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# never touch the real clinic_full.db when importing the app
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import passwords  # noqa: E402
+from clinic_app import create_app, db, Patient  # noqa: E402
+
+REAL = 100  # accounts p0..p99 belong to the real patients; the attack targets the rest
+
+
+def make_app(path, accounts, limited):
+  app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'RATELIMIT_ENABLED': limited,
+                    'TEMPLATE_CACHE_DIR': '', 'TEMPLATE_SLOW_MS': 1e9, 'AUDIT_MODE': 'sync',
+                    'SESSION_BACKEND': 'memory', 'RATELIMIT_BACKEND': 'local'})
+  with app.app_context():
+    db.create_all()
+    if not db.session.query(Patient.id).first():
+      with app.test_request_context():
+        pw = passwords.hash_password('correct horse')
+      db.session.add_all(Patient(name=f'P{i}', email=f'p{i}@example.com', password_hash=pw) for i in range(accounts))
+      db.session.commit()
+  return app
+
+
+def run(app, attackers, seconds, interval, accounts):
+  stop = threading.Event()
+  answered = [0] * attackers
+  latencies = []
+  hashes = [0]
+  check = passwords.check_password_hash
+
+  def counting_check(*args):
+    hashes[0] += 1
+    return check(*args)
+
+  def attacker(n):
+    rnd = random.Random(n)
+    client = app.test_client()
+    ip = f'203.0.113.{n % 4}'  # a small botnet: several threads per address
+    while not stop.is_set():
+      client.post('/login', data={'email': f'p{rnd.randrange(REAL, accounts)}@example.com', 'password': 'guess'},
+                  environ_base={'REMOTE_ADDR': ip})
+      answered[n] += 1
+
+  def patient():
+    client = app.test_client()
+    n = 0
+    while not stop.is_set():
+      start = time.perf_counter()
+      resp = client.post('/login', data={'email': f'p{n % REAL}@example.com', 'password': 'correct horse'},
+                         environ_base={'REMOTE_ADDR': f'198.51.100.{n % 250}'})
+      n += 1
+      latencies.append((time.perf_counter() - start) * 1000)
+      assert resp.status_code == 302, resp.status_code
+      client.get('/logout')
+      stop.wait(interval)
+
+  passwords.check_password_hash = counting_check
+  try:
+    threads = [threading.Thread(target=attacker, args=(n,)) for n in range(attackers)]
+    threads.append(threading.Thread(target=patient))
+    for t in threads:
+      t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+      t.join()
+  finally:
+    passwords.check_password_hash = check
+  q = statistics.quantiles(latencies, n=20)
+  return {'attack': sum(answered) / seconds, 'hashes': hashes[0], 'logins': len(latencies),
+          'p50': statistics.median(latencies), 'p95': q[18]}
+
+
+def main():
+  ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  ap.add_argument('--attackers', type=int, default=8)
+  ap.add_argument('--seconds', type=float, default=40)
+  ap.add_argument('--interval', type=float, default=0.25)
+  ap.add_argument('--accounts', type=int, default=300)
+  args = ap.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'bench.db')
+    for label, attackers, limited in (('no attack', 0, False), ('limiter off', args.attackers, False),
+                                      ('limiter on', args.attackers, True)):
+      app = make_app(path, args.accounts, limited)
+      r = run(app, attackers, args.seconds, args.interval, args.accounts)
+      print(f"{label:12s} attack {r['attack']:8.1f} req/s  hashes {r['hashes']:6d}  "
+            f"patient p50 {r['p50']:7.1f} ms  p95 {r['p95']:7.1f} ms  ({r['logins']} logins)")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,98 @@
+"""Show SQLite query plans and timings for the hot lookups, without and with the indexes.
+
+Builds a throwaway database from the ORM models, fills it with synthetic data,
+then runs each hot query first with the 0002 indexes dropped and again with them
+in place. Usage:
+
+    python scripts/bench_query_plans.py [--patients 2000] [--vitals-per-patient 200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# never touch the real clinic_full.db when importing the app
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from clinic_app import db  # noqa: E402
+
+INDEXES = ['ix_vitals_patient_measured', 'ix_patient_file_patient_uploaded',
+           'ix_appointment_patient_id', 'ix_appointment_date', 'ix_audit_log_created_at']
+
+QUERIES = [
+  ('patient by email', "SELECT * FROM patient WHERE email = :email", {'email': 'p1000@example.com'}),
+  ('vitals page', "SELECT id, measured_at, systolic, diastolic, glucose FROM vitals "
+                  "WHERE patient_id = :pid ORDER BY measured_at, id LIMIT 501", {'pid': 1000}),
+  ('patient files', "SELECT * FROM patient_file WHERE patient_id = :pid ORDER BY uploaded_at DESC", {'pid': 1000}),
+  ('appointments by date', "SELECT * FROM appointment ORDER BY date LIMIT 50", {}),
+  ('recent audit', "SELECT * FROM audit_log ORDER BY created_at DESC LIMIT 200", {}),
+]
+
+
+def populate(conn, patients, vitals_per_patient):
+  rnd = random.Random(42)
+  base = datetime(2023, 1, 1)
+  conn.execute(text("INSERT INTO patient (id, name, email, created_at) VALUES (:id, :n, :e, :c)"),
+               [{'id': i, 'n': f'P{i}', 'e': f'p{i}@example.com', 'c': base} for i in range(1, patients + 1)])
+  # interleave patients so each patient's rows are spread across the table, as in production
+  rows = [{'pid': rnd.randint(1, patients), 's': rnd.randint(100, 160), 'd': rnd.randint(60, 100),
+           'g': rnd.uniform(70, 200), 't': base + timedelta(minutes=rnd.randint(0, 525600))}
+          for _ in range(patients * vitals_per_patient)]
+  conn.execute(text("INSERT INTO vitals (patient_id, systolic, diastolic, glucose, measured_at) "
+                    "VALUES (:pid, :s, :d, :g, :t)"), rows)
+  conn.execute(text("INSERT INTO patient_file (patient_id, filename, original_name, uploaded_at) "
+                    "VALUES (:pid, 'f', 'f.pdf', :t)"),
+               [{'pid': rnd.randint(1, patients), 't': base + timedelta(hours=i)} for i in range(patients * 5)])
+  conn.execute(text("INSERT INTO appointment (patient_id, date, status) VALUES (:pid, :t, 'requested')"),
+               [{'pid': rnd.randint(1, patients), 't': base + timedelta(minutes=rnd.randint(0, 525600))}
+                for _ in range(patients * 3)])
+  conn.execute(text("INSERT INTO audit_log (actor, action, created_at) VALUES ('bench', 'x', :t)"),
+               [{'t': base + timedelta(seconds=i * 37)} for i in range(patients * 20)])
+
+
+def run(conn, label, repeat):
+  print(f'\n=== {label} ===')
+  for name, sql, params in QUERIES:
+    plan = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params).all()
+    start = time.perf_counter()
+    for _ in range(repeat):
+      conn.execute(text(sql), params).all()
+    ms = (time.perf_counter() - start) / repeat * 1000
+    print(f'{name:22s} {ms:8.3f} ms   ' + ' | '.join(r[-1] for r in plan))
+
+
+def main():
+  ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  ap.add_argument('--patients', type=int, default=2000)
+  ap.add_argument('--vitals-per-patient', type=int, default=200)
+  ap.add_argument('--repeat', type=int, default=20)
+  args = ap.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+      for name in INDEXES:
+        conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+      populate(conn, args.patients, args.vitals_per_patient)
+      conn.execute(text('ANALYZE'))
+    with engine.connect() as conn:
+      run(conn, 'without indexes', args.repeat)
+    with engine.begin() as conn:
+      for table in db.metadata.sorted_tables:
+        for ix in table.indexes:
+          if ix.name in INDEXES:
+            ix.create(conn)
+      conn.execute(text('ANALYZE'))
+    with engine.connect() as conn:
+      run(conn, 'with indexes', args.repeat)
+    engine.dispose()
+
+
+if __name__ == '__main__':
+  main()
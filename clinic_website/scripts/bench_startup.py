@@ -0,0 +1,80 @@
+"""Measure what a fresh worker pays before it can answer its first request.
+
+Each run is a new interpreter (like a gunicorn worker after --max-requests):
+
+  import       `import clinic_app`
+  app          building the Flask app (clinic_app.app, i.e. create_app())
+  first GET /  the first request, including template compilation
+  modules      entries in sys.modules once the first request is done
+
+The database is created once up front in a temp file, as it would already
+exist in production. Usage:
+
+    python scripts/bench_startup.py [--runs 10] [--write docs/startup_benchmark.md]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SETUP = """
+import clinic_app
+app = clinic_app.app
+with app.app_context():
+  clinic_app.db.create_all()
+"""
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import clinic_app
+t1 = time.perf_counter()
+app = clinic_app.app
+t2 = time.perf_counter()
+status = app.test_client().get('/').status_code
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'app': t2 - t1, 'first': t3 - t2, 'modules': len(sys.modules), 'status': status}))
+"""
+
+
+def run(code, env):
+  out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True,
+                       capture_output=True, text=True).stdout
+  return out.strip().splitlines()[-1] if out.strip() else ''
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--runs', type=int, default=10)
+  parser.add_argument('--write', help='also write the markdown table to this file')
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as tmp:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+               STORAGE_ROOT=os.path.join(tmp, 'blobs'), PYTHONDONTWRITEBYTECODE='')
+    run(SETUP, env)
+    samples = [json.loads(run(PROBE, env)) for _ in range(args.runs)]
+
+  assert all(s['status'] == 200 for s in samples), samples
+  rows = []
+  for key, label in (('import', 'import clinic_app'), ('app', 'build app'), ('first', 'first GET /')):
+    values = [s[key] * 1000 for s in samples]
+    rows.append(f'| {label} | {statistics.median(values):.1f} ms | {min(values):.1f} ms |')
+  total = [(s['import'] + s['app'] + s['first']) * 1000 for s in samples]
+  rows.append(f'| **total to first response** | {statistics.median(total):.1f} ms | {min(total):.1f} ms |')
+  rows.append(f"| modules loaded | {int(statistics.median(s['modules'] for s in samples))} | |")
+  table = '\n'.join(['| step | median | best |', '|---|---|---|'] + rows)
+  print(f'{args.runs} runs, Python {sys.version.split()[0]}\n')
+  print(table)
+  if args.write:
+    with open(args.write, 'a') as fh:
+      fh.write(table + '\n')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,30 @@
+"""Fingerprint and precompress the static bundles into static/dist (see assets.py).
+
+Run after `npm run build:css`; `npm run build` does both:
+
+    python scripts/build_assets.py [--out static/dist]
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import assets  # noqa: E402
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--out', help='output directory (default static/dist)')
+  args = parser.parse_args()
+  try:
+    manifest = assets.build(ROOT, args.out and os.path.abspath(args.out))
+  except assets.MissingSource as e:
+    sys.exit(str(e))
+  for name, hashed in manifest.items():
+    print(f'{name:40} {hashed}')
+
+
+if __name__ == '__main__':
+  main()
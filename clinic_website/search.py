@@ -0,0 +1,147 @@
+"""Full-text search over blog posts, FAQs and testimonials.
+
+On SQLite everything searchable is copied into one FTS5 table, `search_index`,
+by triggers on blog_post, faq and testimonial, so rows written by any code path
+(the admin forms, seed_db.py, a sqlite3 shell) are indexed in the same
+transaction. The index rowid encodes the source row (id * 4 + kind), which keeps
+the triggers' deletes an index lookup rather than a scan.
+
+search() ranks with bm25 (titles weigh more than bodies) and returns a short
+snippet around the matches. The porter tokenizer makes 'diabetic' find
+'diabetes'; the last word is matched as a prefix so results show while typing.
+
+The table and triggers are created with the schema (db.create_all(), migration
+0008); `flask rebuild-search` refills the index from the source tables. On other
+databases search() falls back to LIKE, which is correct but scans every row.
+"""
+import re
+
+from flask import url_for
+from markupsafe import Markup, escape
+from sqlalchemy import event, text
+
+from extensions import db
+
+# kind -> (table, rowid offset, ref column, title column, body column)
+SOURCES = {
+  'post': ('blog_post', 1, 'slug', 'title', 'content'),
+  'faq': ('faq', 2, 'id', 'q', 'a'),
+  'testimonial': ('testimonial', 3, 'id', 'author', 'text'),
+}
+MAX_RESULTS = 50
+# bm25 column weights: kind, ref (unindexed), title, body
+RANK = 'bm25(search_index, 0, 0, 5.0, 1.0)'
+# snippet markers that cannot occur in content; swapped for <mark> after escaping
+_HL_START, _HL_END = '\x02', '\x03'
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def schema_ddl():
+  stmts = ["CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+           "kind UNINDEXED, ref UNINDEXED, title, body, tokenize='porter unicode61 remove_diacritics 2')"]
+  for kind, (table, offset, ref, title, body) in SOURCES.items():
+    insert = (f"INSERT INTO search_index(rowid, kind, ref, title, body) "
+              f"VALUES (new.id * 4 + {offset}, '{kind}', new.{ref}, new.{title}, new.{body});")
+    delete = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {offset};"
+    stmts += [
+      f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END",
+      f"CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+      f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END",
+    ]
+  return stmts
+
+
+def uses_fts(bind):
+  return bind.dialect.name == 'sqlite'
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_index(target, connection, **kw):
+  if uses_fts(connection):
+    for stmt in schema_ddl():
+      connection.exec_driver_sql(stmt)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_index(target, connection, **kw):
+  # the triggers go with their tables; the virtual table has to be dropped by hand
+  if uses_fts(connection):
+    connection.exec_driver_sql('DROP TABLE IF EXISTS search_index')
+
+
+def rebuild(session=None):
+  """Refill the index from the source tables. Returns the number of rows indexed."""
+  session = session or db.session
+  session.execute(text('DELETE FROM search_index'))
+  for kind, (table, offset, ref, title, body) in SOURCES.items():
+    session.execute(text(f"INSERT INTO search_index(rowid, kind, ref, title, body) "
+                         f"SELECT id * 4 + {offset}, '{kind}', {ref}, {title}, {body} FROM {table}"))
+  session.execute(text("INSERT INTO search_index(search_index) VALUES ('optimize')"))
+  count = session.execute(text('SELECT count(*) FROM search_index')).scalar()
+  session.commit()
+  return count
+
+
+def match_expression(q):
+  """User input as an FTS5 query: every word must match, the last one as a prefix.
+
+  Words are quoted, so operators and punctuation in the input are never parsed.
+  """
+  words = _WORD.findall(q or '')[:10]
+  if not words:
+    return None
+  return ' '.join(f'"{w}"' for w in words[:-1]) + (' ' if len(words) > 1 else '') + f'"{words[-1]}"*'
+
+
+def highlight(snippet):
+  return Markup(str(escape(snippet)).replace(_HL_START, '<mark>').replace(_HL_END, '</mark>'))
+
+
+def result_url(kind, ref):
+  if kind == 'post':
+    return url_for('public.blog_post', slug=ref)
+  if kind == 'faq':
+    return url_for('public.resources', _anchor=f'faq-{ref}')
+  return url_for('public.testimonials')
+
+
+def search(q, kind=None, limit=20):
+  """Ranked matches: [{kind, title, url, snippet (Markup), score}], best first."""
+  limit = max(1, min(int(limit), MAX_RESULTS))
+  if kind not in SOURCES:
+    kind = None
+  if not uses_fts(db.session.get_bind()):
+    return _search_like(q, kind, limit)
+  expr = match_expression(q)
+  if expr is None:
+    return []
+  sql = (f"SELECT kind, ref, title, snippet(search_index, 3, :hl_start, :hl_end, '…', 16) AS snip, "
+         f"{RANK} AS score FROM search_index WHERE search_index MATCH :expr"
+         + (" AND kind = :kind" if kind else '') + " ORDER BY score LIMIT :limit")
+  rows = db.session.execute(text(sql), {'expr': expr, 'kind': kind, 'limit': limit,
+                                        'hl_start': _HL_START, 'hl_end': _HL_END})
+  return [{'kind': r.kind, 'title': r.title, 'url': result_url(r.kind, r.ref), 'snippet': highlight(r.snip),
+           'score': round(-r.score, 3)} for r in rows]
+
+
+def _search_like(q, kind, limit):
+  from models import BlogPost, FAQ, Testimonial
+
+  words = _WORD.findall(q or '')[:10]
+  if not words:
+    return []
+  models = {'post': (BlogPost, 'slug', 'title', 'content'), 'faq': (FAQ, 'id', 'q', 'a'),
+            'testimonial': (Testimonial, 'id', 'author', 'text')}
+  results = []
+  for k, (model, ref, title, body) in models.items():
+    if kind and k != kind:
+      continue
+    cols = (getattr(model, title), getattr(model, body))
+    query = model.query
+    for w in words:
+      query = query.filter(db.or_(*(c.ilike(f'%{w}%') for c in cols)))
+    for row in query.limit(limit):
+      snippet = (getattr(row, body) or '')[:160]
+      results.append({'kind': k, 'title': getattr(row, title), 'url': result_url(k, getattr(row, ref)),
+                      'snippet': Markup(escape(snippet)), 'score': 0})
+  return results[:limit]
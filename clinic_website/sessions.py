@@ -0,0 +1,335 @@
+"""Server-side sessions, with the logged-in principal cached in the session record.
+
+The cookie carries only a random session id; the session dict lives in a store:
+
+  memory   in-process dict with a TTL (one process only: tests, `flask run`)
+  sqlite   one SQLite file shared by every gunicorn worker on the host (default)
+  cookie   Flask's signed-cookie sessions, as before; the principal is then only
+           cached for the length of a request
+
+Next to the session dict, each record keeps the resolved principal: a snapshot of
+the logged-in patient and/or staff member (id, name, email, role), taken the first
+time a view asks for it through current_patient() / current_staff(). Every later
+request of that session gets it with the record it loads anyway, so authenticated
+pages no longer look the user up by email. A snapshot only counts while it belongs
+to the email in the session, so logging in as someone else or impersonating a
+patient re-resolves it.
+
+A commit that updates or deletes a Patient or Staff row clears the cached principal
+of every session holding that row (admin edits and deletes, a password rehash);
+their next request reads the row again, or finds it gone and drops those login
+keys from the session.
+
+Records expire SESSION_TTL seconds after their last use. A request that changes
+nothing only writes its record back once less than half of the TTL is left.
+
+Config:
+  SESSION_BACKEND       'sqlite' (default), 'memory' or 'cookie'
+  SESSION_SQLITE_PATH   file for the sqlite store (default instance/sessions.sqlite3)
+  SESSION_TTL           seconds a session lives after its last request (1 day)
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models import Patient, Staff
+
+DEFAULT_TTL = 86400
+
+# what a principal snapshot keeps of each row: enough for the templates and access checks
+PRINCIPAL_FIELDS = {'patient': ('id', 'name', 'email'), 'staff': ('id', 'name', 'email', 'role')}
+
+
+class MemorySessionStore:
+  PURGE_EVERY = 500  # saves between sweeps of expired records
+
+  def __init__(self):
+    self._records = {}  # sid -> [data, principal, patient id, staff id, expires]
+    self._lock = threading.Lock()
+    self._saves = 0
+
+  def load(self, sid):
+    """(data, principal, expires) of a live record, or None."""
+    with self._lock:
+      rec = self._records.get(sid)
+      if rec is None or rec[4] < time.time():
+        self._records.pop(sid, None)
+        return None
+      return rec[0], rec[1], rec[4]
+
+  def save(self, sid, data, expires, principal=None, owners=None):
+    """Write a record. principal/owners (patient id, staff id) are only replaced when given."""
+    with self._lock:
+      rec = self._records.setdefault(sid, [None, None, None, None, 0])
+      rec[0], rec[4] = data, expires
+      if owners is not None:
+        rec[1], (rec[2], rec[3]) = principal, owners
+      self._saves += 1
+      if self._saves % self.PURGE_EVERY == 0:
+        now = time.time()
+        for key in [k for k, r in self._records.items() if r[4] < now]:
+          del self._records[key]
+
+  def touch(self, sid, expires):
+    with self._lock:
+      if sid in self._records:
+        self._records[sid][4] = expires
+
+  def delete(self, sid):
+    with self._lock:
+      self._records.pop(sid, None)
+
+  def forget(self, kind, user_id):
+    """Drop the cached principal of every session holding patient/staff `user_id`."""
+    col = 2 if kind == 'patient' else 3
+    with self._lock:
+      for rec in self._records.values():
+        if rec[col] == user_id:
+          rec[1] = rec[2] = rec[3] = None
+
+  def clear(self):
+    with self._lock:
+      self._records.clear()
+
+
+class SQLiteSessionStore:
+  """Sessions shared between processes through one SQLite file."""
+
+  PURGE_EVERY = 500
+
+  def __init__(self, path):
+    self.path = path
+    self._local = threading.local()
+    self._saves = 0
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = self._conn()
+    conn.execute('CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT NOT NULL, principal TEXT, '
+                 'patient_id INTEGER, staff_id INTEGER, expires REAL NOT NULL)')
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_patient ON sessions (patient_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_staff ON sessions (staff_id)')
+
+  def _conn(self):
+    conn = getattr(self._local, 'conn', None)
+    if conn is None:
+      conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('PRAGMA synchronous=NORMAL')
+      self._local.conn = conn
+    return conn
+
+  def load(self, sid):
+    row = self._conn().execute('SELECT data, principal, expires FROM sessions WHERE sid = ? AND expires >= ?',
+                               (sid, time.time())).fetchone()
+    return tuple(row) if row else None
+
+  def save(self, sid, data, expires, principal=None, owners=None):
+    conn = self._conn()
+    if owners is None:
+      # leave the principal alone: it may have been invalidated since this request loaded it
+      conn.execute('INSERT INTO sessions (sid, data, expires) VALUES (?, ?, ?) '
+                   'ON CONFLICT(sid) DO UPDATE SET data = excluded.data, expires = excluded.expires',
+                   (sid, data, expires))
+    else:
+      conn.execute('INSERT OR REPLACE INTO sessions (sid, data, principal, patient_id, staff_id, expires) '
+                   'VALUES (?, ?, ?, ?, ?, ?)', (sid, data, principal, *owners, expires))
+    self._saves += 1
+    if self._saves % self.PURGE_EVERY == 0:
+      conn.execute('DELETE FROM sessions WHERE expires < ?', (time.time(),))
+
+  def touch(self, sid, expires):
+    self._conn().execute('UPDATE sessions SET expires = ? WHERE sid = ?', (expires, sid))
+
+  def delete(self, sid):
+    self._conn().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+  def forget(self, kind, user_id):
+    col = 'patient_id' if kind == 'patient' else 'staff_id'
+    self._conn().execute(f'UPDATE sessions SET principal = NULL, patient_id = NULL, staff_id = NULL '
+                         f'WHERE {col} = ?', (user_id,))
+
+  def clear(self):
+    self._conn().execute('DELETE FROM sessions')
+
+
+class ServerSession(SecureCookieSession):
+  def __init__(self, initial=None, sid=None, principal=None, expires=None):
+    super().__init__(initial)
+    self.sid = sid
+    self.expires = expires
+    self.principal = principal or {}  # 'patient' / 'staff' -> snapshot dict
+    self.principal_modified = False
+    self.stale_sid = None  # replaced by rotate(); deleted when the new record is saved
+
+
+class ServerSessionInterface(SessionInterface):
+  serializer = TaggedJSONSerializer()
+
+  def __init__(self, store, ttl=DEFAULT_TTL):
+    self.store = store
+    self.ttl = ttl
+
+  def open_session(self, app, request):
+    sid = request.cookies.get(self.get_cookie_name(app))
+    record = self.store.load(sid) if sid else None
+    if record is None:
+      return ServerSession()
+    data, principal, expires = record
+    try:
+      return ServerSession(self.serializer.loads(data), sid=sid,
+                           principal=json.loads(principal) if principal else None, expires=expires)
+    except ValueError:
+      return ServerSession()
+
+  def save_session(self, app, session, response):
+    name, domain, path = self.get_cookie_name(app), self.get_cookie_domain(app), self.get_cookie_path(app)
+    if session.accessed:
+      response.vary.add('Cookie')
+    if session.stale_sid:
+      self.store.delete(session.stale_sid)
+    if not session:
+      # emptied (logout): forget the record and the cookie
+      if session.sid and session.modified:
+        self.store.delete(session.sid)
+        response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                               samesite=self.get_cookie_samesite(app), httponly=self.get_cookie_httponly(app))
+      return
+    now = time.time()
+    expires = now + self.ttl
+    new = session.sid is None
+    if new:
+      session.sid = secrets.token_urlsafe(32)
+    elif not (session.modified or session.principal_modified):
+      if (session.expires or 0) - now < self.ttl / 2:
+        self.store.touch(session.sid, expires)
+      return
+    data = self.serializer.dumps(dict(session))
+    if session.principal_modified or new:
+      principal = session.principal
+      owners = ((principal.get('patient') or {}).get('id'), (principal.get('staff') or {}).get('id'))
+      self.store.save(session.sid, data, expires, json.dumps(principal) if any(owners) else None, owners)
+    else:
+      self.store.save(session.sid, data, expires)
+    if new:
+      response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                          httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                          secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+def init_app(app):
+  backend = app.config.get('SESSION_BACKEND', 'sqlite').lower()
+  if backend == 'cookie':
+    return
+  if backend == 'memory':
+    store = MemorySessionStore()
+  else:
+    store = SQLiteSessionStore(app.config.get('SESSION_SQLITE_PATH')
+                               or os.path.join(app.instance_path, 'sessions.sqlite3'))
+  app.session_interface = ServerSessionInterface(store, ttl=int(app.config.get('SESSION_TTL') or DEFAULT_TTL))
+
+
+def rotate():
+  """Move the session to a fresh id, keeping its contents; call on login against session fixation."""
+  if isinstance(session, ServerSession) and session.sid:
+    session.stale_sid, session.sid = session.sid, None
+    session.modified = True
+
+
+def _principal():
+  if isinstance(session, ServerSession):
+    return session.principal
+  # cookie sessions: cache for this request only
+  if 'principal' not in g:
+    g.principal = {}
+  return g.principal
+
+
+def _current(kind, model):
+  email = session.get(f'{kind}_email')
+  if not email:
+    return None
+  cached = _principal().get(kind)
+  if cached and cached.get('email') == email:
+    return cached
+  row = model.query.filter_by(email=email).first()
+  if row is None:
+    # deleted (or renamed) since this session logged in: it is not logged in as them any more
+    for key in (f'{kind}_email', f'{kind}_id', f'{kind}_role'):
+      session.pop(key, None)
+    _set_principal(kind, None)
+    return None
+  snapshot = {f: getattr(row, f) for f in PRINCIPAL_FIELDS[kind]}
+  _set_principal(kind, snapshot)
+  return snapshot
+
+
+def _set_principal(kind, snapshot):
+  principal = _principal()
+  if principal.get(kind) == snapshot:
+    return
+  if snapshot is None:
+    principal.pop(kind, None)
+  else:
+    principal[kind] = snapshot
+  if isinstance(session, ServerSession):
+    session.principal_modified = True
+
+
+def current_patient():
+  """The logged-in (or impersonated) patient as a snapshot dict, or None."""
+  return _current('patient', Patient)
+
+
+def current_staff():
+  """The logged-in staff member as a snapshot dict (with 'role'), or None."""
+  return _current('staff', Staff)
+
+
+def forget_principal(kind, user_id):
+  """Invalidate every cached principal of patient/staff `user_id`, including this request's."""
+  if has_request_context():
+    cached = _principal().get(kind)
+    if cached and cached.get('id') == user_id:
+      _set_principal(kind, None)
+  interface = current_app.session_interface if has_app_context() else None
+  if isinstance(interface, ServerSessionInterface):
+    interface.store.forget(kind, user_id)
+
+
+def watch_principals():
+  """Forget cached principals when a committed flush updated or deleted their Patient / Staff row."""
+  kinds = {Patient: 'patient', Staff: 'staff'}
+
+  def _mark(mapper, connection, target):
+    sess = object_session(target)
+    if sess is not None:
+      sess.info.setdefault('principals', set()).add((kinds[type(target)], target.id))
+
+  def _mark_update(mapper, connection, target):
+    # a backref append (Vitals(patient=p)) flushes p too, without changing any of its columns
+    if object_session(target).is_modified(target, include_collections=False):
+      _mark(mapper, connection, target)
+
+  for model in kinds:
+    event.listen(model, 'after_update', _mark_update)
+    event.listen(model, 'after_delete', _mark)
+
+  @event.listens_for(Session, 'after_commit')
+  def _after_commit(sess):
+    for kind, user_id in sorted(sess.info.pop('principals', ())):
+      forget_principal(kind, user_id)
+
+  @event.listens_for(Session, 'after_rollback')
+  def _after_rollback(sess):
+    sess.info.pop('principals', None)
+
+
+watch_principals()
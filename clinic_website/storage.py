@@ -0,0 +1,186 @@
+"""Where patient file contents live.
+
+Files are stored once per distinct content, keyed by their SHA-256; PatientFile
+rows point at a key (storage_key), so the same lab PDF uploaded for five
+patients is kept once. A blob is removed only when no row references it any
+more (see the 'storage_gc' job in tasks.py). Storing content that is already
+there refreshes the blob's modification time, and the collector leaves blobs
+modified within STORAGE_GC_DELAY alone, so an upload that reuses a blob before
+its row commits never loses it.
+
+Backends share one small interface:
+
+  staging_path()        a local temp path to stream an upload into
+  put_file(path, key)   move a staged file into the store (only touch it if the key exists)
+  modified_at(key)      epoch seconds of the last put_file for key, or None if absent
+  open(key)             binary file object for reading
+  local_path(key)       filesystem path if the blob is on local disk, else None
+  download_url(key, filename)   short-lived direct URL for remote stores
+  exists(key) / delete(key)
+
+  LocalCASStorage  <root>/ab/cd/abcd... on local disk (default)
+  S3Storage        any S3-compatible API via boto3, so several app nodes share files
+
+Config (env):
+  STORAGE_BACKEND     'local' (default) or 's3'
+  STORAGE_ROOT        root of the local store (default instance/blobs)
+  S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL   for the s3 backend
+"""
+import os
+import re
+import tempfile
+import uuid
+from urllib.parse import quote
+
+_KEY = re.compile(r'^[0-9a-f]{64}$')
+
+
+def check_key(key):
+  # keys end up in paths and object names; only accept hex digests
+  if not _KEY.match(key or ''):
+    raise ValueError(f'invalid storage key: {key!r}')
+  return key
+
+
+class Storage:
+  def __init__(self, staging_dir=None):
+    self.staging_dir = staging_dir or tempfile.gettempdir()
+
+  def staging_path(self):
+    os.makedirs(self.staging_dir, exist_ok=True)
+    return os.path.join(self.staging_dir, f'upload-{uuid.uuid4().hex}.part')
+
+  def local_path(self, key):
+    return None
+
+  def download_url(self, key, filename, expires=300):
+    raise NotImplementedError
+
+  def put_file(self, path, key):
+    raise NotImplementedError
+
+  def modified_at(self, key):
+    raise NotImplementedError
+
+  def open(self, key):
+    raise NotImplementedError
+
+  def exists(self, key):
+    raise NotImplementedError
+
+  def delete(self, key):
+    raise NotImplementedError
+
+
+class LocalCASStorage(Storage):
+  def __init__(self, root):
+    # staging lives under the root so put_file() is an atomic rename on the same filesystem
+    super().__init__(os.path.join(root, 'tmp'))
+    self.root = root
+
+  def path(self, key):
+    check_key(key)
+    return os.path.join(self.root, key[:2], key[2:4], key)
+
+  def local_path(self, key):
+    return self.path(key)
+
+  def put_file(self, path, key):
+    dest = self.path(key)
+    try:
+      os.utime(dest)  # already stored: it counts as just stored, for storage_gc
+    except FileNotFoundError:
+      pass
+    else:
+      os.remove(path)  # and the duplicate upload costs no space
+      return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(path, dest)
+    return True
+
+  def modified_at(self, key):
+    try:
+      return os.path.getmtime(self.path(key))
+    except FileNotFoundError:
+      return None
+
+  def open(self, key):
+    return open(self.path(key), 'rb')
+
+  def exists(self, key):
+    return os.path.exists(self.path(key))
+
+  def delete(self, key):
+    try:
+      os.remove(self.path(key))
+    except FileNotFoundError:
+      pass
+
+
+class S3Storage(Storage):
+  """Blobs in an S3-compatible bucket. `client` defaults to a boto3 S3 client."""
+
+  def __init__(self, bucket, prefix='', client=None, endpoint_url=None, staging_dir=None):
+    super().__init__(staging_dir)
+    self.bucket = bucket
+    self.prefix = prefix
+    if client is None:
+      import boto3  # optional dependency, only needed for this backend
+      client = boto3.client('s3', endpoint_url=endpoint_url)
+    self.client = client
+
+  def object_name(self, key):
+    check_key(key)
+    return f'{self.prefix}{key[:2]}/{key}'
+
+  def exists(self, key):
+    try:
+      self.client.head_object(Bucket=self.bucket, Key=self.object_name(key))
+      return True
+    except Exception as e:
+      code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+      if code in ('404', 'NoSuchKey', 'NotFound'):
+        return False
+      raise
+
+  def put_file(self, path, key):
+    try:
+      if self.exists(key):
+        # copy the object onto itself to refresh LastModified, for storage_gc
+        name = self.object_name(key)
+        self.client.copy_object(Bucket=self.bucket, Key=name, CopySource={'Bucket': self.bucket, 'Key': name},
+                                MetadataDirective='REPLACE')
+        return False
+      self.client.upload_file(path, self.bucket, self.object_name(key))
+      return True
+    finally:
+      os.remove(path)
+
+  def modified_at(self, key):
+    try:
+      return self.client.head_object(Bucket=self.bucket, Key=self.object_name(key))['LastModified'].timestamp()
+    except Exception as e:
+      code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+      if code in ('404', 'NoSuchKey', 'NotFound'):
+        return None
+      raise
+
+  def open(self, key):
+    return self.client.get_object(Bucket=self.bucket, Key=self.object_name(key))['Body']
+
+  def download_url(self, key, filename, expires=300):
+    # presigned GET: the bytes go from the bucket to the browser, not through a worker
+    disposition = "attachment; filename*=UTF-8''" + quote(filename)
+    return self.client.generate_presigned_url(
+      'get_object', ExpiresIn=expires,
+      Params={'Bucket': self.bucket, 'Key': self.object_name(key), 'ResponseContentDisposition': disposition})
+
+  def delete(self, key):
+    self.client.delete_object(Bucket=self.bucket, Key=self.object_name(key))
+
+
+def from_env(env=os.environ, instance_path='instance'):
+  if env.get('STORAGE_BACKEND', 'local').lower() == 's3':
+    return S3Storage(env['S3_BUCKET'], prefix=env.get('S3_PREFIX', ''), endpoint_url=env.get('S3_ENDPOINT_URL'))
+  return LocalCASStorage(env.get('STORAGE_ROOT') or os.path.join(instance_path, 'blobs'))
+
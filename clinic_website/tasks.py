@@ -0,0 +1,135 @@
+"""Background job handlers; registered on extensions.jobs when create_app() imports this module."""
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+import previews
+import reminders
+from extensions import audit, db, file_store, jobs
+from mailer import Mailer
+from models import PatientFile, UploadSession
+from uploads import SNIFF_BYTES, UPLOAD_CHUNK_BYTES, copy_upload, discard_partial, file_ext, open_patient_file
+
+
+def send_alert(subject, body):
+  # Queue an alert to ALERT_EMAIL; delivered by the 'email' job. No-op without SMTP settings.
+  to = os.environ.get('ALERT_EMAIL')
+  if not os.environ.get('SMTP_HOST') or not to:
+    return False
+  jobs.enqueue('email', {'to': to, 'subject': subject, 'body': body})
+  return True
+
+
+@jobs.register('email', batch_size=50)
+def deliver_email(payloads):
+  # every due message goes out over one SMTP connection; failures are retried with backoff
+  mailer = Mailer.from_env()
+  if mailer is None:
+    return [None] * len(payloads)
+  return mailer.send_many([mailer.build(p['to'], p['subject'], p['body']) for p in payloads])
+
+
+@jobs.register('schedule_reminders', every=reminders.SCAN_SECONDS)
+def schedule_reminders(payload):
+  # reminders are email only; without SMTP settings there is nothing to schedule
+  if Mailer.from_env() is not None:
+    reminders.scan()
+
+
+@jobs.register('reminder', batch_size=reminders.BATCH_SIZE, max_attempts=reminders.MAX_ATTEMPTS)
+def deliver_reminders(payloads):
+  # due reminders go out together over one SMTP connection, like 'email'
+  return reminders.deliver([p['id'] for p in payloads], Mailer.from_env())
+
+
+@jobs.register('make_preview', max_attempts=3)
+def make_preview(payload):
+  pf = db.session.get(PatientFile, payload['file_id'])
+  if pf is None or pf.preview_key:
+    return
+  # decoders want a seekable file; remote bodies are spooled to disk past 1 MB
+  with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+    with open_patient_file(pf) as fh:
+      shutil.copyfileobj(fh, spool, UPLOAD_CHUNK_BYTES)
+    spool.seek(0)
+    result = previews.make_preview(spool, file_ext(pf.original_name))
+  if result is None:
+    return
+  data, meta = result
+  staged = file_store.staging_path()
+  size, key = copy_upload(io.BytesIO(data), staged, limit=len(data))
+  file_store.put_file(staged, key)
+  pf.preview_key = key
+  pf.preview_meta = json.dumps(meta)
+  db.session.commit()
+
+
+@jobs.register('storage_gc')
+def storage_gc(payload):
+  # a blob is kept while any PatientFile row still references it, as content or as preview
+  keys = payload['keys']
+  referenced = set(db.session.execute(select(PatientFile.storage_key)
+                                      .where(PatientFile.storage_key.in_(keys))).scalars())
+  referenced |= set(db.session.execute(select(PatientFile.preview_key)
+                                       .where(PatientFile.preview_key.in_(keys))).scalars())
+  delay = current_app.config['STORAGE_GC_DELAY']
+  recent = []
+  for key in keys:
+    if key in referenced:
+      continue
+    modified = file_store.modified_at(key)
+    if modified is None:
+      continue
+    if modified > time.time() - delay:
+      # stored again since it was released: its new row may not have committed yet
+      recent.append(key)
+    else:
+      file_store.delete(key)
+  if recent:
+    jobs.enqueue('storage_gc', {'keys': recent}, delay=delay, commit=False)
+
+
+@jobs.register('sniff_upload', max_attempts=3)
+def sniff_upload(payload):
+  # stronger MIME detection with python-magic, off the request path
+  try:
+    import magic as filemagic  # optional; loading libmagic is only worth it on a job worker
+  except Exception:
+    return
+  pf = db.session.get(PatientFile, payload['file_id'])
+  if pf is None:
+    return
+  fh = open_patient_file(pf)
+  try:
+    mimetype = filemagic.from_buffer(fh.read(SNIFF_BYTES), mime=True)
+  finally:
+    fh.close()
+  ext = file_ext(pf.original_name)
+  # if extension says image/pdf but detected mime differs, mark suspicious
+  suspicious = ((ext in ('jpg', 'jpeg', 'png') and not mimetype.startswith('image/'))
+                or (ext == 'pdf' and mimetype != 'application/pdf'))
+  actor = payload.get('actor', 'system')
+  audit.record('system', f"Sniffed file {pf.original_name} for patient {pf.patient_id} "
+                         f"(mimetype={mimetype}){' [SUSPICIOUS]' if suspicious else ''}")
+  if suspicious:
+    send_alert('Suspicious upload detected',
+               f"Staff {actor} uploaded suspicious file {pf.original_name} for patient {pf.patient_id} (mimetype={mimetype})")
+
+
+@jobs.register('expire_uploads', every=3600)
+def expire_uploads(payload):
+  # abandoned resumable uploads: drop the session rows and their partial files
+  stale = db.session.execute(select(UploadSession.id)
+                             .where(UploadSession.expires_at < datetime.utcnow())).scalars().all()
+  if stale:
+    db.session.execute(delete(UploadSession).where(UploadSession.id.in_(stale)))
+    db.session.commit()
+  for upload_id in stale:
+    discard_partial(upload_id)
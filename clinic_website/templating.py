@@ -0,0 +1,103 @@
+"""Template compilation cache, warm-up and render timing.
+
+Jinja compiles a template to Python on first use, per process, and every page
+pulls in base.html through {% extends %}. Three things keep that off the
+request path:
+
+  bytecode cache   compiled templates are written to TEMPLATE_CACHE_DIR and
+                   loaded back with marshal by every later process (entries are
+                   keyed by the template source, so an edited template is simply
+                   recompiled)
+  warm-up          with TEMPLATE_WARMUP, create_app() loads every template, so a
+                   worker (or the gunicorn master with --preload) has them all in
+                   memory before its first request
+  precompile       `flask precompile-templates` fills the bytecode cache at deploy
+                   time and prints each template's compile time
+
+Every render is timed through Flask's template signals; renders slower than
+TEMPLATE_SLOW_MS are logged, and per-template counts/mean/max are served at
+/admin/template-stats.
+
+Config:
+  TEMPLATE_CACHE_DIR   bytecode cache directory (default instance/jinja-cache; '' disables)
+  TEMPLATE_WARMUP      load every template at startup (on)
+  TEMPLATE_SLOW_MS     log renders slower than this (100)
+"""
+import os
+import threading
+import time
+
+from flask import before_render_template, g, template_rendered
+from jinja2 import FileSystemBytecodeCache
+
+
+class RenderStats:
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._stats = {}
+
+  def add(self, name, ms):
+    with self._lock:
+      s = self._stats.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+      s['count'] += 1
+      s['total_ms'] += ms
+      s['max_ms'] = max(s['max_ms'], ms)
+
+  def snapshot(self):
+    """{template: {count, mean_ms, max_ms}}, slowest mean first."""
+    with self._lock:
+      rows = {name: {'count': s['count'], 'mean_ms': round(s['total_ms'] / s['count'], 2),
+                     'max_ms': round(s['max_ms'], 2)} for name, s in self._stats.items()}
+    return dict(sorted(rows.items(), key=lambda kv: -kv[1]['mean_ms']))
+
+
+def template_names(app):
+  return sorted(n for n in app.jinja_env.list_templates() if n.endswith('.html'))
+
+
+def compile_all(app):
+  """Load (compile, or read from the bytecode cache) every template. Returns {name: ms}."""
+  timings = {}
+  for name in template_names(app):
+    start = time.perf_counter()
+    app.jinja_env.get_template(name)
+    timings[name] = (time.perf_counter() - start) * 1000
+  return timings
+
+
+def init_templates(app):
+  cache_dir = app.config['TEMPLATE_CACHE_DIR']
+  if cache_dir is None:
+    cache_dir = os.path.join(app.instance_path, 'jinja-cache')
+  if cache_dir:
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+  stats = app.extensions['template_stats'] = RenderStats()
+
+  def _started(sender, template, context, **extra):
+    g.setdefault('_template_starts', []).append(time.perf_counter())
+
+  def _rendered(sender, template, context, **extra):
+    starts = g.get('_template_starts')
+    if not starts:
+      return
+    ms = (time.perf_counter() - starts.pop()) * 1000
+    stats.add(template.name, ms)
+    if ms > app.config['TEMPLATE_SLOW_MS']:
+      app.logger.warning('slow template %s: %.1f ms', template.name, ms)
+
+  # connected per app (sender=app); the signals hold the receivers weakly, so keep them on the app
+  before_render_template.connect(_started, app)
+  template_rendered.connect(_rendered, app)
+  app.extensions['template_timers'] = (_started, _rendered)
+
+  @app.cli.command('precompile-templates')
+  def precompile_templates_command():
+    """Compile every template into the bytecode cache and report compile times."""
+    for name, ms in compile_all(app).items():
+      print(f'{ms:8.1f} ms  {name}')
+    print(f'cache: {cache_dir or "disabled"}')
+
+  if app.config['TEMPLATE_WARMUP']:
+    compile_all(app)
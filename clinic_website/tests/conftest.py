@@ -0,0 +1,88 @@
+import socketserver
+import tempfile
+import threading
+
+import pytest
+
+from clinic_app import create_app
+
+
+@pytest.fixture(scope='session')
+def app():
+    """One app for the whole suite, configured here rather than through os.environ."""
+    return create_app({
+        'TESTING': True,
+        # never let the suite touch instance/clinic_full.db
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        # background jobs run inline at enqueue time; worker threads would each get
+        # their own empty :memory: database
+        'JOBS_EAGER': True,
+        # audit entries are written before each response rather than by a background flusher
+        'AUDIT_MODE': 'sync',
+        # uploaded blobs go to a throwaway directory, not instance/blobs
+        'STORAGE_ROOT': tempfile.mkdtemp(prefix='clinic-blobs-'),
+        'CACHE_BACKEND': 'local',
+        # the suite logs in far more often than a person would; tests/test_login_limits.py turns it on
+        'RATELIMIT_ENABLED': False,
+        'RATELIMIT_BACKEND': 'local',
+        # sessions in this process rather than in instance/sessions.sqlite3
+        'SESSION_BACKEND': 'memory',
+        'TEMPLATE_CACHE_DIR': tempfile.mkdtemp(prefix='clinic-jinja-'),
+    })
+
+
+@pytest.fixture
+def file_store(app):
+    """The suite app's storage backend (extensions.file_store needs an app context)."""
+    return app.extensions['file_store']
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of RFC 5321 for smtplib.send_message()."""
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.wfile.write(b'220 localhost test SMTP\r\n')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode().strip().upper()
+            if cmd.startswith(('EHLO', 'HELO')):
+                self.wfile.write(b'250 localhost\r\n')
+            elif cmd.startswith('RCPT') and any(r in cmd for r in server.refuse):
+                self.wfile.write(b'550 no such user\r\n')
+            elif cmd == 'DATA':
+                self.wfile.write(b'354 go ahead\r\n')
+                body = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b'.\r\n', b''):
+                        break
+                    body.append(chunk)
+                server.messages.append(b''.join(body).decode())
+                self.wfile.write(b'250 queued\r\n')
+            elif cmd == 'QUIT':
+                self.wfile.write(b'221 bye\r\n')
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self.wfile.write(b'250 ok\r\n')
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """A local SMTP server on a free port; SMTP_* env vars point at it."""
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    server.refuse = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('SMTP_HOST', '127.0.0.1')
+    monkeypatch.setenv('SMTP_PORT', str(server.server_address[1]))
+    monkeypatch.setenv('SMTP_STARTTLS', '0')
+    monkeypatch.setenv('ALERT_EMAIL', 'admin@example.com')
+    yield server
+    server.shutdown()
+    server.server_close()
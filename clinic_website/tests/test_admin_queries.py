@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+from clinic_app import db, Appointment, Patient, Staff
+from query_guard import TooManyQueries, count_queries
+
+
+@pytest.fixture
+def admin_client(app):
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            for i in range(60):
+                p = Patient(name=f'Patient {i}', email=f'p{i}@example.com')
+                db.session.add(p)
+                db.session.add(Appointment(patient=p, date=datetime(2024, 5, 1) + timedelta(hours=i)))
+            db.session.commit()
+        with client.session_transaction() as sess:
+            sess['is_admin'] = True
+        yield client
+
+
+def test_admin_dashboard_has_no_n_plus_one(admin_client, monkeypatch, app):
+    # the view's own @query_budget is small enough that one lazy load per appointment would trip the guard,
+    # and it wins over the app-wide setting
+    monkeypatch.setitem(app.config, 'QUERY_GUARD_MAX', 1000)
+    rv = admin_client.get('/admin')
+    assert rv.status_code == 200
+    assert b'Patient 0' in rv.data and b'Page 1 of 2' in rv.data
+
+
+def test_admin_lists_are_paginated(admin_client):
+    rv = admin_client.get('/admin/patients?per_page=10&page=6')
+    assert rv.status_code == 200
+    assert rv.data.count(b'<td class="py-2">Patient ') == 10
+    assert b'Page 6 of 6' in rv.data
+    rv = admin_client.get('/admin/patients?per_page=100000')
+    assert rv.data.count(b'<td class="py-2">Patient ') == 60
+
+
+def test_staff_dashboard_stays_within_its_budget(admin_client, monkeypatch, app):
+    monkeypatch.setitem(app.config, 'QUERY_GUARD_MAX', 1)
+    with app.app_context():
+        db.session.add(Staff(name='S', email='s@example.com', role='doctor'))
+        db.session.commit()
+    with admin_client.session_transaction() as sess:
+        sess.update(staff_email='s@example.com', staff_id=1)
+    for _ in range(2):  # a cold session resolves the staff member, a warm one does not
+        rv = admin_client.get('/staff')
+        assert rv.status_code == 200 and b'Patient 59' in rv.data
+
+
+def test_guard_fails_requests_over_budget(admin_client, monkeypatch, app):
+    monkeypatch.setitem(app.config, 'QUERY_GUARD_MAX', 1)
+    with pytest.raises(TooManyQueries):
+        admin_client.get('/admin/patients')
+
+
+def test_count_queries_outside_requests(admin_client, app):
+    with app.app_context():
+        with count_queries() as stmts:
+            Patient.query.count()
+        assert len(stmts) == 1
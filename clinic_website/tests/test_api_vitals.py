@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+from clinic_app import db, Patient, Vitals
+
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            patient = Patient(name='P', email='p@example.com')
+            db.session.add(patient)
+            db.session.commit()
+            base = datetime(2024, 1, 1)
+            # two readings share a timestamp so the cursor has to break ties on id
+            stamps = [base + timedelta(hours=i) for i in range(9)] + [base + timedelta(hours=8)]
+            for i, ts in enumerate(stamps):
+                db.session.add(Vitals(patient_id=patient.id, systolic=120 + i, diastolic=80, glucose=100.0 + i, measured_at=ts))
+            db.session.commit()
+        with client.session_transaction() as sess:
+            sess['patient_email'] = 'p@example.com'
+        yield client
+
+
+def test_cursor_pages_cover_every_row_once(client):
+    seen = []
+    url = '/api/vitals/1?limit=3'
+    while url:
+        rv = client.get(url)
+        assert rv.status_code == 200
+        seen.extend(r['id'] for r in rv.get_json())
+        cursor = rv.headers.get('X-Next-Cursor')
+        url = f'/api/vitals/1?limit=3&cursor={cursor}' if cursor else None
+    assert seen == list(range(1, 11))
+
+
+def test_since_until_and_columnar(client):
+    rv = client.get('/api/vitals/1?format=columnar&since=2024-01-01T02:00:00&until=2024-01-01T05:00:00')
+    data = rv.get_json()
+    assert data['measured_at'] == ['2024-01-01T02:00:00', '2024-01-01T03:00:00', '2024-01-01T04:00:00']
+    assert data['systolic'] == [122, 123, 124]
+    assert data['next_cursor'] is None
+
+
+def test_bad_arguments_are_rejected(client):
+    assert client.get('/api/vitals/1?since=yesterday').status_code == 400
+    assert client.get('/api/vitals/1?cursor=!!!').status_code == 400
+    assert client.get('/api/vitals/1?format=xml').status_code == 400
+
+
+@pytest.mark.parametrize('points', ['-5', '0'])
+def test_chart_points_below_one_are_clamped(client, points):
+    rv = client.get(f'/api/vitals/1?resolution=day&points={points}')
+    assert rv.status_code == 200
+    assert rv.get_json()['bucket_start'] == ['2024-01-01T00:00:00']  # all ten readings fall on one day
+
+
+def test_only_the_patient_or_staff_may_read_vitals(client, app):
+    with app.app_context():
+        db.session.add(Patient(name='Q', email='q@example.com'))
+        db.session.commit()
+    assert client.get('/api/vitals/2').status_code == 403
+    with client.session_transaction() as sess:
+        sess.clear()
+    assert client.get('/api/vitals/1').status_code == 403
+    with client.session_transaction() as sess:
+        sess['staff_email'] = 'staff@example.com'
+    assert client.get('/api/vitals/1').status_code == 200
@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in a fresh interpreter: the suite's own imports would hide what `import clinic_app` pulls in
+PROBE = """
+import json, os, sys
+import clinic_app
+loaded = sorted(m for m in ('flask_migrate', 'alembic', 'smtplib', 'imghdr', 'magic', 'PIL', 'pandas', 'numpy')
+                if m in sys.modules)
+app = clinic_app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.environ['PROBE_DB'], 'SECRET_KEY': 'a'})
+other = clinic_app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'AUTO_CREATE_SCHEMA': True, 'SECRET_KEY': 'b'})
+with other.app_context():
+  created = sorted(clinic_app.db.inspect(clinic_app.db.engine).get_table_names())
+print(json.dumps({'loaded': loaded, 'db_exists': os.path.exists(os.environ['PROBE_DB']),
+                  'secrets': [app.config['SECRET_KEY'], other.config['SECRET_KEY']],
+                  'created': 'patient' in created, 'default_app_built': 'app' in vars(clinic_app)}))
+"""
+
+
+def test_import_is_cheap_and_apps_are_independent(tmp_path):
+    env = dict(os.environ, PROBE_DB=str(tmp_path / 'probe.db'), TEMPLATE_CACHE_DIR='')
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    assert result['loaded'] == []
+    assert result['db_exists'] is False  # no schema work unless asked for
+    assert result['created'] is True
+    assert result['secrets'] == ['a', 'b']
+    assert result['default_app_built'] is False
+
+
+def test_each_app_keeps_its_own_extension_state(app, tmp_path):
+    from clinic_app import audit, content_cache, create_app, jobs, limiter
+    other = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'AUTO_CREATE_SCHEMA': True, 'AUDIT_MODE': 'sync',
+                        'CACHE_BACKEND': 'sqlite', 'CACHE_SQLITE_PATH': str(tmp_path / 'cache.sqlite3'),
+                        'RATELIMIT_BACKEND': 'local', 'SESSION_BACKEND': 'memory',
+                        'STORAGE_ROOT': str(tmp_path / 'blobs'), 'TEMPLATE_CACHE_DIR': ''})
+    for key in ('jobs', 'audit', 'content_cache', 'ratelimit'):
+        assert app.extensions[key] is not other.extensions[key]
+    # building `other` left the suite app's queue, buffer, cache and buckets where they were
+    with app.app_context():
+        assert app.extensions['jobs'].app is app and app.extensions['jobs'].db is other.extensions['jobs'].db
+        assert content_cache.stats()['backend'] == 'LocalCache'
+        audit.record('tester', 'only in the suite app')
+        assert audit.pending() == 1
+        limiter.store.take('k', 1, 1)
+    with other.app_context():
+        assert content_cache.stats()['backend'] == 'SQLiteCache'
+        assert audit.pending() == 0
+        assert limiter.store.take('k', 1, 1) == 0
+        assert jobs.run_pending() == 0  # its own tables, not the suite's
+    with app.app_context():
+        audit.flush()
@@ -0,0 +1,81 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import assets
+
+
+@pytest.fixture
+def built(tmp_path):
+    """A source tree with every entry present, built into tmp_path/dist."""
+    root = tmp_path / 'src'
+    for name, sources in assets.ENTRIES.items():
+        for src in sources:
+            path = root / src
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if not path.exists():
+                path.write_bytes(b'/* %s */ body { color: red ; }\n' % src.encode() * 40)
+    (root / 'assets' / 'fonts.css').write_text(
+        "/* fonts */\n@font-face { font-family: Inter; src: url('../fonts/inter-latin-400-normal.woff2') }\n")
+    out = tmp_path / 'dist'
+    return str(root), str(out), assets.build(str(root), str(out))
+
+
+def test_build_fingerprints_minifies_and_precompresses(built):
+    root, out, manifest = built
+    assert set(manifest) == set(assets.ENTRIES)
+    with open(os.path.join(out, assets.MANIFEST)) as f:
+        assert json.load(f) == manifest
+
+    css_name = manifest['css/app.css']
+    assert css_name.startswith('css/app.') and css_name.endswith('.css')
+    with open(os.path.join(out, css_name)) as f:
+        css = f.read()
+    assert '/*' not in css and 'color:red' in css
+    # the font url points at the fingerprinted file, relative to the bundle
+    font = manifest['fonts/inter-latin-400-normal.woff2']
+    assert f"url(../{font})" in css
+    with open(os.path.join(out, css_name + '.gz'), 'rb') as f:
+        assert gzip.decompress(f.read()).decode() == css
+    assert not os.path.exists(os.path.join(out, font + '.gz'))
+
+    # same sources, same names
+    assert assets.build(root, out) == manifest
+
+
+def test_missing_source_names_the_file(tmp_path):
+    with pytest.raises(assets.MissingSource, match='chart.umd.js'):
+        assets.build(str(tmp_path), entries={'js/chart.js': assets.ENTRIES['js/chart.js']})
+
+
+def test_built_assets_are_immutable_and_precompressed(app, built, monkeypatch):
+    root, out, manifest = built
+    monkeypatch.setitem(app.extensions, 'assets', assets.Assets(root, out))
+    client = app.test_client()
+    page = client.get('/admin/login').get_data(as_text=True)
+    css_url = '/static/dist/' + manifest['css/app.css']
+    assert css_url in page and 'cdn.tailwindcss.com' not in page
+
+    rv = client.get(css_url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert rv.status_code == 200
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert rv.headers['Content-Type'].startswith('text/css')
+    assert 'immutable' in rv.headers['Cache-Control']
+    assert 'Accept-Encoding' in rv.headers['Vary']
+    assert b'color:red' in gzip.decompress(rv.data)
+
+    rv = client.get(css_url)
+    assert 'Content-Encoding' not in rv.headers and b'color:red' in rv.data
+    assert client.get('/static/dist/css/app.0000000000.css').status_code == 404
+
+
+def test_unbuilt_assets_are_served_from_source(app, tmp_path, monkeypatch):
+    (tmp_path / 'static' / 'js').mkdir(parents=True)
+    (tmp_path / 'static' / 'js' / 'site.js').write_text('console.log(1)')
+    monkeypatch.setitem(app.extensions, 'assets', assets.Assets(str(tmp_path)))
+    client = app.test_client()
+    assert '/static/dist/js/site.js' in client.get('/admin/login').get_data(as_text=True)
+    rv = client.get('/static/dist/js/site.js')
+    assert rv.data == b'console.log(1)' and rv.headers['Cache-Control'] == 'no-cache'
@@ -0,0 +1,66 @@
+import pytest
+from clinic_app import db, audit, AuditLog, Patient, PatientFile, Staff, generate_password_hash
+from query_guard import count_queries
+
+
+@pytest.fixture
+def staff_client(app):
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            p = Patient(name='P', email='p@example.com')
+            db.session.add_all([p, Staff(name='S', email='s@example.com', role='staff',
+                                         password_hash=generate_password_hash('pw')),
+                                PatientFile(patient=p, filename='x_report.txt', original_name='report.txt')])
+            db.session.commit()
+        with client.session_transaction() as sess:
+            sess['staff_email'] = 's@example.com'
+            sess['is_admin'] = True
+        yield client
+    app.extensions['audit'].flush()
+
+
+def audit_actions(app):
+    with app.app_context():
+        return [a.action for a in AuditLog.query.order_by(AuditLog.id)]
+
+
+def test_buffered_entries_are_written_in_one_batch(staff_client, monkeypatch, app):
+    monkeypatch.setitem(app.config, 'AUDIT_MODE', 'buffered')
+    monkeypatch.setitem(app.config, 'AUDIT_FLUSH_SECONDS', 3600)
+    for _ in range(3):
+        assert staff_client.get('/staff/file-token/1').status_code == 200
+    assert audit_actions(app) == []
+    assert app.extensions['audit'].pending() == 3
+    with count_queries() as stmts:
+        assert app.extensions['audit'].flush() == 3
+    assert len([s for s in stmts if s.startswith('INSERT')]) == 1
+    assert audit_actions(app) == ['Generated download token for file 1'] * 3
+
+
+def test_batch_size_triggers_flush_at_teardown(staff_client, monkeypatch, app):
+    monkeypatch.setitem(app.config, 'AUDIT_MODE', 'buffered')
+    monkeypatch.setitem(app.config, 'AUDIT_FLUSH_SECONDS', 3600)
+    monkeypatch.setitem(app.config, 'AUDIT_BATCH_SIZE', 2)
+    staff_client.get('/staff/file-token/1')
+    assert app.extensions['audit'].pending() == 1
+    staff_client.get('/staff/file-token/1')
+    assert app.extensions['audit'].pending() == 0
+    assert len(audit_actions(app)) == 2
+
+
+def test_sync_mode_writes_before_the_response(staff_client, app):
+    staff_client.get('/staff/file-token/1')
+    assert app.extensions['audit'].pending() == 0
+    assert audit_actions(app) == ['Generated download token for file 1']
+
+
+def test_critical_entries_commit_with_the_change(staff_client, app):
+    rv = staff_client.post('/admin/patient/edit/1', data={'name': 'Q', 'email': 'q@example.com', 'phone': ''})
+    assert rv.status_code == 302
+    assert audit_actions(app) == ['Edited patient 1 by admin']
+    with app.app_context():
+        audit.record('admin', 'never happened', critical=True)
+        db.session.rollback()
+    assert audit_actions(app) == ['Edited patient 1 by admin']
@@ -0,0 +1,113 @@
+import gzip
+import zlib
+
+from compression import Compressor, accepted_encoding
+
+
+def wsgi_app(chunks, content_type='text/plain', extra_headers=(), progress=None):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', content_type), *extra_headers])
+        for chunk in chunks:
+            if progress is not None:
+                progress.append(chunk)
+            yield chunk
+    return app
+
+
+def call(app, accept='gzip'):
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured['status'], captured['headers'] = status, dict(headers)
+
+    # headers are only sent once the body is iterated
+    return captured, app({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept}, start_response)
+
+
+def test_accept_encoding_negotiation():
+    assert accepted_encoding('gzip, deflate, br', have_brotli=True) == 'br'
+    assert accepted_encoding('gzip, deflate, br', have_brotli=False) == 'gzip'
+    assert accepted_encoding('gzip;q=0, br', have_brotli=False) is None
+    assert accepted_encoding('*', have_brotli=False) == 'gzip'
+    assert accepted_encoding('', have_brotli=True) is None
+
+
+def test_streamed_body_is_compressed_chunk_by_chunk():
+    rows = [b'2024-03-01,120,80,95.5,note\n' * 50 for _ in range(5)]
+    progress = []
+    captured, body = call(Compressor(wsgi_app(rows, 'text/csv', progress=progress), min_size=100))
+    body = iter(body)
+    first = next(body)
+    assert captured['headers']['Content-Encoding'] == 'gzip'
+    assert captured['headers']['Vary'] == 'Accept-Encoding'
+    assert 'Content-Length' not in captured['headers']
+    # the first compressed chunk goes out before the app has produced the rest
+    assert len(progress) == 1
+    d = zlib.decompressobj(31)
+    assert d.decompress(first) == rows[0]
+    assert gzip.decompress(first + b''.join(body)) == b''.join(rows)
+
+
+def test_small_and_ineligible_bodies_pass_through():
+    captured, body = call(Compressor(wsgi_app([b'{"ok": true}'], 'application/json'), min_size=500))
+    assert b''.join(body) == b'{"ok": true}' and 'Content-Encoding' not in captured['headers']
+
+    png = [b'\x89PNG' * 500]
+    captured, body = call(Compressor(wsgi_app(png, 'image/png'), min_size=10))
+    assert b''.join(body) == png[0] and 'Content-Encoding' not in captured['headers']
+
+    pre = [b'x' * 1000]
+    app = wsgi_app(pre, 'text/css', extra_headers=[('Content-Encoding', 'br')])
+    captured, body = call(Compressor(app, min_size=10))
+    assert b''.join(body) == pre[0] and captured['headers']['Content-Encoding'] == 'br'
+
+    captured, body = call(Compressor(wsgi_app([b'x' * 1000]), min_size=10), accept='identity')
+    b''.join(body)
+    assert 'Content-Encoding' not in captured['headers']
+
+
+def test_pages_are_gzipped(app):
+    client = app.test_client()
+    plain = client.get('/admin/login')
+    rv = client.get('/admin/login', headers={'Accept-Encoding': 'gzip'})
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in rv.headers['Vary']
+    assert gzip.decompress(rv.data) == plain.data
+
+
+def test_static_files_use_precompressed_siblings(app, tmp_path, monkeypatch):
+    css = b'body{color:red}' * 100
+    (tmp_path / 'site.css').write_bytes(css)
+    (tmp_path / 'site.css.gz').write_bytes(gzip.compress(css))
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    client = app.test_client()
+    rv = client.get('/static/site.css', headers={'Accept-Encoding': 'gzip'})
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert rv.headers['Content-Type'].startswith('text/css')
+    assert gzip.decompress(rv.data) == css
+    assert client.get('/static/site.css').data == css
+
+
+def test_downloads_and_file_wrappers_pass_through():
+    body = [b'a' * 2000]
+    for headers in ([('Accept-Ranges', 'bytes')], [('Content-Range', 'bytes 0-1999/4000')]):
+        captured, out = call(Compressor(wsgi_app(body, extra_headers=headers), min_size=100))
+        assert b''.join(out) == body[0] and 'Content-Encoding' not in captured['headers']
+
+    class Wrapper:
+        def __init__(self, f, size=8192):
+            self.f = f
+
+        def __iter__(self):
+            return iter([self.f])
+
+    def file_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return environ['wsgi.file_wrapper'](b'a' * 2000)
+
+    captured = {}
+    wrapped = Compressor(file_app, min_size=100)(
+        {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip', 'wsgi.file_wrapper': Wrapper},
+        lambda status, headers, exc_info=None: captured.update(headers=dict(headers)))
+    assert isinstance(wrapped, Wrapper)  # the same object, so the server can still sendfile() it
+    assert 'Content-Encoding' not in captured['headers']
@@ -0,0 +1,70 @@
+import pytest
+import caching
+from clinic_app import db, FAQ, Testimonial
+from query_guard import count_queries
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([FAQ(q='What should I bring?', a='Your logs.'),
+                            Testimonial(author='Jane Doe', text='Great care', featured=True)])
+        db.session.commit()
+    app.extensions['content_cache'].backend.clear()
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.mark.parametrize('path', ['/', '/resources', '/blog', '/testimonials'])
+def test_warm_public_pages_skip_the_database(client, path):
+    client.get(path)
+    with count_queries() as stmts:
+        rv = client.get(path)
+    assert rv.status_code == 200
+    assert stmts == []
+
+
+def test_commit_invalidates_and_rollback_does_not(client, app):
+    assert b'Your logs.' in client.get('/resources').data
+    with app.app_context():
+        db.session.add(FAQ(q='Telehealth?', a='Yes, by video.'))
+        db.session.rollback()
+    assert b'by video' not in client.get('/resources').data
+    cache = app.extensions['content_cache']
+    hits = cache.stats()['hits']
+    with app.app_context():
+        db.session.add(FAQ(q='Telehealth?', a='Yes, by video.'))
+        db.session.commit()
+    assert b'by video' in client.get('/resources').data
+    assert cache.stats()['hits'] == hits  # served by a fresh load, not the stale entry
+
+
+def test_sqlite_backend_shares_generations(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    a = caching.ContentCache(caching.SQLiteCache(path))
+    b = caching.ContentCache(caching.SQLiteCache(path))  # e.g. another gunicorn worker
+    assert a.get_or_set('k', lambda: 1, tags=('FAQ',)) == 1
+    assert b.get_or_set('k', lambda: 2, tags=('FAQ',)) == 1
+    b.invalidate('FAQ')
+    assert a.get_or_set('k', lambda: 3, tags=('FAQ',)) == 3
+    assert a.stats()['hits'] == 0 and b.stats()['hits'] == 1
+
+
+def test_local_backend_lru_and_ttl(monkeypatch):
+    cache = caching.LocalCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is caching.MISS and cache.get('a') == 1
+    now = caching.time.monotonic()
+    cache.set('t', 1, ttl=5)
+    monkeypatch.setattr(caching.time, 'monotonic', lambda: now + 10)
+    assert cache.get('t') is caching.MISS
+
+
+def test_default_backend_is_shared_between_workers(tmp_path):
+    assert isinstance(caching.backend_from_env({}, str(tmp_path)), caching.SQLiteCache)
+    assert isinstance(caching.backend_from_env({'CACHE_BACKEND': 'local'}, str(tmp_path)), caching.LocalCache)
@@ -0,0 +1,47 @@
+import sqlalchemy as sa
+import db_engine
+
+
+def test_uri_from_environment():
+    assert db_engine.database_uri({}) == db_engine.DEFAULT_URI
+    assert db_engine.database_uri({'DATABASE_URL': 'postgres://u:p@h/db'}) == 'postgresql://u:p@h/db'
+    assert db_engine.database_uri({'SQLALCHEMY_DATABASE_URI': 'sqlite:///x.db'}) == 'sqlite:///x.db'
+
+
+def test_pool_options_per_backend():
+    assert db_engine.engine_options('sqlite:///:memory:') == {}
+    sqlite_opts = db_engine.engine_options('sqlite:///clinic.db', {'DB_POOL_SIZE': '8'})
+    assert sqlite_opts['pool_size'] == 8
+    assert sqlite_opts['connect_args']['check_same_thread'] is False
+    pg_opts = db_engine.engine_options('postgresql://u:p@h/db', {})
+    assert pg_opts['pool_pre_ping'] is True and 'connect_args' not in pg_opts
+
+
+def test_pragmas_applied_on_connect(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'tuned.db'}"
+    engine = sa.create_engine(uri, **db_engine.engine_options(uri, {}))
+    db_engine.install_sqlite_pragmas(engine, {'SQLITE_BUSY_TIMEOUT_MS': '1234'})
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert conn.exec_driver_sql('PRAGMA synchronous').scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql('PRAGMA busy_timeout').scalar() == 1234
+    engine.dispose()
+
+
+def test_tuning_can_be_disabled():
+    assert db_engine.sqlite_pragmas({'SQLITE_TUNING': 'off'}) == []
+
+
+
+def test_pragmas_and_pool_follow_app_config(tmp_path):
+    from clinic_app import create_app, db
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'tuned.db'}",
+                      'SQLITE_BUSY_TIMEOUT_MS': 2345, 'SQLITE_SYNCHRONOUS': 'FULL', 'DB_POOL_SIZE': 3,
+                      'CACHE_BACKEND': 'local', 'SESSION_BACKEND': 'memory', 'STORAGE_ROOT': str(tmp_path / 'blobs'),
+                      'TEMPLATE_CACHE_DIR': ''})
+    with app.app_context():
+        with db.engine.connect() as conn:
+            pragmas = [conn.exec_driver_sql(f'PRAGMA {p}').scalar() for p in ('busy_timeout', 'synchronous')]
+        assert pragmas == [2345, 2]  # synchronous FULL is 2
+        assert db.engine.pool.size() == 3
+        db.engine.dispose()
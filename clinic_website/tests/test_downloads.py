@@ -0,0 +1,84 @@
+import hashlib
+import io
+
+import pytest
+from clinic_app import db, Patient, PatientFile, Staff, generate_password_hash
+
+BODY = bytes(range(256)) * 40  # 10 KiB scan
+KEY = hashlib.sha256(BODY).hexdigest()
+
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all([Patient(name='A', email='a@example.com'),
+                                Staff(name='S', email='s@example.com', role='staff',
+                                      password_hash=generate_password_hash('pw'))])
+            db.session.commit()
+        with client.session_transaction() as sess:
+            sess['staff_email'] = 's@example.com'
+        client.post('/admin/upload/1', data={'file': (io.BytesIO(BODY), 'scan.txt')},
+                    content_type='multipart/form-data')
+        yield client
+
+
+URL = '/patient/files/1/download'
+
+
+def test_full_download_is_private_and_revalidatable(client):
+    rv = client.get(URL)
+    assert rv.status_code == 200 and rv.data == BODY
+    assert rv.headers['ETag'] == f'"{KEY}"'
+    assert rv.headers['Accept-Ranges'] == 'bytes'
+    assert 'private' in rv.headers['Cache-Control']
+    assert client.get(URL, headers={'If-None-Match': f'"{KEY}"'}).status_code == 304
+
+
+def test_interrupted_download_resumes(client):
+    rv = client.get(URL, headers={'Range': 'bytes=4096-'})
+    assert rv.status_code == 206
+    assert rv.data == BODY[4096:]
+    assert rv.headers['Content-Range'] == f'bytes 4096-{len(BODY) - 1}/{len(BODY)}'
+    rv = client.get(URL, headers={'Range': 'bytes=0-99', 'If-Range': f'"{KEY}"'})
+    assert rv.status_code == 206 and rv.data == BODY[:100]
+    # the file changed since the client's partial copy: send all of it again
+    rv = client.get(URL, headers={'Range': 'bytes=0-99', 'If-Range': '"stale"'})
+    assert rv.status_code == 200 and rv.data == BODY
+
+
+def test_resumed_download_continues_the_same_bytes_under_compression(client):
+    # scan.txt is text/plain, which the compressor would otherwise gzip
+    rv = client.get(URL, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in rv.headers and rv.data == BODY
+    assert rv.headers['ETag'] == f'"{KEY}"' and int(rv.headers['Content-Length']) == len(BODY)
+    rv = client.get(URL, headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=100-', 'If-Range': rv.headers['ETag']})
+    assert rv.status_code == 206 and 'Content-Encoding' not in rv.headers
+    assert rv.data == BODY[100:]
+
+
+def test_x_sendfile_offload(client, monkeypatch, app):
+    monkeypatch.setitem(app.config, 'DOWNLOAD_OFFLOAD', 'x-sendfile')
+    rv = client.get(URL, headers={'Range': 'bytes=0-99'})
+    assert rv.status_code == 200 and rv.data == b''
+    assert rv.headers['X-Sendfile'].endswith(KEY)
+    assert 'scan.txt' in rv.headers['Content-Disposition']
+
+
+def test_x_accel_offload(client, monkeypatch, app):
+    monkeypatch.setitem(app.config, 'DOWNLOAD_OFFLOAD', 'x-accel')
+    rv = client.get(URL)
+    assert rv.data == b'' and 'X-Sendfile' not in rv.headers
+    assert rv.headers['X-Accel-Redirect'] == f'/_protected/blobs/{KEY[:2]}/{KEY[2:4]}/{KEY}'
+    rv = client.get(URL, headers={'If-None-Match': f'"{KEY}"'})
+    assert rv.status_code == 304 and 'X-Accel-Redirect' not in rv.headers
+
+
+def test_offload_still_requires_authorisation(client, monkeypatch, app):
+    monkeypatch.setitem(app.config, 'DOWNLOAD_OFFLOAD', 'x-accel')
+    with client.session_transaction() as sess:
+        sess.clear()
+    rv = client.get(URL)
+    assert rv.status_code == 302 and 'X-Accel-Redirect' not in rv.headers
@@ -0,0 +1,69 @@
+import csv
+import gzip
+import io
+from datetime import datetime, timedelta
+
+import pytest
+import helpers
+from clinic_app import db, Staff, Patient, Vitals, generate_password_hash
+
+
+@pytest.fixture
+def client(monkeypatch, app):
+    # small batches so the export has to produce several chunks
+    monkeypatch.setattr(helpers, 'EXPORT_BATCH_ROWS', 7)
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            staff = Staff(name='T', email='staff@example.com', password_hash=generate_password_hash('pw'), role='staff')
+            p1 = Patient(name='P', email='p@example.com')
+            p2 = Patient(name='Q', email='q@example.com')
+            db.session.add_all([staff, p1, p2])
+            db.session.commit()
+            base = datetime(2024, 3, 1)
+            for i in range(30):
+                db.session.add(Vitals(patient_id=p1.id if i % 3 else p2.id, systolic=120, diastolic=80,
+                                      glucose=95.5, note=f'n{i}', measured_at=base + timedelta(days=i)))
+            db.session.commit()
+        with client.session_transaction() as sess:
+            sess['patient_email'] = 'p@example.com'
+        yield client
+
+
+def test_patient_export_is_streamed(client):
+    rv = client.get('/export/vitals/1')
+    assert rv.is_streamed
+    assert rv.mimetype == 'text/csv'
+    rows = list(csv.reader(io.StringIO(rv.get_data(as_text=True))))
+    assert rows[0] == ['measured_at', 'systolic', 'diastolic', 'glucose', 'note']
+    assert len(rows) == 1 + 20
+    assert [r[0] for r in rows[1:]] == sorted(r[0] for r in rows[1:])
+
+
+def test_patient_export_is_gzipped_while_streaming(client):
+    plain = client.get('/export/vitals/1').data
+    rv = client.get('/export/vitals/1', headers={'Accept-Encoding': 'gzip'})
+    assert rv.is_streamed
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(rv.data) == plain
+
+
+def test_patient_export_is_only_for_that_patient_or_staff(client):
+    assert client.get('/export/vitals/2').status_code == 302
+    with client.session_transaction() as sess:
+        sess.clear()
+    rv = client.get('/export/vitals/1')
+    assert rv.status_code == 302 and '/login' in rv.location
+    client.post('/staff/login', data={'email': 'staff@example.com', 'password': 'pw'})
+    assert client.get('/export/vitals/2').status_code == 200
+
+
+def test_bulk_export_requires_staff_and_filters_range(client):
+    assert client.get('/staff/export/vitals').status_code == 302
+    client.post('/staff/login', data={'email': 'staff@example.com', 'password': 'pw'})
+    rv = client.get('/staff/export/vitals?since=2024-03-05&until=2024-03-15')
+    rows = list(csv.reader(io.StringIO(rv.get_data(as_text=True))))
+    assert rows[0][:2] == ['patient_id', 'patient_email']
+    assert len(rows) == 1 + 10
+    assert {r[1] for r in rows[1:]} == {'p@example.com', 'q@example.com'}
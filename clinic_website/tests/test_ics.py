@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import ics
+from clinic_app import db, Appointment, Patient, Staff
+from query_guard import count_queries
+
+SOON = (datetime.now() + timedelta(days=3)).replace(hour=9, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def client(app):
+    ics._feeds.clear()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doc = Staff(name='Asif Bhojani', email='doc@example.com', role='doctor')
+        pat = Patient(name='Zoë Patient', email='p@example.com')
+        db.session.add_all([doc, pat])
+        db.session.flush()
+        db.session.add_all([
+            Appointment(patient_id=pat.id, staff_id=doc.id, date=SOON, end=SOON + timedelta(minutes=20),
+                        reason='Follow-up; bring glucose log, fasting', status='booked'),
+            Appointment(patient_id=pat.id, staff_id=doc.id, date=SOON + timedelta(days=1), status='requested'),
+            # outside the window
+            Appointment(patient_id=pat.id, staff_id=doc.id, date=datetime.now() - timedelta(days=400), status='booked'),
+        ])
+        db.session.commit()
+    with app.test_client() as client:
+        yield client
+
+
+def feed_path(app, kind, owner_id):
+    with app.test_request_context():
+        url = ics.feed_url(kind, owner_id)
+    return url.replace('http://localhost', '')
+
+
+def test_fold_splits_long_lines_on_character_boundaries():
+    line = 'SUMMARY:' + 'é' * 60
+    folded = ics.fold(line)
+    parts = folded.split('\r\n ')
+    assert len(parts) > 1 and ''.join(parts) == line
+    assert all(len(p.encode('utf-8')) <= 75 for p in parts)
+    assert ics.fold('SHORT') == 'SHORT'
+
+
+def test_feed_requires_a_token_for_that_owner(client, app):
+    assert client.get('/calendar/doctor/1.ics').status_code == 404
+    patient_url = feed_path(app, 'patient', 1)
+    # a patient's token does not open the doctor's feed
+    assert client.get('/calendar/doctor/1.ics?' + patient_url.split('?')[1]).status_code == 404
+    assert client.get(patient_url).status_code == 200
+
+
+def test_doctor_feed_content(client, app):
+    resp = client.get(feed_path(app, 'doctor', 1))
+    assert resp.mimetype == 'text/calendar'
+    body = resp.get_data(as_text=True)
+    assert body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n')
+    assert body.count('BEGIN:VEVENT') == 2
+    assert r'SUMMARY:Zoë Patient: Follow-up\; bring glucose log\, fasting' in body.replace('\r\n ', '')
+    assert f'DTSTART:{SOON:%Y%m%dT%H%M%S}' in body
+    assert 'STATUS:TENTATIVE' in body and 'STATUS:CONFIRMED' in body
+    assert 'Cache-Control' in resp.headers and resp.headers['ETag']
+
+
+def test_unchanged_feed_is_a_304_for_one_query(client, app):
+    path = feed_path(app, 'patient', 1)
+    etag = client.get(path).headers['ETag']
+    with count_queries() as queries:
+        resp = client.get(path, headers={'If-None-Match': etag})
+    assert resp.status_code == 304 and not resp.data
+    assert len(queries) == 1
+
+
+def test_changes_are_applied_incrementally(client, app):
+    path = feed_path(app, 'doctor', 1)
+    first = client.get(path)
+    with app.app_context():
+        appt = db.session.get(Appointment, 2)
+        appt.status = 'cancelled'
+        db.session.commit()
+    resp = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert resp.status_code == 200 and resp.headers['ETag'] != first.headers['ETag']
+    assert 'STATUS:CANCELLED' in resp.get_data(as_text=True)
+    feed = ics._feeds.get(('doctor', 1))
+    assert (feed.full_builds, feed.incremental_builds) == (1, 1)
+
+
+def test_build_never_changes_the_cached_feed(client, app):
+    path = feed_path(app, 'doctor', 1)
+    client.get(path)
+    cached = ics._feeds.get(('doctor', 1))
+    body, events = cached.body, dict(cached.events)
+    with app.app_context():
+        db.session.get(Appointment, 2).status = 'cancelled'
+        db.session.commit()
+    client.get(path)
+    # a thread still serving the old object sees it whole; the update is a new object
+    assert (cached.body, cached.events) == (body, events)
+    assert ics._feeds.get(('doctor', 1)) is not cached
+
+
+def test_deleted_appointment_forces_a_full_rebuild(client, app):
+    path = feed_path(app, 'doctor', 1)
+    client.get(path)
+    with app.app_context():
+        db.session.delete(db.session.get(Appointment, 1))
+        db.session.add(Appointment(patient_id=1, staff_id=1, date=SOON + timedelta(days=2), status='booked'))
+        db.session.commit()
+    body = client.get(path).get_data(as_text=True)
+    # same count as before, but the deleted event is gone
+    assert body.count('BEGIN:VEVENT') == 2 and 'Follow-up' not in body
+    assert ics._feeds.get(('doctor', 1)).full_builds == 1  # a fresh Feed after the mismatch
+
+
+def test_renaming_a_patient_changes_the_doctor_feed(client, app):
+    path = feed_path(app, 'doctor', 1)
+    first = client.get(path)
+    with app.app_context():
+        db.session.add(Patient(name='New Patient', email='n@example.com'))  # appears in no summary
+        db.session.get(Patient, 1).email = 'zoe@example.com'
+        db.session.commit()
+    assert client.get(path, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    with app.app_context():
+        db.session.get(Patient, 1).name = 'Zoë Renamed'
+        db.session.commit()
+    resp = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert resp.status_code == 200 and resp.headers['ETag'] != first.headers['ETag']
+    assert 'SUMMARY:Zoë Renamed: Follow-up' in resp.get_data(as_text=True).replace('\r\n ', '')
+    patient_feed = feed_path(app, 'patient', 1)
+    assert 'Dr. Asif' in client.get(patient_feed).get_data(as_text=True)
+    with app.app_context():
+        db.session.delete(db.session.get(Staff, 1))
+        db.session.commit()
+    assert 'Dr. Asif' not in client.get(patient_feed).get_data(as_text=True)
@@ -0,0 +1,21 @@
+from sqlalchemy import text
+from clinic_app import db
+
+
+def _plan(app, sql):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        return ' '.join(r[-1] for r in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)))
+
+
+def test_vitals_page_uses_composite_index(app):
+    plan = _plan(app, 'SELECT id FROM vitals WHERE patient_id = 1 ORDER BY measured_at, id LIMIT 10')
+    assert 'ix_vitals_patient_measured' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_patient_files_use_composite_index(app):
+    plan = _plan(app, 'SELECT id FROM patient_file WHERE patient_id = 1 ORDER BY uploaded_at DESC')
+    assert 'ix_patient_file_patient_uploaded' in plan
+    assert 'TEMP B-TREE' not in plan
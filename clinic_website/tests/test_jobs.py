@@ -0,0 +1,147 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from clinic_app import db, jobs, send_alert, Job
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield
+
+
+def test_alerts_are_batched_over_one_connection(ctx, smtp_server):
+    assert send_alert('alert 0', 'body')  # eager under tests: delivered straight away
+    for i in (1, 2, 3):
+        jobs.enqueue('email', {'to': 'admin@example.com', 'subject': f'alert {i}', 'body': 'b'}, commit=False)
+    db.session.commit()
+    assert len(smtp_server.messages) == 1  # commit alone doesn't run anything
+    assert jobs.run_pending() == 3
+    assert smtp_server.connections == 2  # one for the eager send, one for the whole batch
+    assert len(smtp_server.messages) == 4
+    assert Job.query.filter_by(status='done').count() == 4
+
+
+def test_refused_message_retries_with_backoff_then_fails(ctx, smtp_server):
+    smtp_server.refuse.add('BOUNCE@EXAMPLE.COM')
+    job = jobs.enqueue('email', {'to': 'bounce@example.com', 'subject': 's', 'body': 'b'})
+    job = db.session.get(Job, job.id)
+    assert job.status == 'pending' and job.attempts == 1
+    assert 'SMTPRecipientsRefused' in job.last_error
+    assert job.run_after > datetime.utcnow() + timedelta(seconds=3)
+    assert jobs.run_pending() == 0  # not due yet
+
+    for _ in range(job.max_attempts):
+        job.run_after = datetime.utcnow()
+        db.session.commit()
+        jobs.run_pending()
+    job = db.session.get(Job, job.id)
+    assert job.status == 'failed'
+    assert job.attempts == job.max_attempts
+
+
+def test_handler_exception_is_recorded_and_stale_leases_are_reclaimed(ctx):
+    calls = []
+
+    @jobs.register('flaky', max_attempts=2)
+    def flaky(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+
+    job = jobs.enqueue('flaky', {'n': 1})
+    job = db.session.get(Job, job.id)
+    assert job.status == 'pending' and 'boom' in job.last_error
+
+    # a worker died mid-job: the row is stuck in 'running' past its lease
+    job.status = 'running'
+    job.locked_at = datetime.utcnow() - timedelta(hours=1)
+    job.run_after = datetime.utcnow()
+    db.session.commit()
+    assert jobs.run_pending() == 1
+    assert db.session.get(Job, job.id).status == 'done'
+    assert calls == [{'n': 1}, {'n': 1}]
+
+
+def thread_queue(tmp_path):
+    # a separate file-backed app: worker threads can't share the suite's :memory: database
+    from flask import Flask
+    from flask_sqlalchemy import SQLAlchemy
+    from jobs import JobQueue
+
+    other = Flask('jobs_threads')
+    other.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "jobs.db"}', JOBS_POLL_SECONDS=0.05)
+    other_db = SQLAlchemy(other)
+
+    class ThreadJob(other_db.Model):
+        __table__ = Job.__table__.to_metadata(other_db.metadata)
+
+    with other.app_context():
+        other_db.create_all()
+    return other, ThreadJob, JobQueue(other, other_db, ThreadJob)
+
+
+def test_worker_threads_drain_the_queue(tmp_path):
+    other, ThreadJob, queue = thread_queue(tmp_path)
+    done = threading.Event()
+    seen = []
+
+    @queue.register('note')
+    def note(payload):
+        seen.append(payload['n'])
+        if len(seen) == 3:
+            done.set()
+
+    with other.app_context():
+        for n in range(3):
+            queue.enqueue('note', {'n': n})
+    try:
+        assert done.wait(5)
+    finally:
+        queue.shutdown()
+    assert sorted(seen) == [0, 1, 2]
+    with other.app_context():
+        assert ThreadJob.query.filter_by(status='done').count() == 3
+
+
+def test_started_queue_runs_jobs_left_by_a_previous_process(tmp_path):
+    other, ThreadJob, queue = thread_queue(tmp_path)
+    done = threading.Event()
+
+    @queue.register('note')
+    def note(payload):
+        done.set()
+
+    # a row committed before the restart; nothing in this process enqueues anything
+    with other.app_context():
+        queue.db.session.add(ThreadJob(kind='note', payload='{}', status='pending', attempts=0, max_attempts=5,
+                                       run_after=datetime.utcnow()))
+        queue.db.session.commit()
+    queue.start()
+    try:
+        assert done.wait(5)
+    finally:
+        queue.shutdown()
+    with other.app_context():
+        assert ThreadJob.query.one().status == 'done'
+
+
+def test_started_queue_runs_periodic_jobs_without_traffic(tmp_path):
+    # what the reminder scan and upload expiry rely on in a freshly booted worker
+    other, ThreadJob, queue = thread_queue(tmp_path)
+    done = threading.Event()
+
+    @queue.register('sweep', every=3600)
+    def sweep(payload):
+        done.set()
+
+    queue.start()
+    try:
+        assert done.wait(5)
+    finally:
+        queue.shutdown()
+    with other.app_context():
+        assert ThreadJob.query.filter_by(kind='sweep', status='done').count() == 1
@@ -0,0 +1,127 @@
+import pytest
+from flask import Flask
+from werkzeug import security
+
+import passwords
+import ratelimit
+from clinic_app import db, Patient, Staff, generate_password_hash
+from query_guard import count_queries
+
+LEGACY = 'pbkdf2:sha256:1000'  # cheap, and not the policy
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'RATELIMIT_ENABLED', True)
+    monkeypatch.setitem(app.config, 'RATELIMIT_LOGIN_IP', '4/minute')
+    monkeypatch.setitem(app.config, 'RATELIMIT_LOGIN_ACCOUNT', '3/minute')
+    app.extensions['ratelimit'].clear()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([Patient(name='P', email='p@example.com', password_hash=generate_password_hash('pw', LEGACY)),
+                            Staff(name='S', email='s@example.com', role='staff',
+                                  password_hash=generate_password_hash('pw', LEGACY))])
+        db.session.commit()
+    with app.test_client() as client:
+        yield client
+    app.extensions['ratelimit'].clear()
+
+
+def login(client, email, password='wrong', ip='10.0.0.1', path='/login'):
+    return client.post(path, data={'email': email, 'password': password}, environ_base={'REMOTE_ADDR': ip})
+
+
+def test_parse_rate():
+    assert ratelimit.parse_rate('5/minute') == (5, 5 / 60)
+    assert ratelimit.parse_rate('100/hours') == (100, 100 / 3600)
+    with pytest.raises(ValueError):
+        ratelimit.parse_rate('lots')
+
+
+@pytest.mark.parametrize('make', [lambda tmp: ratelimit.LocalBuckets(),
+                                  lambda tmp: ratelimit.SQLiteBuckets(str(tmp / 'buckets.sqlite3'))],
+                         ids=['local', 'sqlite'])
+def test_bucket_refuses_when_empty_and_refills(make, tmp_path, monkeypatch):
+    store = make(tmp_path)
+    assert [store.take('k', 3, 1.0) for _ in range(3)] == [0, 0, 0]
+    wait = store.take('k', 3, 1.0)
+    assert 0 < wait <= 1.0
+    assert store.take('other', 3, 1.0) == 0
+    clock = ratelimit.time.monotonic() if isinstance(store, ratelimit.LocalBuckets) else ratelimit.time.time()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: clock + 2)
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: clock + 2)
+    assert store.take('k', 3, 1.0) == 0
+
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'buckets.sqlite3')
+    a, b = ratelimit.SQLiteBuckets(path), ratelimit.SQLiteBuckets(path)
+    assert a.take('k', 2, 0.001) == 0
+    assert b.take('k', 2, 0.001) == 0
+    assert a.take('k', 2, 0.001) > 0
+
+
+
+def test_default_store_is_shared_between_workers(tmp_path):
+    limiter = ratelimit.RateLimiter()
+    a, b = Flask(__name__, instance_path=str(tmp_path)), Flask(__name__, instance_path=str(tmp_path))
+    limiter.init_app(a)
+    limiter.init_app(b)  # e.g. another gunicorn worker
+    waits = []
+    for worker in (a, b, a):
+        with worker.app_context():
+            assert isinstance(limiter.store, ratelimit.SQLiteBuckets)
+            waits.append(limiter.take('k', '2/hour'))
+    assert waits[:2] == [0, 0] and waits[2] > 0  # the second worker spent the first one's bucket
+    local = Flask(__name__, instance_path=str(tmp_path))
+    local.config['RATELIMIT_BACKEND'] = 'local'
+    limiter.init_app(local)
+    assert isinstance(local.extensions['ratelimit'], ratelimit.LocalBuckets)
+
+def test_throttled_login_skips_database_and_hashing(client, monkeypatch):
+    for _ in range(3):
+        assert login(client, 'p@example.com').status_code == 302
+    hashes = []
+    monkeypatch.setattr(passwords, 'check_password_hash', lambda *a: hashes.append(a) or False)
+    with count_queries() as stmts:
+        resp = login(client, 'p@example.com')
+    assert resp.status_code == 429 and int(resp.headers['Retry-After']) >= 1
+    assert b'Too many login attempts' in resp.data
+    assert stmts == [] and hashes == []
+    # the account is still reachable from elsewhere once its own bucket allows
+    assert login(client, 'other@example.com', ip='10.0.0.2').status_code == 302
+
+
+def test_per_ip_bucket_covers_every_login_form(client):
+    for i, path in enumerate(('/login', '/staff/login', '/admin/login', '/login')):
+        assert login(client, f'u{i}@example.com', path=path).status_code in (200, 302)
+    assert login(client, 's@example.com', path='/staff/login').status_code == 429
+    assert login(client, 'p@example.com', ip='10.0.0.9').status_code == 302
+
+
+def test_per_account_bucket_spans_addresses(client):
+    for i in range(3):
+        assert login(client, 'S@example.com', ip=f'10.0.1.{i}', path='/staff/login').status_code == 302
+    assert login(client, 's@example.com', ip='10.0.1.9', path='/staff/login').status_code == 429
+
+
+def test_legacy_hash_is_upgraded_on_login(client, app, monkeypatch):
+    assert login(client, 'p@example.com', password='pw').status_code == 302
+    with app.app_context():
+        stored = db.session.get(Patient, 1).password_hash
+    assert stored.startswith('scrypt:32768:8:1$')
+    assert security.check_password_hash(stored, 'pw')
+
+    # a policy change reaches existing accounts the same way
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:2000')
+    login(client, 'p@example.com', password='pw', ip='10.0.0.3')
+    with app.app_context():
+        assert db.session.get(Patient, 1).password_hash.startswith('pbkdf2:sha256:2000$')
+        assert not passwords.needs_rehash(db.session.get(Patient, 1).password_hash)
+
+
+def test_failed_login_leaves_the_hash_alone(client, app):
+    login(client, 's@example.com', path='/staff/login')
+    with app.app_context():
+        assert db.session.get(Staff, 1).password_hash.startswith(LEGACY + '$')
@@ -0,0 +1,63 @@
+import pytest
+from clinic_app import db, BlogPost
+from query_guard import count_queries
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(BlogPost(title='Managing Blood Sugar', slug='managing-blood-sugar', content='Tips.'))
+        db.session.commit()
+    app.extensions['content_cache'].backend.clear()
+    with app.test_client() as client:
+        yield client
+
+
+def test_anonymous_page_served_from_cache_with_validators(client):
+    first = client.get('/blog')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert not etag.startswith('W/')
+    assert 'public' in first.headers['Cache-Control']
+    with count_queries() as stmts:
+        second = client.get('/blog')
+    assert stmts == []
+    assert second.data == first.data and second.headers['ETag'] == etag
+
+
+def test_conditional_requests_get_304(client):
+    first = client.get('/services')
+    rv = client.get('/services', headers={'If-None-Match': first.headers['ETag']})
+    assert rv.status_code == 304 and rv.data == b''
+
+
+def test_new_content_changes_etag(client, app):
+    etag = client.get('/blog').headers['ETag']
+    with app.app_context():
+        db.session.add(BlogPost(title='Home BP', slug='home-bp', content='Measure.'))
+        db.session.commit()
+    rv = client.get('/blog', headers={'If-None-Match': etag})
+    assert rv.status_code == 200 and b'Home BP' in rv.data
+
+
+def test_edits_are_never_answered_with_304(client, app):
+    first = client.get('/blog')
+    # no creation date moves when a post is edited, so no Last-Modified to revalidate against
+    assert 'Last-Modified' not in first.headers
+    with app.app_context():
+        db.session.get(BlogPost, 1).title = 'Managing Blood Sugar at Home'
+        db.session.commit()
+    rv = client.get('/blog', headers={'If-None-Match': first.headers['ETag'],
+                                      'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert rv.status_code == 200 and b'at Home' in rv.data
+
+
+def test_logged_in_users_bypass_the_cache(client):
+    client.get('/about')
+    with client.session_transaction() as sess:
+        sess['patient_email'] = 'p@example.com'
+    rv = client.get('/about')
+    assert 'private' in rv.headers['Cache-Control']
+    assert 'ETag' not in rv.headers
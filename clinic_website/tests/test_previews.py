@@ -0,0 +1,90 @@
+import io
+import json
+
+import pytest
+import previews
+from clinic_app import db, Patient, PatientFile, Staff, generate_password_hash
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+THUMB = b'\xff\xd8 tiny jpeg'
+
+
+@pytest.fixture
+def client(monkeypatch, app):
+    # the plumbing under test is the job/storage/route path, not the decoders
+    monkeypatch.setattr(previews, 'supported', lambda ext: ext in ('png', 'pdf'))
+    monkeypatch.setattr(previews, 'make_preview', lambda fh, ext: (THUMB, {'format': 'PNG', 'width': 2000,
+                                                                           'height': 1000, 'preview_width': 320,
+                                                                           'preview_height': 160}))
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all([Patient(name='A', email='a@example.com'), Patient(name='B', email='b@example.com'),
+                                Staff(name='S', email='s@example.com', role='staff',
+                                      password_hash=generate_password_hash('pw'))])
+            db.session.commit()
+        with client.session_transaction() as sess:
+            sess['staff_email'] = 's@example.com'
+        client.post('/admin/upload/1', data={'file': (io.BytesIO(PNG), 'xray.png')},
+                    content_type='multipart/form-data')
+        yield client
+
+
+def test_preview_is_stored_and_listed(client, app, file_store):
+    with app.app_context():
+        pf = db.session.get(PatientFile, 1)
+        assert pf.preview_key and pf.preview_key != pf.storage_key
+        assert json.loads(pf.preview_meta)['width'] == 2000
+        key = pf.preview_key
+    with file_store.open(key) as fh:
+        assert fh.read() == THUMB
+    with client.session_transaction() as sess:
+        sess['patient_email'] = 'a@example.com'
+    page = client.get('/patient/files').data
+    assert f'/patient/files/1/preview?v={key[:16]}'.encode() in page
+    assert '2000×1000'.encode() in page
+
+
+def test_preview_is_served_with_immutable_private_caching(client):
+    rv = client.get('/patient/files/1/preview?v=x')
+    assert rv.status_code == 200 and rv.data == THUMB
+    assert rv.mimetype == 'image/jpeg'
+    cc = rv.headers['Cache-Control']
+    assert 'private' in cc and 'immutable' in cc and 'max-age=31536000' in cc and 'public' not in cc
+    assert client.get('/patient/files/1/preview', headers={'If-None-Match': rv.headers['ETag']}).status_code == 304
+
+
+def test_preview_needs_the_same_access_as_the_file(client, app):
+    with app.app_context():
+        db.session.add(PatientFile(patient_id=1, filename='x_note.txt', original_name='note.txt'))  # no preview
+        db.session.commit()
+    with client.session_transaction() as sess:
+        sess.clear()
+        sess['patient_email'] = 'b@example.com'
+    assert client.get('/patient/files/1/preview').status_code == 403
+    # refused before the missing preview: a stranger cannot tell which files have one
+    assert client.get('/patient/files/2/preview').status_code == 403
+    with client.session_transaction() as sess:
+        sess['patient_email'] = 'a@example.com'
+    assert client.get('/patient/files/2/preview').status_code == 404
+
+
+def test_preview_blob_is_collected_with_the_file(client, monkeypatch, app, file_store):
+    monkeypatch.setitem(app.config, 'STORAGE_GC_DELAY', 0)
+    with app.app_context():
+        key = db.session.get(PatientFile, 1).preview_key
+    with client.session_transaction() as sess:
+        sess['is_admin'] = True
+    client.post('/admin/patient/delete/1')
+    assert not file_store.exists(key)
+
+
+def test_pillow_downscales_photos():
+    Image = pytest.importorskip('PIL.Image')
+    src = io.BytesIO()
+    Image.new('RGB', (1600, 1200), 'white').save(src, 'PNG')
+    src.seek(0)
+    data, meta = previews.make_preview(src, 'png')
+    assert meta['width'] == 1600 and meta['preview_width'] == 320
+    assert Image.open(io.BytesIO(data)).size == (320, 240)
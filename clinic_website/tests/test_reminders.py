@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import reminders
+from clinic_app import db, jobs, Appointment, Job, Patient, Reminder, Staff
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Staff(name='Asif Bhojani', email='doc@example.com', role='doctor'))
+        for i in range(3):
+            db.session.add(Patient(name=f'Patient {i}', email=f'p{i}@example.com'))
+        db.session.commit()
+        yield
+
+
+def appointment(patient_id, start, status='booked', staff_id=None):
+    appt = Appointment(patient_id=patient_id, staff_id=staff_id, date=start, end=start + timedelta(minutes=20),
+                       status=status, reason='Check-up')
+    db.session.add(appt)
+    db.session.commit()
+    return appt
+
+
+def test_parse_offsets():
+    assert reminders.parse_offsets('24h, 2h') == [1440, 120]
+    assert reminders.parse_offsets('90m,1d,90') == [1440, 90]
+    with pytest.raises(ValueError):
+        reminders.parse_offsets('soon')
+
+
+def test_due_reminders_go_out_in_one_batch(ctx, smtp_server):
+    now = datetime.now()
+    # 2h reminders 10 minutes late (still within REMINDER_LATE_MINUTES) and a 24h one due now
+    for pid, start in ((1, now + timedelta(hours=2, minutes=-10)), (2, now + timedelta(hours=2, minutes=-5)),
+                       (3, now + timedelta(hours=24))):
+        appointment(pid, start, staff_id=1)
+    assert reminders.scan(now) == 3
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 3
+    assert all('Message-ID: <reminder-' in m and 'Dr. Asif Bhojani' in m for m in smtp_server.messages)
+    assert {r.status for r in Reminder.query} == {'sent'}
+    assert Job.query.filter_by(kind='reminder', status='done').count() == 3
+
+
+def test_scan_only_queues_what_is_due_soon(ctx, smtp_server):
+    now = datetime.now()
+    appointment(1, now + timedelta(days=5))  # nothing due for days
+    appointment(2, now + timedelta(hours=6))  # between the 24h and 2h reminders
+    appointment(3, now + timedelta(hours=2, minutes=20), status='cancelled')
+    soon = appointment(3, now + timedelta(hours=2, minutes=20))
+    assert reminders.scan(now) == 1
+    r = Reminder.query.one()
+    assert (r.appointment_id, r.offset_minutes, r.status) == (soon.id, 120, 'queued')
+    # queued with a delay until it is due: nothing sent yet
+    assert not smtp_server.messages
+    job = Job.query.filter_by(kind='reminder').one()
+    assert job.run_after > datetime.utcnow() + timedelta(minutes=15)
+
+
+def test_rescanning_is_idempotent(ctx, smtp_server):
+    now = datetime.now()
+    appointment(1, now + timedelta(hours=2))
+    assert reminders.scan(now) == 1
+    assert reminders.scan(now + timedelta(minutes=5)) == 0
+    assert len(smtp_server.messages) == 1
+    # a duplicated job for an already sent reminder sends nothing
+    assert reminders.deliver([Reminder.query.one().id], None) == [None]
+    assert len(smtp_server.messages) == 1
+
+
+def test_moved_or_cancelled_appointments_are_skipped(ctx, smtp_server, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'REMINDER_LATE_MINUTES', 0)
+    now = datetime.now()
+    moved = appointment(1, now + timedelta(hours=2, minutes=10))
+    cancelled = appointment(2, now + timedelta(hours=2, minutes=10))
+    assert reminders.scan(now) == 2
+    moved.date += timedelta(minutes=5)
+    cancelled.status = 'cancelled'
+    db.session.commit()
+    for job in Job.query.filter_by(kind='reminder'):
+        job.run_after = datetime.utcnow()
+    db.session.commit()
+    jobs.run_pending()
+    assert {r.status for r in Reminder.query} == {'skipped'}
+    assert not smtp_server.messages
+    # the new time has a reminder of its own
+    assert reminders.scan(now + timedelta(minutes=5)) == 1
+
+
+def test_refused_recipient_is_retried_then_marked_failed(ctx, smtp_server):
+    smtp_server.refuse.add('P0@EXAMPLE.COM')
+    now = datetime.now()
+    appointment(1, now + timedelta(hours=2))
+    appointment(2, now + timedelta(hours=2))
+    reminders.scan(now)
+    by_recipient = {r.recipient: r for r in Reminder.query}
+    assert by_recipient['p1@example.com'].status == 'sent'
+    refused = by_recipient['p0@example.com']
+    assert (refused.status, refused.attempts) == ('queued', 1)
+    assert 'SMTPRecipientsRefused' in refused.last_error
+    for _ in range(reminders.MAX_ATTEMPTS):
+        for job in Job.query.filter_by(status='pending'):
+            job.run_after = datetime.utcnow()
+        db.session.commit()
+        jobs.run_pending()
+    assert db.session.get(Reminder, refused.id).status == 'failed'
+    assert len(smtp_server.messages) == 1
@@ -0,0 +1,94 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from clinic_app import (db, jobs, Patient, PatientFile, Staff, UploadSession,
+                        generate_password_hash)
+
+BODY = b'%PDF-1.7\n' + os.urandom(300_000)
+DIGEST = hashlib.sha256(BODY).hexdigest()
+
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all([Patient(name='A', email='a@example.com'),
+                                Staff(name='S', email='s@example.com', role='staff',
+                                      password_hash=generate_password_hash('pw'))])
+            db.session.commit()
+        with client.session_transaction() as sess:
+            sess['staff_email'] = 's@example.com'
+        yield client
+
+
+def init(client, size=len(BODY), name='scan.pdf'):
+    rv = client.post('/api/uploads', json={'patient_id': 1, 'filename': name, 'size': size})
+    assert rv.status_code == 201
+    return rv.get_json()['id']
+
+
+def put(client, upload_id, offset, data):
+    return client.put(f'/api/uploads/{upload_id}?offset={offset}', data=data)
+
+
+def test_chunked_upload_survives_retries_and_resumes(client, app, file_store):
+    uid = init(client)
+    assert put(client, uid, 0, BODY[:100_000]).get_json()['offset'] == 100_000
+    # the response to that chunk was lost; the client sends it again
+    assert put(client, uid, 0, BODY[:100_000]).get_json()['offset'] == 100_000
+    # a chunk past the received data is refused with the offset to resume from
+    rv = put(client, uid, 200_000, BODY[200_000:])
+    assert rv.status_code == 409 and rv.get_json()['offset'] == 100_000
+    # overlapping chunk: only the new tail is appended
+    assert put(client, uid, 50_000, BODY[50_000:250_000]).get_json()['offset'] == 250_000
+    rv = client.head(f'/api/uploads/{uid}')
+    assert rv.headers['Upload-Offset'] == '250000'
+    put(client, uid, 250_000, BODY[250_000:])
+
+    rv = client.post(f'/api/uploads/{uid}/finalize', json={'sha256': DIGEST})
+    assert rv.status_code == 201
+    with app.app_context():
+        pf = db.session.get(PatientFile, rv.get_json()['file_id'])
+        assert pf.size == len(BODY) and pf.storage_key == DIGEST
+        assert db.session.get(UploadSession, uid) is None
+    with file_store.open(DIGEST) as fh:
+        assert fh.read() == BODY
+    assert not os.path.exists(os.path.join(file_store.staging_dir, 'resumable', uid))
+
+
+def test_finalize_checks_completeness_and_checksum(client, app):
+    uid = init(client)
+    put(client, uid, 0, BODY[:1000])
+    assert client.post(f'/api/uploads/{uid}/finalize', json={'sha256': DIGEST}).status_code == 409
+    put(client, uid, 1000, BODY[1000:])
+    rv = client.post(f'/api/uploads/{uid}/finalize', json={'sha256': '0' * 64})
+    assert rv.status_code == 422
+    with app.app_context():
+        assert PatientFile.query.count() == 0
+    assert client.post(f'/api/uploads/{uid}/finalize', json={'sha256': DIGEST}).status_code == 201
+
+
+def test_limits(client):
+    assert client.post('/api/uploads', json={'patient_id': 1, 'filename': 'x.exe', 'size': 10}).status_code == 400
+    rv = client.post('/api/uploads', json={'patient_id': 1, 'filename': 'x.pdf', 'size': 10 ** 12})
+    assert rv.status_code == 413
+    uid = init(client, size=10)
+    assert put(client, uid, 0, b'x' * 11).status_code == 400
+
+
+def test_abandoned_uploads_expire(client, app, file_store):
+    uid = init(client)
+    put(client, uid, 0, BODY[:1000])
+    with app.app_context():
+        db.session.get(UploadSession, uid).expires_at = datetime.utcnow() - timedelta(minutes=1)
+        db.session.commit()
+    assert client.head(f'/api/uploads/{uid}').status_code == 404
+    with app.app_context():
+        assert 'expire_uploads' in jobs.schedule_periodic()  # eager: runs straight away
+        assert db.session.get(UploadSession, uid) is None
+        assert jobs.schedule_periodic() == []  # not due again for an hour
+    assert not os.path.exists(os.path.join(file_store.staging_dir, 'resumable', uid))
@@ -0,0 +1,115 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+import scheduling
+from clinic_app import db, Appointment, Patient, Schedule, Staff
+from query_guard import count_queries
+
+DAY = date.today() + timedelta(days=7)
+
+
+def at(hh, mm=0):
+    return datetime.combine(DAY, time(hh, mm))
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        doc = Staff(name='Asif Bhojani', email='doc@example.com', role='doctor')
+        db.session.add_all([doc, Patient(name='P', email='p@example.com')])
+        db.session.flush()
+        # 09:00-10:00 in 20 minute slots, plus a 30 minute template overlapping the end
+        db.session.add_all([Schedule(staff_id=doc.id, weekday=DAY.weekday(), start=time(9), end=time(10), slot_minutes=20),
+                            Schedule(staff_id=doc.id, weekday=DAY.weekday(), start=time(10), end=time(10, 30),
+                                     slot_minutes=30)])
+        db.session.commit()
+    with app.test_client() as client:
+        yield client
+
+
+def test_interval_conflicts():
+    booked = scheduling.Intervals([(at(9, 20), at(9, 40)), (at(9), at(9, 20)), (at(10), at(10))])
+    assert booked.conflicts(at(9, 10), at(9, 30))
+    assert booked.conflicts(at(9, 30), at(9, 50))
+    assert not booked.conflicts(at(9, 40), at(10))
+    assert booked.conflicts(at(9, 50), at(10, 10))  # a legacy appointment with no end
+    assert not booked.conflicts(at(8), at(9))
+
+
+def test_availability_and_booking(client, app):
+    with app.test_request_context():
+        assert [s for s, _ in scheduling.free_slots(1, DAY)] == [at(9), at(9, 20), at(9, 40), at(10)]
+        appt_id = scheduling.book(1, at(9, 20), 1, 'check-up')
+        assert db.session.get(Appointment, appt_id).end == at(9, 40)
+        assert [s for s, _ in scheduling.free_slots(1, DAY)] == [at(9), at(9, 40), at(10)]
+        assert [s for s, _ in scheduling.next_free_slots(1, at(9, 1), n=2)] == [at(9, 40), at(10)]
+
+        with pytest.raises(scheduling.SlotUnavailable, match='just taken'):
+            scheduling.book(1, at(9, 20), 1)
+        with pytest.raises(scheduling.SlotUnavailable, match='not one of'):
+            scheduling.book(1, at(9, 10), 1)
+        with pytest.raises(scheduling.SlotUnavailable):
+            scheduling.book(1, datetime.now() + timedelta(minutes=5), 1)
+        # stamped in UTC like every other created_at
+        created = db.session.get(Appointment, appt_id).created_at
+        assert abs(created - datetime.utcnow()) < timedelta(minutes=1)
+
+
+def test_days_past_the_horizon_offer_no_slots(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'BOOKING_HORIZON_DAYS', 3)
+    with app.test_request_context():
+        assert scheduling.free_slots(1, DAY) == []
+        with pytest.raises(scheduling.SlotUnavailable):
+            scheduling.book(1, at(9), 1)
+    assert client.get(f'/api/slots?doctor=1&date={DAY.isoformat()}').get_json()['slots'] == []
+
+
+def test_booking_never_trusts_cached_availability(client, app):
+    with app.test_request_context():
+        assert at(9, 40) in [s for s, _ in scheduling.free_slots(1, DAY)]
+        # another worker books the slot; this process's cached day has not heard of it
+        with db.engine.begin() as conn:
+            conn.execute(text("INSERT INTO appointment (patient_id, staff_id, date, \"end\", status) "
+                              "VALUES (1, 1, :s, :e, 'booked')"), {'s': at(9, 40), 'e': at(10)})
+        assert at(9, 40) in [s for s, _ in scheduling.free_slots(1, DAY)]
+        with pytest.raises(scheduling.SlotUnavailable):
+            scheduling.book(1, at(9, 40), 1)
+
+
+def test_unique_index_rejects_a_second_live_booking(client, app):
+    with app.app_context():
+        db.session.add(Appointment(patient_id=1, staff_id=1, date=at(9), end=at(9, 20), status='cancelled'))
+        db.session.add(Appointment(patient_id=1, staff_id=1, date=at(9), end=at(9, 20), status='booked'))
+        db.session.commit()
+        db.session.add(Appointment(patient_id=1, staff_id=1, date=at(9), end=at(9, 20), status='booked'))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+
+def test_slots_api_is_served_from_cache(client):
+    rv = client.get(f'/api/slots?doctor=1&date={DAY.isoformat()}').get_json()
+    assert [s['start'] for s in rv['slots']][:2] == [at(9).isoformat(timespec='minutes'),
+                                                    at(9, 20).isoformat(timespec='minutes')]
+    with count_queries() as stmts:
+        again = client.get(f'/api/slots?doctor=1&date={DAY.isoformat()}')
+    assert again.get_json() == rv and stmts == []
+    assert client.get('/api/slots').status_code == 400
+
+
+def test_book_form_books_a_slot_once(client, app):
+    form = {'name': 'P', 'email': 'p@example.com', 'staff_id': '1', 'slot': at(9).isoformat(), 'reason': 'BP'}
+    assert b'Booked' in client.post('/book', data=form).data
+    # the ORM-side change dropped the cached day as well
+    slots = client.get(f'/api/slots?doctor=1&date={DAY.isoformat()}').get_json()['slots']
+    assert at(9).isoformat(timespec='minutes') not in [s['start'] for s in slots]
+    rv = client.post('/book', data=form)
+    assert rv.status_code == 302 and 'staff_id=1' in rv.headers['Location']
+    with app.app_context():
+        assert Appointment.query.filter_by(staff_id=1).count() == 1
+    assert b'Dr. Asif Bhojani' in client.get('/book?doctor=Dr.+Asif+Bhojani').data
@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import text
+
+import search
+from clinic_app import db, BlogPost, FAQ, Testimonial
+from query_guard import count_queries
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([
+            BlogPost(title='Living with diabetes', slug='living-with-diabetes',
+                     content='Small daily habits keep blood sugar steady. Walk after meals.'),
+            BlogPost(title='Salt and blood pressure', slug='salt-bp',
+                     content='Cutting salt lowers blood pressure for most people with hypertension. Diabetic patients too.'),
+            FAQ(q='Do I need to fast before a glucose test?', a='Yes, for eight hours.'),
+            Testimonial(author='Jane Doe', text='Helped me understand my insulin <script>.'),
+        ])
+        db.session.commit()
+    with app.test_client() as client:
+        yield client
+
+
+def test_ranked_results_with_snippets(client, app):
+    with app.test_request_context():
+        results = search.search('diabetes')
+    # the title match outranks the body-only match; porter stems 'diabetic' to the same term
+    assert [r['title'] for r in results] == ['Living with diabetes', 'Salt and blood pressure']
+    assert results[0]['url'] == '/blog/living-with-diabetes'
+    assert '<mark>Diabetic</mark>' in results[1]['snippet']
+
+    with app.test_request_context():
+        assert [r['kind'] for r in search.search('gluc')] == ['faq']  # prefix match while typing
+        assert search.search('blood', kind='faq') == []
+        # FTS5 syntax in the input is matched as plain words, never parsed
+        assert search.search('"(* ^') == []
+        assert [r['title'] for r in search.search('salt AND "blood')] == ['Salt and blood pressure']
+
+
+def test_index_follows_inserts_updates_and_deletes(client, app):
+    with app.app_context():
+        post = BlogPost.query.filter_by(slug='salt-bp').one()
+        post.content = 'Potassium rich food helps.'
+        db.session.add(FAQ(q='Is potassium safe?', a='Ask us first.'))
+        db.session.delete(Testimonial.query.one())
+        db.session.commit()
+    rv = client.get('/api/search?q=potassium').get_json()
+    assert {r['kind'] for r in rv['results']} == {'post', 'faq'}
+    assert client.get('/api/search?q=insulin').get_json()['results'] == []
+    assert client.get('/api/search?q=hypertension').get_json()['results'] == []
+
+
+def test_search_is_one_indexed_query(client, app):
+    with app.test_request_context(), count_queries() as stmts:
+        search.search('blood pressure')
+    assert len(stmts) == 1
+    with app.app_context():
+        plan = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT rowid FROM search_index WHERE search_index MATCH 'blood'")).all()
+    assert 'VIRTUAL TABLE INDEX' in str(plan)
+
+
+def test_search_page_escapes_content(client):
+    page = client.get('/search?q=insulin').get_data(as_text=True)
+    assert '<mark>insulin</mark>' in page
+    assert '<script>' not in page.split('<main', 1)[1].split('</main>', 1)[0]
+    assert 'Nothing matched' in client.get('/search?q=zzz').get_data(as_text=True)
+
+
+def test_rebuild_restores_the_index(client, app):
+    with app.app_context():
+        db.session.execute(text('DELETE FROM search_index'))
+        db.session.commit()
+    assert client.get('/api/search?q=salt').get_json()['results'] == []
+    result = app.test_cli_runner().invoke(args=['rebuild-search'])
+    assert 'indexed 4 row(s)' in result.output
+    assert client.get('/api/search?q=salt').get_json()['results'][0]['title'] == 'Salt and blood pressure'
@@ -0,0 +1,115 @@
+import pytest
+
+import sessions
+from clinic_app import db, Patient, Staff, generate_password_hash
+from query_guard import count_queries
+
+CHEAP = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def clients(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', CHEAP)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        pw = generate_password_hash('pw', CHEAP)
+        db.session.add_all([Patient(name='Pat', email='p@example.com', password_hash=pw),
+                            Staff(name='Sam', email='s@example.com', role='admin', password_hash=pw)])
+        db.session.commit()
+    user, admin = app.test_client(), app.test_client()
+    with admin.session_transaction() as sess:
+        sess['is_admin'] = True
+    return user, admin
+
+
+def cookie(client, app):
+    return client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+
+
+def identity_queries(stmts, table):
+    return [s for s in stmts if f'FROM {table}' in s and 'email' in s]
+
+
+def test_cookie_holds_only_a_session_id(clients, app):
+    user, _ = clients
+    user.get('/dashboard')  # the flash alone creates a session
+    first = cookie(user, app).value
+    assert len(first) < 50 and '.' not in first  # not a signed payload
+    assert user.post('/login', data={'email': 'p@example.com', 'password': 'pw'}).status_code == 302
+    # logging in moves the session to a new id and drops the old record
+    logged_in = cookie(user, app).value
+    assert logged_in != first
+    assert app.session_interface.store.load(first) is None
+    user.get('/logout')
+    assert app.session_interface.store.load(logged_in) is None
+
+
+def test_authenticated_pages_skip_the_identity_query(clients, app):
+    user, _ = clients
+    user.post('/login', data={'email': 'p@example.com', 'password': 'pw'})
+    with count_queries() as stmts:
+        assert user.get('/patient/files').status_code == 200
+    assert len(identity_queries(stmts, 'patient')) == 1  # resolved once, then cached in the session
+    with count_queries() as stmts:
+        assert user.get('/dashboard').status_code == 200
+        assert b'Files for Pat' in user.get('/patient/files').data
+    assert identity_queries(stmts, 'patient') == []
+
+
+def test_admin_edit_and_delete_invalidate_the_cached_patient(clients, app):
+    user, admin = clients
+    user.post('/login', data={'email': 'p@example.com', 'password': 'pw'})
+    user.get('/patient/files')
+    admin.post('/admin/patient/edit/1', data={'name': 'Patricia', 'email': 'p@example.com', 'phone': ''})
+    assert b'Files for Patricia' in user.get('/patient/files').data
+    admin.post('/admin/patient/delete/1')
+    rv = user.get('/dashboard')
+    assert rv.status_code == 302 and '/login' in rv.location
+    with user.session_transaction() as sess:
+        assert 'patient_email' not in sess
+
+
+def test_demoted_staff_loses_admin_pages(clients, app):
+    user, admin = clients
+    user.post('/staff/login', data={'email': 's@example.com', 'password': 'pw'})
+    assert user.get('/admin/patients').status_code == 200
+    with count_queries() as stmts:
+        assert user.get('/admin/patients').status_code == 200
+    assert identity_queries(stmts, 'staff') == []
+    admin.post('/admin/staff/edit/1', data={'name': 'Sam', 'email': 's@example.com', 'role': 'staff'})
+    assert user.get('/admin/patients').status_code == 302
+    assert b'Role: staff' in user.get('/staff').data
+    admin.post('/admin/staff/delete/1')
+    assert user.get('/staff').status_code == 302
+
+
+def test_impersonation_switches_the_cached_patient(clients, app):
+    user, _ = clients
+    with app.app_context():
+        db.session.add(Patient(name='Other', email='o@example.com'))
+        db.session.commit()
+    user.post('/staff/login', data={'email': 's@example.com', 'password': 'pw'})
+    user.get('/staff/impersonate/2')
+    assert b'Files for Other' in user.get('/patient/files').data
+    user.get('/staff/stop-impersonation')
+    assert user.get('/patient/files').status_code == 302
+
+
+@pytest.mark.parametrize('make', [lambda tmp: sessions.MemorySessionStore(),
+                                  lambda tmp: sessions.SQLiteSessionStore(str(tmp / 'sessions.sqlite3'))],
+                         ids=['memory', 'sqlite'])
+def test_store_expiry_and_forget(make, tmp_path, monkeypatch):
+    store = make(tmp_path)
+    store.save('a', '{}', 1000, '{"patient": {"id": 7}}', (7, None))
+    store.save('b', '{}', 1000, '{"staff": {"id": 7}}', (None, 7))
+    monkeypatch.setattr(sessions.time, 'time', lambda: 500)
+    assert store.load('a') == ('{}', '{"patient": {"id": 7}}', 1000)
+    # a data-only save keeps the principal
+    store.save('a', '{"x": 1}', 1000)
+    assert store.load('a')[1] == '{"patient": {"id": 7}}'
+    store.forget('patient', 7)
+    assert store.load('a') == ('{"x": 1}', None, 1000)
+    assert store.load('b')[1] == '{"staff": {"id": 7}}'
+    monkeypatch.setattr(sessions.time, 'time', lambda: 1001)
+    assert store.load('b') is None
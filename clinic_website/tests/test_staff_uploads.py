@@ -1,14 +1,13 @@
 import os
 import io
 import pytest
-from clinic_app import app, db, Staff, Patient, generate_password_hash
+from clinic_app import db, Staff, Patient, generate_password_hash
 
 @pytest.fixture
-def client(tmp_path):
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+def client(tmp_path, app):
     with app.test_client() as client:
         with app.app_context():
+            db.drop_all()
             db.create_all()
             # create a staff user and a patient
             staff = Staff(name='T', email='staff@example.com', password_hash=generate_password_hash('pw'), role='staff')
@@ -18,7 +17,7 @@ def client(tmp_path):
         yield client
 
 
-def test_staff_login_and_upload_and_download(client, tmp_path):
+def test_staff_login_and_upload_and_download(client, tmp_path, app):
     # staff login
     rv = client.post('/staff/login', data={'email':'staff@example.com','password':'pw'}, follow_redirects=True)
     assert b'Staff logged in' in rv.data
@@ -43,3 +42,42 @@ def test_staff_login_and_upload_and_download(client, tmp_path):
     rv = client.get(f'/patient/files/{fid}/download')
     assert rv.status_code == 200
     assert rv.data.startswith(b'Hello test')
+
+
+def _login(client):
+    client.post('/staff/login', data={'email': 'staff@example.com', 'password': 'pw'})
+
+
+def test_upload_is_hashed_while_streamed(client, app):
+    import hashlib
+    from clinic_app import PatientFile
+    _login(client)
+    body = b'x' * 200_000  # several copy chunks
+    rv = client.post('/admin/upload/1', data={'file': (io.BytesIO(body), 'big.txt')},
+                     content_type='multipart/form-data', follow_redirects=True)
+    assert b'File uploaded' in rv.data
+    with app.app_context():
+        pf = PatientFile.query.filter_by(original_name='big.txt').one()
+        assert pf.size == len(body)
+        assert pf.sha256 == hashlib.sha256(body).hexdigest()
+
+
+def test_oversized_upload_is_refused_early(client, app):
+    from clinic_app import PatientFile
+    from uploads import MAX_FILE_BYTES
+    _login(client)
+    body = b'x' * (MAX_FILE_BYTES + 1)
+    rv = client.post('/admin/upload/1', data={'file': (io.BytesIO(body), 'huge.txt')},
+                     content_type='multipart/form-data', follow_redirects=True)
+    assert b'File too large' in rv.data
+    with app.app_context():
+        assert PatientFile.query.count() == 0
+
+
+def test_copy_upload_stops_at_the_limit(tmp_path):
+    from uploads import copy_upload, UploadTooLarge
+    dest = tmp_path / 'out'
+    with pytest.raises(UploadTooLarge):
+        copy_upload(io.BytesIO(b'y' * 1000), str(dest), limit=999, head=b'')
+    assert not dest.exists()
+    assert copy_upload(io.BytesIO(b'abc'), str(dest), limit=3) == (3, 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad')
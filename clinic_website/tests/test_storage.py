@@ -0,0 +1,153 @@
+import io
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from clinic_app import db, jobs, Job, Patient, PatientFile, Staff, generate_password_hash
+from storage import LocalCASStorage, S3Storage
+
+PDF = b'%PDF-1.4 referral letter'
+
+
+@pytest.fixture
+def staff_client(app):
+    with app.test_client() as client:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all([Patient(name='A', email='a@example.com'), Patient(name='B', email='b@example.com'),
+                                Staff(name='S', email='s@example.com', role='staff',
+                                      password_hash=generate_password_hash('pw'))])
+            db.session.commit()
+        with client.session_transaction() as sess:
+            sess['staff_email'] = 's@example.com'
+            sess['is_admin'] = True
+        yield client
+
+
+def upload(client, patient_id, body=PDF, name='letter.pdf'):
+    return client.post(f'/admin/upload/{patient_id}', data={'file': (io.BytesIO(body), name)},
+                       content_type='multipart/form-data')
+
+
+def test_same_content_is_stored_once(staff_client, app, file_store):
+    upload(staff_client, 1)
+    upload(staff_client, 2)
+    with app.app_context():
+        rows = PatientFile.query.all()
+        assert len(rows) == 2 and rows[0].storage_key == rows[1].storage_key
+        key = rows[0].storage_key
+    assert os.path.exists(file_store.path(key))
+    assert [f for f in os.listdir(file_store.staging_dir) if f.endswith('.part')] == []
+    rv = staff_client.get(f'/patient/files/{rows[1].id}/download')
+    assert rv.data == PDF
+
+
+def test_blob_is_collected_when_its_last_row_goes(staff_client, monkeypatch, app, file_store):
+    monkeypatch.setitem(app.config, 'STORAGE_GC_DELAY', 0)
+    upload(staff_client, 1)
+    upload(staff_client, 2)
+    with app.app_context():
+        key = PatientFile.query.first().storage_key
+    staff_client.post('/admin/patient/delete/1')
+    assert os.path.exists(file_store.path(key))  # patient 2 still references it
+    staff_client.post('/admin/patient/delete/2')
+    assert not os.path.exists(file_store.path(key))
+    with app.app_context():
+        assert PatientFile.query.count() == 0
+        assert Job.query.filter_by(kind='storage_gc', status='done').count() == 2
+
+
+def test_gc_waits_out_the_grace_period(staff_client, app, file_store):
+    upload(staff_client, 1)
+    with app.app_context():
+        key = PatientFile.query.first().storage_key
+    staff_client.post('/admin/patient/delete/1')
+    assert os.path.exists(file_store.path(key))
+    with app.app_context():
+        assert Job.query.filter_by(kind='storage_gc', status='pending').count() == 1
+
+
+def test_gc_keeps_a_blob_an_upload_just_stored_again(staff_client, app, file_store):
+    upload(staff_client, 1)
+    with app.app_context():
+        key = PatientFile.query.first().storage_key
+    staff_client.post('/admin/patient/delete/1')
+    # long after the blob was released, an upload of the same content stores it again
+    # but has not committed its row yet when the collector runs
+    past = time.time() - 3600
+    os.utime(file_store.path(key), (past, past))
+    staged = file_store.staging_path()
+    with open(staged, 'wb') as fh:
+        fh.write(PDF)
+    assert file_store.put_file(staged, key) is False
+    with app.app_context():
+        Job.query.filter_by(kind='storage_gc').update({'run_after': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        assert jobs.run_pending() == 1
+        assert Job.query.filter_by(kind='storage_gc', status='pending').count() == 1  # looks again later
+    assert os.path.exists(file_store.path(key))
+
+
+def test_keys_must_be_digests(tmp_path):
+    with pytest.raises(ValueError):
+        LocalCASStorage(str(tmp_path)).path('../../etc/passwd')
+
+
+class FakeS3:
+    """In-memory stand-in for the boto3 S3 client calls S3Storage makes."""
+
+    class NotFound(Exception):
+        response = {'Error': {'Code': '404'}}
+
+    def __init__(self):
+        self.objects = {}
+        self.modified = {}
+        self.uploads = 0
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.NotFound(Key)
+        return {'ContentLength': len(self.objects[Bucket, Key]), 'LastModified': self.modified[Bucket, Key]}
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, 'rb') as fh:
+            self.objects[Bucket, Key] = fh.read()
+        self.modified[Bucket, Key] = datetime.now(timezone.utc)
+        self.uploads += 1
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective):
+        self.objects[Bucket, Key] = self.objects[CopySource['Bucket'], CopySource['Key']]
+        self.modified[Bucket, Key] = datetime.now(timezone.utc)
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Bucket, Key])}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+def test_s3_backend_uses_the_same_interface(tmp_path):
+    import hashlib
+    client = FakeS3()
+    store = S3Storage('clinic', prefix='files/', client=client, staging_dir=str(tmp_path))
+    key = hashlib.sha256(PDF).hexdigest()
+    name = ('clinic', f'files/{key[:2]}/{key}')
+    for _ in range(2):
+        staged = store.staging_path()
+        with open(staged, 'wb') as fh:
+            fh.write(PDF)
+        store.put_file(staged, key)
+        assert not os.path.exists(staged)
+        client.modified[name] -= timedelta(hours=1)
+    assert client.uploads == 1
+    assert store.modified_at(key) > time.time() - 3700  # the second put refreshed it
+    assert ('clinic', f'files/{key[:2]}/{key}') in client.objects
+    assert store.open(key).read() == PDF and store.local_path(key) is None
+    assert store.download_url(key, 'letter.pdf') == f'https://s3.test/clinic/files/{key[:2]}/{key}?expires=300'
+    store.delete(key)
+    assert not store.exists(key) and store.modified_at(key) is None
@@ -0,0 +1,32 @@
+import os
+
+from templating import template_names
+
+
+def test_warmup_fills_the_bytecode_cache(app):
+    cache_dir = app.config['TEMPLATE_CACHE_DIR']
+    names = template_names(app)
+    assert 'base.html' in names
+    # one marshalled code object per template, written when the app was built
+    assert len(os.listdir(cache_dir)) == len(names)
+
+    result = app.test_cli_runner().invoke(args=['precompile-templates'])
+    assert result.exit_code == 0
+    assert 'base.html' in result.output
+    assert len(os.listdir(cache_dir)) == len(names)
+
+
+def test_render_times_are_reported(app):
+    client = app.test_client()
+    assert client.get('/admin/login').status_code == 200
+    with client.session_transaction() as sess:
+        sess['is_admin'] = True
+    stats = client.get('/admin/template-stats').get_json()
+    assert stats['admin_login.html']['count'] >= 1
+    assert stats['admin_login.html']['max_ms'] >= stats['admin_login.html']['mean_ms'] > 0
+
+
+def test_slow_renders_are_logged(app, monkeypatch, caplog):
+    monkeypatch.setitem(app.config, 'TEMPLATE_SLOW_MS', 0)
+    app.test_client().get('/admin/login')
+    assert 'slow template admin_login.html' in caplog.text
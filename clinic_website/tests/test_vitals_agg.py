@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+import vitals_agg
+from clinic_app import db, Patient, Vitals
+
+
+def _rows(n, step=timedelta(minutes=10)):
+    base = datetime(2024, 1, 1)
+    return [(base + i * step, 120 + i % 7, 80, None if i % 5 == 0 else 100.0 + i) for i in range(n)]
+
+
+def test_day_buckets_min_mean_max():
+    ts, cols = vitals_agg.to_arrays(_rows(300))  # ~2 days of 10-minute readings
+    out = vitals_agg.aggregate(ts, cols, 'day', max_buckets=100)
+    assert out['resolution'] == 'day'
+    assert out['bucket_start'] == ['2024-01-01T00:00:00', '2024-01-02T00:00:00', '2024-01-03T00:00:00']
+    assert sum(out['count']) == 300
+    assert out['systolic']['min'][0] == 120 and out['systolic']['max'][0] == 126
+    # glucose NaNs are skipped, not counted as zero
+    day0 = [100.0 + i for i in range(144) if i % 5]
+    assert out['glucose']['mean'][0] == pytest.approx(np.mean(day0), abs=0.01)
+
+
+def test_resolution_coarsens_to_stay_bounded():
+    ts, cols = vitals_agg.to_arrays(_rows(2000, step=timedelta(hours=6)))  # 500 days
+    out = vitals_agg.aggregate(ts, cols, 'hour', max_buckets=120)
+    assert out['resolution'] == 'week'
+    assert len(out['bucket_start']) <= 120
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[437] = 50.0
+    idx = vitals_agg.lttb_indices(x, y, 20)
+    assert idx.size == 20
+    assert idx[0] == 0 and idx[-1] == 999
+    assert 437 in idx
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_api_points_and_resolution(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        p = Patient(name='P', email='p@example.com')
+        db.session.add(p)
+        db.session.commit()
+        db.session.add_all([Vitals(patient_id=p.id, systolic=s, diastolic=d, glucose=g, measured_at=t) for t, s, d, g in _rows(400)])
+        db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['patient_email'] = 'p@example.com'
+    data = client.get('/api/vitals/1?points=50').get_json()
+    assert data['points'] == 50 and len(data['systolic']) == 50
+    data = client.get('/api/vitals/1?resolution=hour').get_json()
+    assert data['resolution'] == 'hour' and sum(data['count']) == 400
+    assert client.get('/api/vitals/1?resolution=minute').status_code == 400
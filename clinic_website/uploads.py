@@ -0,0 +1,91 @@
+"""Patient file helpers shared by the upload views, the job handlers and the CLI."""
+import hashlib
+import os
+
+from flask import current_app
+
+from extensions import file_store, jobs
+
+# Allowed extensions and size limit (bytes)
+ALLOWED_EXT = {'pdf','jpg','jpeg','png','txt','doc','docx'}
+MAX_FILE_BYTES = 8 * 1024 * 1024  # 8MB
+UPLOAD_CHUNK_BYTES = 64 * 1024
+SNIFF_BYTES = 8192  # type checks (and libmagic) only need the head of a file
+
+
+class UploadTooLarge(Exception):
+  pass
+
+
+def copy_upload(stream, dest, limit=MAX_FILE_BYTES, head=b''):
+  """Write `head` then the rest of `stream` to dest in fixed-size chunks.
+
+  Returns (size, sha256 hex). Raises UploadTooLarge (and removes the partial
+  file) as soon as more than `limit` bytes have been seen.
+  """
+  digest = hashlib.sha256()
+  size = 0
+  with open(dest, 'wb') as out:
+    try:
+      chunk = head or stream.read(UPLOAD_CHUNK_BYTES)
+      while chunk:
+        size += len(chunk)
+        if size > limit:
+          raise UploadTooLarge(dest)
+        digest.update(chunk)
+        out.write(chunk)
+        chunk = stream.read(UPLOAD_CHUNK_BYTES)
+    except BaseException:
+      out.close()
+      os.remove(dest)
+      raise
+  return size, digest.hexdigest()
+
+
+def allowed_file(filename):
+  if '.' not in filename:
+    return False
+  ext = filename.rsplit('.',1)[1].lower()
+  return ext in ALLOWED_EXT
+
+
+def file_ext(filename):
+  return filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+
+
+def looks_like_image(head):
+  import imghdr  # only upload requests pay for it
+  return bool(imghdr.what(None, h=head))
+
+
+def legacy_upload_path(pf):
+  return os.path.join(current_app.instance_path, 'uploads', str(pf.patient_id), pf.filename)
+
+
+def open_patient_file(pf):
+  if pf.storage_key:
+    return file_store.open(pf.storage_key)
+  return open(legacy_upload_path(pf), 'rb')
+
+
+def release_blobs(keys):
+  """Queue garbage collection of blobs whose rows are being deleted; commits with the caller.
+
+  The delay covers an upload of the same content that has stored the blob but not yet
+  committed its row; one that stores it later refreshes the blob, and storage_gc then
+  looks again after another delay.
+  """
+  keys = sorted({k for k in keys if k})
+  if keys:
+    jobs.enqueue('storage_gc', {'keys': keys}, delay=current_app.config['STORAGE_GC_DELAY'], commit=False)
+
+
+def partial_path(upload_id):
+  return os.path.join(file_store.staging_dir, 'resumable', upload_id)
+
+
+def discard_partial(upload_id):
+  try:
+    os.remove(partial_path(upload_id))
+  except FileNotFoundError:
+    pass
@@ -0,0 +1,136 @@
+"""Server-side reduction of vitals series for charting.
+
+Charts never need more points than the canvas has pixels, so /api/vitals can hand
+the browser either fixed time buckets (min/mean/max per hour, day or week) or a
+Largest-Triangle-Three-Buckets downsample of the raw readings. Everything here is
+plain NumPy over already-sorted arrays; callers pass column data straight from a
+column-only query.
+"""
+import numpy as np
+
+SERIES = ('systolic', 'diastolic', 'glucose')
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+# 1970-01-01 was a Thursday; weeks are aligned to Monday 1970-01-05.
+_WEEK_ORIGIN = 4 * DAY
+
+RESOLUTIONS = {'hour': HOUR, 'day': DAY, 'week': WEEK}
+# coarser resolutions to fall back to when a range would produce too many buckets
+_COARSER = {'hour': 'day', 'day': 'week'}
+
+
+def to_arrays(rows):
+  """Turn (measured_at, systolic, diastolic, glucose) rows into epoch seconds + float arrays.
+
+  Missing readings become NaN so they drop out of the reductions.
+  """
+  n = len(rows)
+  ts = np.array([r[0] for r in rows], dtype='datetime64[s]').astype(np.int64) if n else np.empty(0, np.int64)
+  cols = {}
+  for i, name in enumerate(SERIES, start=1):
+    cols[name] = np.fromiter((np.nan if r[i] is None else r[i] for r in rows), dtype=np.float64, count=n)
+  return ts, cols
+
+
+def _bucket_keys(ts, width):
+  if width == WEEK:
+    return (ts - _WEEK_ORIGIN) // WEEK * WEEK + _WEEK_ORIGIN
+  return ts // width * width
+
+
+def _reduce(keys, values, buckets):
+  """min/mean/max of values grouped by sorted keys, aligned to buckets (NaN where empty)."""
+  out_min = np.full(buckets.size, np.nan)
+  out_mean = np.full(buckets.size, np.nan)
+  out_max = np.full(buckets.size, np.nan)
+  valid = ~np.isnan(values)
+  k = keys[valid]
+  v = values[valid]
+  if k.size:
+    starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+    idx = np.searchsorted(buckets, k[starts])
+    counts = np.diff(np.r_[starts, k.size])
+    out_min[idx] = np.minimum.reduceat(v, starts)
+    out_max[idx] = np.maximum.reduceat(v, starts)
+    out_mean[idx] = np.add.reduceat(v, starts) / counts
+  return out_min, out_mean, out_max
+
+
+def _json_floats(arr, ndigits=2):
+  return [None if np.isnan(x) else round(float(x), ndigits) for x in arr]
+
+
+def _iso(epoch_seconds):
+  return np.datetime_as_string(np.asarray(epoch_seconds).astype('datetime64[s]')).tolist()
+
+
+def aggregate(ts, cols, resolution, max_buckets):
+  """Per-bucket min/mean/max for each series.
+
+  If the range would need more than max_buckets buckets the resolution is coarsened
+  (hour -> day -> week); at week resolution only the most recent max_buckets are kept.
+  """
+  if resolution not in RESOLUTIONS:
+    raise ValueError(f'unknown resolution {resolution!r}')
+  while True:
+    keys = _bucket_keys(ts, RESOLUTIONS[resolution])
+    span = (int(keys[-1]) - int(keys[0])) // RESOLUTIONS[resolution] + 1 if keys.size else 0
+    if span <= max_buckets or resolution not in _COARSER:
+      break
+    resolution = _COARSER[resolution]
+  buckets = np.unique(keys)
+  if buckets.size > max_buckets:
+    cut = np.searchsorted(keys, buckets[-max_buckets])
+    keys = keys[cut:]
+    cols = {name: values[cut:] for name, values in cols.items()}
+    buckets = buckets[-max_buckets:]
+  out = {
+    'resolution': resolution,
+    'bucket_start': _iso(buckets),
+    'count': np.diff(np.r_[np.searchsorted(keys, buckets), keys.size]).tolist(),
+  }
+  for name in SERIES:
+    lo, mean, hi = _reduce(keys, cols[name], buckets)
+    out[name] = {'min': _json_floats(lo), 'mean': _json_floats(mean), 'max': _json_floats(hi)}
+  return out
+
+
+def lttb_indices(x, y, threshold):
+  """Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+  x must be increasing. Missing (NaN) values in y are scored as the series mean.
+  """
+  n = x.size
+  if threshold >= n or threshold < 3:
+    return np.arange(n)
+  x = x.astype(np.float64)
+  y = np.where(np.isnan(y), np.nanmean(y) if np.any(~np.isnan(y)) else 0.0, y)
+  # bucket boundaries over the interior points; first and last points are always kept
+  edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+  keep = np.empty(threshold, dtype=np.int64)
+  keep[0] = 0
+  keep[-1] = n - 1
+  a = 0
+  for i in range(threshold - 2):
+    lo, hi = edges[i], edges[i + 1]
+    nxt_lo, nxt_hi = edges[i + 1], (edges[i + 2] if i + 2 < edges.size else n)
+    # average of the next bucket is the third triangle vertex
+    cx = x[nxt_lo:nxt_hi].mean()
+    cy = y[nxt_lo:nxt_hi].mean()
+    area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+    a = lo + int(np.argmax(area))
+    keep[i + 1] = a
+  return keep
+
+
+def downsample(ts, cols, points, series='systolic'):
+  """Raw readings thinned to at most `points` using LTTB on the given series."""
+  if series not in SERIES:
+    raise ValueError(f'unknown series {series!r}')
+  idx = lttb_indices(ts, cols[series], points)
+  out = {'points': int(idx.size), 'measured_at': _iso(ts[idx])}
+  for name in SERIES:
+    out[name] = _json_floats(cols[name][idx])
+  return out